@@ -94,6 +94,10 @@ class Allplayall(tournaments.Tournament):
             if setting.name not in ('handicap', 'handicap_style')
             ] + [
             Setting('rounds', allow_none(interpret_int), default=None),
+            Setting('max_duplicate_rate', allow_none(interpret_float),
+                    default=None),
+            Setting('openings', allow_none(interpret_8bit_string),
+                    default=None),
             ]
         try:
             matchup_parameters = load_settings(matchup_settings, config)
@@ -165,6 +169,25 @@ class Allplayall(tournaments.Tournament):
                 "competitors have changed in the control file")
         tournaments.Tournament.set_status(self, status)
 
+    def set_matchup_game_limit(self, matchup_id, limit):
+        # All matchups play the same number of rounds: count_games_expected()
+        # and the reports assume this.
+        raise CompetitionError(
+            "not supported for all-play-all tournaments (set rounds instead)")
+
+    def merge_shard_statuses(self, shard_statuses):
+        competitors = None
+        for shard, shard_count, status in shard_statuses:
+            if competitors is None:
+                competitors = status['competitors']
+            elif status['competitors'] != competitors:
+                raise CompetitionError(
+                    "shards disagree about the competitors")
+        result = tournaments.Tournament.merge_shard_statuses(
+            self, shard_statuses)
+        result['competitors'] = competitors
+        return result
+
 
     def get_player_checks(self):
         result = []
@@ -249,6 +272,7 @@ class Allplayall(tournaments.Tournament):
         self.write_screen_report(out)
         p('')
         self.write_matchup_reports(out)
+        self.write_duplicate_reports(out)
         p('')
         self.write_player_descriptions(out)
         p('')
@@ -4,7 +4,7 @@ from __future__ import division
 
 import random
 from random import gauss as random_gauss
-from math import sqrt
+from math import log, sqrt
 
 from gomill import compact_tracebacks
 from gomill import game_jobs
@@ -85,6 +85,81 @@ def update_distribution(distribution, elites, step_size):
     return Distribution(new_distribution_parameters)
 
 
+def hoeffding_radius(games, confidence):
+    """Return the Hoeffding confidence radius for a mean score.
+
+    games      -- int (number of games played)
+    confidence -- float between 0.0 and 1.0
+
+    Scores are assumed to lie in the range 0.0 to 1.0.
+
+    Returns a float d such that the true mean lies within d of the observed
+    mean with at least the given probability.
+
+    """
+    if games == 0:
+        return 1.0
+    delta = 1.0 - confidence
+    return sqrt(log(2.0 / delta) / (2.0 * games))
+
+def bernstein_radius(games, mean, confidence):
+    """Return the empirical Bernstein confidence radius for a mean score.
+
+    games      -- int (number of games played)
+    mean       -- float (observed mean score)
+    confidence -- float between 0.0 and 1.0
+
+    Scores are assumed to lie in the range 0.0 to 1.0; mean * (1 - mean) is
+    used as the variance estimate (this is an upper bound for such scores).
+
+    This is tighter than hoeffding_radius() for candidates which are winning
+    or losing almost all their games.
+
+    """
+    if games == 0:
+        return 1.0
+    delta = 1.0 - confidence
+    l = log(3.0 / delta)
+    variance = mean * (1.0 - mean)
+    return sqrt(2.0 * variance * l / games) + 3.0 * l / games
+
+def race_candidates(scores, elite_count, decisions):
+    """Decide which candidates are certainly in or out of the elite set.
+
+    scores      -- list of pairs (lower bound, upper bound)
+    elite_count -- int
+    decisions   -- list of values None, 'elite' or 'eliminated'
+
+    scores and decisions are indexed by candidate number.
+
+    Returns a new list of decisions. Existing decisions are never changed.
+
+    A candidate is eliminated if at least elite_count other candidates have a
+    lower bound above its upper bound. A candidate is accepted as elite if
+    fewer than elite_count other candidates have an upper bound above its
+    lower bound.
+
+    """
+    result = list(decisions)
+    for i, (lower, upper) in enumerate(scores):
+        if result[i] is not None:
+            continue
+        better = 0
+        possibly_better = 0
+        for j, (other_lower, other_upper) in enumerate(scores):
+            if j == i:
+                continue
+            if other_lower > upper:
+                better += 1
+            if other_upper > lower:
+                possibly_better += 1
+        if better >= elite_count:
+            result[i] = 'eliminated'
+        elif possibly_better < elite_count:
+            result[i] = 'elite'
+    return result
+
+
 parameter_settings = [
     Setting('code', interpret_identifier),
     Setting('initial_mean', interpret_float),
@@ -145,6 +220,10 @@ class Cem_tuner(Competition):
         Setting('number_of_generations', interpret_positive_int),
         Setting('elite_proportion', interpret_float),
         Setting('step_size', interpret_float),
+        Setting('racing',
+                allow_none(interpret_enum('hoeffding', 'bernstein')),
+                default=None),
+        Setting('racing_confidence', interpret_float, default=0.95),
         ])
 
     special_settings = [
@@ -196,6 +275,9 @@ class Cem_tuner(Competition):
             raise ControlFileError("elite_proportion out of range (0.0 to 1.0)")
         if not 0.0 < self.step_size < 1.0:
             raise ControlFileError("step_size out of range (0.0 to 1.0)")
+        if not 0.0 < self.racing_confidence < 1.0:
+            raise ControlFileError(
+                "racing_confidence out of range (0.0 to 1.0)")
 
         try:
             specials = load_settings(self.special_settings, config)
@@ -244,6 +326,10 @@ class Cem_tuner(Competition):
     #   candidates        -- Players (code attribute is the candidate code)
     #                        (list indexed by candidate number)
     #  *scheduler         -- Group_scheduler (group codes are candidate numbers)
+    #  *game_limits       -- number of games to play
+    #                        (list indexed by candidate number)
+    #  *race_decisions    -- None, 'elite' or 'eliminated'
+    #                        (list indexed by candidate number)
     #
     # These are all reset for each new generation.
     #
@@ -255,9 +341,7 @@ class Cem_tuner(Competition):
         self.reset_for_new_generation()
 
     def _set_scheduler_groups(self):
-        self.scheduler.set_groups(
-            (i, self.batch_size) for i in xrange(self.samples_per_generation)
-            )
+        self.scheduler.set_groups(enumerate(self.game_limits))
 
     # Can bump this to prevent people loading incompatible .status files.
     status_format_version = 0
@@ -269,6 +353,8 @@ class Cem_tuner(Competition):
             'sample_parameters'  : self.sample_parameters,
             'wins'               : self.wins,
             'scheduler'          : self.scheduler,
+            'game_limits'        : self.game_limits,
+            'race_decisions'     : self.race_decisions,
             }
 
     def set_status(self, status):
@@ -278,7 +364,18 @@ class Cem_tuner(Competition):
         self.wins = status['wins']
         self.prepare_candidates()
         self.scheduler = status['scheduler']
+        # Status files from before racing was implemented don't have these
+        self.game_limits = status.get('game_limits')
+        self.race_decisions = status.get(
+            'race_decisions', [None] * self.samples_per_generation)
         # Might as well notice if they changed the batch_size
+        if self.game_limits is None or self.racing is None:
+            self.game_limits = [self.batch_size] * self.samples_per_generation
+        else:
+            self.game_limits = [max(limit, self.batch_size)
+                                if decision is None else limit
+                                for (limit, decision)
+                                in zip(self.game_limits, self.race_decisions)]
         self._set_scheduler_groups()
         self.scheduler.rollback()
 
@@ -289,6 +386,8 @@ class Cem_tuner(Competition):
         self.wins = [0] * self.samples_per_generation
         self.prepare_candidates()
         self.scheduler = competition_schedulers.Group_scheduler()
+        self.game_limits = [self.batch_size] * self.samples_per_generation
+        self.race_decisions = [None] * self.samples_per_generation
         self._set_scheduler_groups()
 
     def transform_parameters(self, optimiser_parameters):
@@ -365,6 +464,56 @@ class Cem_tuner(Competition):
             self.candidates.append(
                 self.make_candidate(candidate_code, engine_parameters))
 
+    def get_elite_count(self):
+        return max(1,
+            int(self.elite_proportion * self.samples_per_generation + 0.5))
+
+    def get_score_bounds(self, candidate_number):
+        """Return confidence bounds for a candidate's mean score.
+
+        Returns a pair of floats (lower bound, upper bound).
+
+        """
+        games = self.scheduler.get_fixed_count(candidate_number)
+        if games == 0:
+            return 0.0, 1.0
+        mean = self.wins[candidate_number] / games
+        if self.racing == 'bernstein':
+            radius = bernstein_radius(games, mean, self.racing_confidence)
+        else:
+            radius = hoeffding_radius(games, self.racing_confidence)
+        return mean - radius, mean + radius
+
+    def update_race(self):
+        """Stop scheduling candidates whose elite status is certain.
+
+        Any games which such a candidate hasn't yet been issued are transferred
+        to the remaining undecided candidates (fewest games first).
+
+        """
+        scores = [self.get_score_bounds(i)
+                  for i in xrange(self.samples_per_generation)]
+        new_decisions = race_candidates(
+            scores, self.get_elite_count(), self.race_decisions)
+        freed_games = 0
+        for i, (old, new) in enumerate(zip(self.race_decisions,
+                                           new_decisions)):
+            if old == new:
+                continue
+            self.log_event("racing: %s %s" % (
+                self.make_candidate_code(self.generation, i), new))
+            issued = self.scheduler.get_issued_count(i)
+            freed_games += max(0, self.game_limits[i] - issued)
+            self.game_limits[i] = issued
+        self.race_decisions = new_decisions
+        undecided = [i for (i, decision) in enumerate(self.race_decisions)
+                     if decision is None]
+        if undecided:
+            for _ in xrange(freed_games):
+                i = min(undecided, key=lambda i: (self.game_limits[i], i))
+                self.game_limits[i] += 1
+        self._set_scheduler_groups()
+
     def finish_generation(self):
         """Process a generation's results and calculate the new distribution.
 
@@ -373,11 +522,15 @@ class Cem_tuner(Competition):
         Updates self.distribution.
 
         """
-        sorter = [(wins, candidate_number)
-                  for (candidate_number, wins) in enumerate(self.wins)]
+        if self.racing is None:
+            sorter = [(wins, candidate_number)
+                      for (candidate_number, wins) in enumerate(self.wins)]
+        else:
+            # Candidates may have played different numbers of games.
+            sorter = [(wins / max(1, self.scheduler.get_fixed_count(i)), i)
+                      for (i, wins) in enumerate(self.wins)]
         sorter.sort(reverse=True)
-        elite_count = max(1,
-            int(self.elite_proportion * self.samples_per_generation + 0.5))
+        elite_count = self.get_elite_count()
         self.log_history("Generation %s" % self.generation)
         self.log_history("Distribution\n%s" %
                          self.format_distribution(self.distribution))
@@ -453,6 +606,9 @@ class Cem_tuner(Competition):
         elif gr.winning_player is None:
             self.wins[candidate_number] += 0.5
 
+        if self.racing is not None:
+            self.update_race()
+
         if self.scheduler.all_fixed():
             self.finish_generation()
             self.generation += 1
@@ -489,14 +645,16 @@ class Cem_tuner(Competition):
 
         """
         result = []
-        for i, (wins, candidate_number) in enumerate(ordered_samples):
+        for i, (_, candidate_number) in enumerate(ordered_samples):
             opt_parameters = self.sample_parameters[candidate_number]
-            result.append(
-                "%s%s %s %3d" %
-                (self.make_candidate_code(self.generation, candidate_number),
-                 "*" if i < elite_count else " ",
-                 self.format_optimiser_parameters(opt_parameters),
-                 wins))
+            s = "%s%s %s %3d" % (
+                self.make_candidate_code(self.generation, candidate_number),
+                "*" if i < elite_count else " ",
+                self.format_optimiser_parameters(opt_parameters),
+                self.wins[candidate_number])
+            if self.racing is not None:
+                s += "/%d" % self.scheduler.get_fixed_count(candidate_number)
+            result.append(s)
         return "\n".join(result)
 
     def write_static_description(self, out):
@@ -513,6 +671,14 @@ class Cem_tuner(Competition):
         print >>out
         print >>out, "wins from current samples:\n%s" % self.wins
         print >>out
+        if self.racing is not None:
+            print >>out, "games from current samples:\n%s" % [
+                self.scheduler.get_fixed_count(i)
+                for i in xrange(self.samples_per_generation)]
+            print >>out, "racing: %d elite, %d eliminated" % (
+                self.race_decisions.count('elite'),
+                self.race_decisions.count('eliminated'))
+            print >>out
         if self.generation == self.number_of_generations:
             print >>out, "final distribution:"
         else:
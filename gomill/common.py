@@ -37,6 +37,33 @@ def colour_name(colour):
 
 column_letters = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
 
+# list of rows of vertex strings, indexed by row then col (up to 25x25)
+_vertex_rows = [[column_letters[_col] + str(_row+1) for _col in range(25)]
+                for _row in range(25)]
+del _row, _col
+
+# map board size -> dict lower-case vertex string -> move
+_moves_from_vertices = {}
+
+def _get_moves_from_vertices(board_size):
+    """Return a dict mapping lower-case vertex strings to moves.
+
+    Returns None if board_size isn't an int (there's no table in that case).
+
+    """
+    try:
+        return _moves_from_vertices[board_size]
+    except KeyError:
+        pass
+    if type(board_size) is not int:
+        return None
+    table = {"pass" : None}
+    for row in range(board_size):
+        for col in range(board_size):
+            table[_vertex_rows[row][col].lower()] = (row, col)
+    _moves_from_vertices[board_size] = table
+    return table
+
 def format_vertex(move):
     """Return coordinates as a string like 'A1', or 'pass'.
 
@@ -50,7 +77,7 @@ def format_vertex(move):
     row, col = move
     if not 0 <= row < 25 or not 0 <= col < 25:
         raise ValueError
-    return column_letters[col] + str(row+1)
+    return _vertex_rows[row][col]
 
 def format_vertex_list(moves):
     """Return a list of coordinates as a string like 'A1,B2'."""
@@ -71,8 +98,16 @@ def move_from_vertex(vertex, board_size):
         s = vertex.lower()
     except Exception:
         raise ValueError("invalid vertex")
-    if s == "pass":
-        return None
+    try:
+        moves = _moves_from_vertices[board_size]
+    except KeyError:
+        moves = _get_moves_from_vertices(board_size)
+    if moves is not None:
+        try:
+            return moves[s]
+        except (KeyError, TypeError):
+            # An error, or an unusual form such as 'A01'
+            pass
     try:
         col_c = s[0]
         if (not "a" <= col_c <= "z") or col_c == "i":
@@ -73,6 +73,30 @@ class Simple_scheduler(object):
         self.outstanding = set()
         #self._check_consistent()
 
+    def get_fixed_tokens(self):
+        """Return the set of tokens which have been fixed."""
+        return (set(xrange(self.next_new)) -
+                self.outstanding - self.to_reissue)
+
+    def set_fixed_tokens(self, tokens):
+        """Reset the scheduler so that exactly the specified tokens are fixed.
+
+        tokens -- set of ints
+
+        Any lower tokens which aren't fixed will be issued (in order) before
+        any new ones.
+
+        """
+        if tokens:
+            self.next_new = max(tokens) + 1
+        else:
+            self.next_new = 0
+        self.outstanding = set()
+        self.to_reissue = set(xrange(self.next_new)) - set(tokens)
+        self.issued = self.next_new - len(self.to_reissue)
+        self.fixed = self.issued
+        #self._check_consistent()
+
 
 class Group_scheduler(object):
     """Schedule multiple lists of games in parallel.
@@ -151,6 +175,40 @@ class Group_scheduler(object):
         for allocator in self.allocators.itervalues():
             allocator.rollback()
 
+    def get_fixed_tokens(self):
+        """Return the game numbers which have been fixed.
+
+        Returns a map group code -> set of game numbers.
+
+        """
+        return dict((group_code, allocator.get_fixed_tokens())
+                    for (group_code, allocator) in self.allocators.iteritems())
+
+    def set_fixed_tokens(self, fixed_tokens):
+        """Reset the scheduler so that exactly the specified games are fixed.
+
+        fixed_tokens -- map group code -> set of game numbers
+
+        This creates groups (with no limit) for any group codes not already
+        present; the groups can be adjusted afterwards using set_groups().
+
+        """
+        for group_code, tokens in fixed_tokens.iteritems():
+            allocator = self.allocators.get(group_code)
+            if allocator is None:
+                allocator = Simple_scheduler()
+                self.allocators[group_code] = allocator
+                self.limits[group_code] = None
+            allocator.set_fixed_tokens(tokens)
+
+    def get_issued_count(self, group_code):
+        """Return the number of issued games for the specified group."""
+        return self.allocators[group_code].issued
+
+    def get_fixed_count(self, group_code):
+        """Return the number of fixed games for the specified group."""
+        return self.allocators[group_code].fixed
+
     def nothing_issued_yet(self):
         """Say whether nothing has been issued yet."""
         return all(allocator.issued == 0
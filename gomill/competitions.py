@@ -50,6 +50,7 @@ _player_settings = [
     Setting('startup_gtp_commands', allow_none(interpret_sequence),
             defaultmaker=list),
     Setting('discard_stderr', interpret_bool, default=False),
+    Setting('reuse_engine', interpret_bool, default=False),
     ]
 
 class Player_config(Quiet_config):
@@ -284,6 +285,9 @@ class Competition(object):
         if config['discard_stderr']:
             player.discard_stderr = True
 
+        if config['reuse_engine']:
+            player.reuse_engine = True
+
         return player
 
 
@@ -313,6 +317,60 @@ class Competition(object):
         # This is called for the 'show' command, so it mustn't log anything.
         raise NotImplementedError
 
+    def set_shard(self, shard, shard_count):
+        """Play only part of the competition.
+
+        shard       -- int
+        shard_count -- int
+
+        The competition's games are divided into shard_count shards, and only
+        games belonging to the specified shard (counting from 0) are played.
+
+        Call this before setting the competition status.
+
+        Expect this to be implemented for tournaments but not tuning events
+        (raises NotImplementedError).
+
+        """
+        raise NotImplementedError
+
+    def set_matchup_game_limit(self, matchup_id, limit):
+        """Change the number of games to play in a matchup.
+
+        matchup_id -- string
+        limit      -- nonnegative int
+
+        This is for use during a run; the change isn't recorded in the
+        competition's status, so it lasts only for the rest of the run.
+
+        Raises CompetitionError if there's no such matchup, or if the
+        competition can't change the limit for a single matchup.
+
+        Expect this to be implemented for tournaments but not tuning events
+        (raises NotImplementedError).
+
+        """
+        raise NotImplementedError
+
+    def merge_shard_statuses(self, shard_statuses):
+        """Combine the states of a sharded competition's shards.
+
+        shard_statuses -- list of tuples (shard, shard_count, status)
+
+        Each status is a value returned by get_status() from a competition on
+        which set_shard() had been called with the given parameters.
+
+        Returns a status suitable for passing to set_status() for an unsharded
+        competition.
+
+        Raises CompetitionError if the statuses can't be combined.
+
+        Expect this to be implemented for tournaments but not tuning events
+        (raises NotImplementedError).
+
+        """
+        raise NotImplementedError
+
     def get_player_checks(self):
         """List the Player_checks for check_players() to check.
 
@@ -0,0 +1,113 @@
+"""Restrict processes to particular CPUs.
+
+This uses os.sched_setaffinity() if it's available, and otherwise calls
+sched_setaffinity() from the C library directly (so it works on Linux with
+Python 2).
+
+CPUs are identified by integers, as for os.sched_setaffinity().
+
+"""
+
+import os
+
+# Size of the C library's cpu_set_t, in bits
+_CPU_SETSIZE = 1024
+
+_libc = None
+
+def _get_libc():
+    """Return the C library as a ctypes CDLL, or None if it isn't usable."""
+    global _libc
+    if _libc is not None:
+        return _libc or None
+    _libc = False
+    try:
+        import ctypes
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        libc.sched_setaffinity
+        libc.sched_getaffinity
+    except (ImportError, EnvironmentError, AttributeError):
+        return None
+    _libc = libc
+    return libc
+
+def is_supported():
+    """Check whether CPU affinity can be set on this system."""
+    return (hasattr(os, 'sched_setaffinity') or _get_libc() is not None)
+
+def _make_cpu_set(cpus):
+    import ctypes
+    word_bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask = (ctypes.c_ulong * (_CPU_SETSIZE // word_bits))()
+    for cpu in cpus:
+        if not 0 <= cpu < _CPU_SETSIZE:
+            raise ValueError("cpu number out of range: %d" % cpu)
+        mask[cpu // word_bits] |= 1 << (cpu % word_bits)
+    return mask
+
+def get_available_cpus():
+    """Return the CPUs the current process may run on.
+
+    Returns a sorted list of ints.
+
+    If CPU affinity isn't supported, returns range(number of CPUs).
+
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    libc = _get_libc()
+    if libc is not None:
+        import ctypes
+        mask = _make_cpu_set([])
+        if libc.sched_getaffinity(0, ctypes.sizeof(mask), mask) == 0:
+            word_bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+            return [cpu for cpu in xrange(_CPU_SETSIZE)
+                    if mask[cpu // word_bits] & (1 << (cpu % word_bits))]
+    try:
+        import multiprocessing
+        return range(multiprocessing.cpu_count())
+    except (ImportError, NotImplementedError):
+        return [0]
+
+def set_cpu_affinity(cpus):
+    """Restrict the current process to the specified CPUs.
+
+    cpus -- nonempty sequence of ints
+
+    Raises EnvironmentError if the system call fails, or if CPU affinity isn't
+    supported.
+
+    This is suitable for use in a subprocess.Popen preexec_fn (if is_supported()
+    has already been called in the parent process).
+
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+        return
+    libc = _get_libc()
+    if libc is None:
+        raise EnvironmentError("cpu affinity isn't supported on this system")
+    import ctypes
+    mask = _make_cpu_set(cpus)
+    if libc.sched_setaffinity(0, ctypes.sizeof(mask), mask) != 0:
+        errno = ctypes.get_errno()
+        raise EnvironmentError(errno, os.strerror(errno))
+
+def allocate_cpus(cpus, slot_count):
+    """Divide CPUs between worker slots.
+
+    cpus       -- nonempty list of ints
+    slot_count -- int
+
+    Returns a list of length slot_count of nonempty lists of ints.
+
+    If there are at least as many CPUs as slots, each slot gets its own CPUs
+    (the same number for each slot, with any spare CPUs left unused).
+    Otherwise each slot gets a single CPU, with CPUs shared as evenly as
+    possible.
+
+    """
+    if slot_count <= len(cpus):
+        per_slot = len(cpus) // slot_count
+        return [cpus[i*per_slot:(i+1)*per_slot] for i in xrange(slot_count)]
+    return [[cpus[i % len(cpus)]] for i in xrange(slot_count)]
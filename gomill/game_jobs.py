@@ -1,6 +1,7 @@
 """Connection between GTP games and the job manager."""
 
 import datetime
+import hashlib
 import os
 
 from gomill import gtp_controller
@@ -8,6 +9,7 @@ from gomill import gtp_games
 from gomill import job_manager
 from gomill import sgf
 from gomill import utils
+from gomill.common import format_vertex
 from gomill.gtp_controller import BadGtpResponse, GtpChannelError
 
 class Player(object):
@@ -25,6 +27,7 @@ class Player(object):
       discard_stderr       -- bool (default False)
       cwd                  -- working directory to change to (default None)
       environ              -- maplike of environment variables (default None)
+      reuse_engine         -- bool (default False)
 
     See gtp_controllers.Gtp_controller for an explanation of gtp_aliases.
 
@@ -36,7 +39,16 @@ class Player(object):
     environment variables; use 'environ' to add variables or replace particular
     values.
 
-    Players are suitable for pickling.
+    If reuse_engine is true, the engine subprocess is left running at the end
+    of a successful game, and the same worker process uses it for a later game
+    whose player has the same engine key (see get_engine_key()). The startup
+    commands are sent again at the start of each game, so players whose
+    settings differ only in their startup commands (eg, tuning candidates) can
+    share a subprocess.
+
+    Players are suitable for pickling. The job manager sends each Player to a
+    worker process only once (see get_shared_key()), so don't modify a Player
+    after using it in a job; make a copy instead.
 
     """
     def __init__(self):
@@ -47,6 +59,7 @@ class Player(object):
         self.discard_stderr = False
         self.cwd = None
         self.environ = None
+        self.reuse_engine = False
 
     def make_environ(self):
         """Return environment variables to use with the player's subprocess.
@@ -74,8 +87,103 @@ class Player(object):
             result.environ = None
         else:
             result.environ = dict(self.environ)
+        result.reuse_engine = self.reuse_engine
         return result
 
+    def get_engine_key(self):
+        """Return a value identifying the engine subprocess the player runs.
+
+        Players with equal engine keys can share a subprocess (if they have
+        reuse_engine set). The key doesn't depend on the player code or the
+        startup commands.
+
+        """
+        if self.environ is None:
+            environ = None
+        else:
+            environ = tuple(sorted(dict(self.environ).items()))
+        return (tuple(self.cmd_args), self.cwd, environ,
+                tuple(sorted(self.gtp_aliases.items())), self.discard_stderr)
+
+    def get_shared_key(self):
+        """Return a value identifying the Player's settings.
+
+        This is used by the job manager's Shared_object_packer: Players with
+        equal keys are sent to each worker process only once.
+
+        """
+        return (self.code, self.get_engine_key(), self.is_reliable_scorer,
+                self.allow_claim, self.reuse_engine,
+                tuple((command, tuple(arguments))
+                      for command, arguments in self.startup_gtp_commands))
+
+
+class _Cached_engine(object):
+    """An engine subprocess kept running for use in later games.
+
+    Public attributes:
+      controller         -- gtp_controller.Gtp_controller
+      engine_description -- gtp_controller.Engine_description
+      cpu_time           -- float or None
+
+    cpu_time is the engine's most recent (cumulative) response to
+    gomill-cpu_time.
+
+    """
+    def __init__(self, controller, engine_description, cpu_time):
+        self.controller = controller
+        self.engine_description = engine_description
+        self.cpu_time = cpu_time
+
+# Engines left running by Players with reuse_engine set.
+# map (worker id, engine key) -> list of _Cached_engines
+# The worker id is part of the key so that threaded workers (which share a
+# process) don't take each other's engines.
+_engine_cache = {}
+
+def _take_cached_engine(cache_key):
+    """Remove and return a running engine with the specified key.
+
+    cache_key -- pair (worker id, engine key)
+
+    Returns a _Cached_engine, or None if there is no suitable engine.
+
+    Engines which don't respond are closed and forgotten.
+
+    """
+    engines = _engine_cache.get(cache_key)
+    while engines:
+        cached = engines.pop()
+        try:
+            cached.controller.do_command("protocol_version")
+        except BadGtpResponse:
+            pass
+        except GtpChannelError:
+            cached.controller.safe_close()
+            continue
+        return cached
+    return None
+
+def close_cached_engines(worker_id=None):
+    """Close engines left running by Players with reuse_engine set.
+
+    worker_id -- int or None
+
+    If worker_id is given, closes only the engines left by that worker;
+    otherwise closes them all.
+
+    This is registered as a job manager worker cleanup function.
+
+    """
+    # Worker threads may be adding their own engines to the cache meanwhile
+    for cache_key in _engine_cache.keys():
+        if worker_id is not None and cache_key[0] != worker_id:
+            continue
+        for cached in _engine_cache.pop(cache_key, []):
+            cached.controller.safe_close()
+
+job_manager.register_worker_cleanup(close_cached_engines)
+
 class Game_job_result(object):
     """Information returned after a worker process plays a game.
 
@@ -86,11 +194,33 @@ class Game_job_result(object):
       warnings              -- list of strings
       log_entries           -- list of strings
       engine_descriptions   -- map player code -> Engine_description
+      move_hash             -- string (see hash_moves())
+      sgf_data              -- 8-bit string, or None (see Game_job.return_sgf)
 
     Game_job_results are suitable for pickling.
 
     """
 
+def hash_moves(player_b, player_w, moves):
+    """Return a digest identifying a game's players and move sequence.
+
+    player_b -- player code
+    player_w -- player code
+    moves    -- list of tuples (colour, move, comment)
+                (as returned by Gtp_game.get_moves())
+
+    Returns a 16-byte string. Comments are ignored.
+
+    Two games give the same digest if the same players played the same moves
+    with the same colours.
+
+    """
+    h = hashlib.md5()
+    h.update("%s %s:" % (player_b, player_w))
+    for colour, move, _ in moves:
+        h.update("%s%s;" % (colour, format_vertex(move)))
+    return h.digest()
+
 class Game_job(object):
     """A game to be played in a worker process.
 
@@ -112,17 +242,20 @@ class Game_job(object):
       game_data           -- arbitrary pickleable data
       handicap            -- int
       handicap_is_free    -- bool (default False)
+      opening             -- list of pairs (colour, move)
       use_internal_scorer -- bool (default True)
       internal_scorer_handicap_compensation -- 'no' , 'short', or 'full'
                              (default 'no')
       sgf_filename        -- filename for the SGF file
       sgf_dirname         -- directory pathname for the SGF file
+      return_sgf          -- bool (default False)
       void_sgf_dirname    -- directory pathname for the SGF file for void games
       sgf_game_name       -- string to show as SGF Game Name (default game_id)
       sgf_event           -- string to show as SGF EVent
       sgf_note            -- multiline string to put into SGF root comment
       gtp_log_pathname    -- pathname to use for the GTP log
       stderr_pathname     -- pathname to send players' stderr to
+      cpu_affinity_map    -- list of lists of ints
 
     The game_id will be returned in the job result, so you can tell which game
     you're getting the result for. It also appears in the SGF file as a comment
@@ -131,12 +264,20 @@ class Game_job(object):
     game_data is returned in the job result. It's provided as a convenient way
     to pass a small amount of information from get_job() to process_response().
 
+    If opening is set, the game starts with those moves (see
+    Gtp_game.set_opening()).
+
     If use_internal_scorer is False, the Players' is_reliable_scorer attributes
     are used to determine who scores the game (see errors.rst).
 
     If sgf_dirname and sgf_filename are set, an SGF file will be written after
     the game is over.
 
+    If return_sgf is True, the serialised SGF game record is returned in the
+    job result's sgf_data attribute instead (sgf_dirname is ignored). This
+    lets the caller store the records itself, for example in a collection
+    file.
+
     If void_sgf_dirname and sgf_filename are set, an SGF file will be written
     for any void games (games which were aborted due to unhandled errors) which
     have at least one move. The leaf directory will be created if necessary.
@@ -150,14 +291,20 @@ class Game_job(object):
     calling process. But if a player has discard_stderr=True then its standard
     error is sent to os.devnull instead.
 
+    If cpu_affinity_map is set, and the job is run with a worker id which is
+    less than its length, the players' subprocesses are restricted to the
+    CPUs listed in that element (see cpu_affinity.set_cpu_affinity()).
+
     Game_jobs are suitable for pickling.
 
     """
     def __init__(self):
         self.handicap = None
         self.handicap_is_free = False
+        self.opening = None
         self.sgf_filename = None
         self.sgf_dirname = None
+        self.return_sgf = False
         self.void_sgf_dirname = None
         self.sgf_game_name = None
         self.sgf_event = None
@@ -167,6 +314,7 @@ class Game_job(object):
         self.game_data = None
         self.gtp_log_pathname = None
         self.stderr_pathname = None
+        self.cpu_affinity_map = None
 
     # The code here has to be happy to run in a separate process.
 
@@ -182,6 +330,7 @@ class Game_job(object):
         """
         self._worker_id = worker_id
         self._files_to_close = []
+        self._cached_engines = {}
         try:
             return self._run()
         finally:
@@ -196,6 +345,31 @@ class Game_job(object):
 
     def _start_player(self, game_controller, game,
                       colour, player, gtp_log_file):
+        if not self.use_internal_scorer and player.is_reliable_scorer:
+            game.allow_scorer(colour)
+        if player.allow_claim:
+            game.set_claim_allowed(colour)
+        if player.reuse_engine:
+            cached = _take_cached_engine(
+                (self._worker_id, player.get_engine_key()))
+        else:
+            cached = None
+        if cached is not None:
+            self._cached_engines[colour] = cached
+            cached.controller.name = "player %s" % player.code
+            game_controller.set_player_controller(
+                colour, cached.controller, check_protocol_version=False,
+                engine_description=cached.engine_description)
+        else:
+            self._start_player_subprocess(game_controller, colour, player)
+        controller = game_controller.get_controller(colour)
+        if gtp_log_file is not None:
+            controller.channel.enable_logging(
+                gtp_log_file, prefix="%s: " % colour)
+        for command, arguments in player.startup_gtp_commands:
+            game_controller.send_command(colour, command, *arguments)
+
+    def _start_player_subprocess(self, game_controller, colour, player):
         if player.discard_stderr:
             stderr_pathname = os.devnull
         else:
@@ -205,24 +379,49 @@ class Game_job(object):
             self._files_to_close.append(stderr)
         else:
             stderr = None
-        if not self.use_internal_scorer and player.is_reliable_scorer:
-            game.allow_scorer(colour)
-        if player.allow_claim:
-            game.set_claim_allowed(colour)
         env = player.make_environ()
         env['GOMILL_GAME_ID'] = self.game_id
         if self._worker_id is not None:
             env['GOMILL_SLOT'] = str(self._worker_id)
+        if (self.cpu_affinity_map is not None and
+            self._worker_id is not None and
+            self._worker_id < len(self.cpu_affinity_map)):
+            cpu_affinity = self.cpu_affinity_map[self._worker_id]
+        else:
+            cpu_affinity = None
         game_controller.set_player_subprocess(
             colour, player.cmd_args,
-            env=env, cwd=player.cwd, stderr=stderr)
+            env=env, cwd=player.cwd, stderr=stderr, cpu_affinity=cpu_affinity)
         controller = game_controller.get_controller(colour)
         controller.set_gtp_aliases(player.gtp_aliases)
-        if gtp_log_file is not None:
-            controller.channel.enable_logging(
-                gtp_log_file, prefix="%s: " % colour)
-        for command, arguments in player.startup_gtp_commands:
-            game_controller.send_command(colour, command, *arguments)
+
+    def _keep_engine(self, game_controller, game, colour, player):
+        """Leave a reusable player's engine running for a later game.
+
+        Does nothing if the engine has had any communication trouble.
+
+        Replaces cumulative gomill-cpu_time results with the time used for
+        this game.
+
+        """
+        controller = game_controller.get_controller(colour)
+        if (controller.channel_is_bad or controller.channel_is_closed or
+            controller.retrieve_error_messages()):
+            return
+        game_controller.release_player(colour)
+        controller.channel.disable_logging()
+        cpu_time = game.result.cpu_times[player.code]
+        previous = self._cached_engines.get(colour)
+        if previous is not None and cpu_time is not None:
+            if previous.cpu_time is None:
+                game.result.cpu_times[player.code] = None
+            else:
+                game.result.cpu_times[player.code] = \
+                    cpu_time - previous.cpu_time
+        cached = _Cached_engine(
+            controller, game_controller.engine_descriptions[colour], cpu_time)
+        _engine_cache.setdefault(
+            (self._worker_id, player.get_engine_key()), []).append(cached)
 
     def _run(self):
         warnings = []
@@ -255,6 +454,11 @@ class Game_job(object):
                     game.set_handicap(self.handicap, self.handicap_is_free)
                 except ValueError:
                     raise BadGtpResponse("invalid handicap")
+            if self.opening:
+                try:
+                    game.set_opening(self.opening)
+                except ValueError, e:
+                    raise BadGtpResponse("invalid opening: %s" % e)
             game.run()
         except (GtpChannelError, BadGtpResponse), e:
             game_controller.close_players()
@@ -266,6 +470,9 @@ class Game_job(object):
             raise job_manager.JobFailed(msg)
         if game.result.is_forfeit:
             warnings.append(game.result.detail)
+        for colour, player in (('b', self.player_b), ('w', self.player_w)):
+            if player.reuse_engine:
+                self._keep_engine(game_controller, game, colour, player)
         game_controller.close_players()
         ru_cpu_times = game_controller.get_resource_usage_cpu_times()
         for colour in game.cpu_time_errors:
@@ -274,7 +481,7 @@ class Game_job(object):
         late_error_messages = game_controller.describe_late_errors()
         if late_error_messages:
             log_entries.append(late_error_messages)
-        self._record_game(game_controller, game)
+        sgf_data = self._record_game(game_controller, game)
         response = Game_job_result()
         response.game_id = self.game_id
         response.game_result = game.result
@@ -285,7 +492,10 @@ class Game_job(object):
             self.player_b.code : game_controller.engine_descriptions['b'],
             self.player_w.code : game_controller.engine_descriptions['w'],
             }
+        response.move_hash = hash_moves(
+            self.player_b.code, self.player_w.code, game.get_moves())
         response.game_data = self.game_data
+        response.sgf_data = sgf_data
         return response
 
     def _make_sgf(self, game_controller, game, game_end_message=None):
@@ -357,12 +567,20 @@ class Game_job(object):
         return sgf_game
 
     def _record_game(self, game_controller, game):
-        """Record the game in the standard sgf directory."""
+        """Record the game in the standard sgf directory.
+
+        If return_sgf is set, returns the serialised game record instead of
+        writing it. Otherwise returns None.
+
+        """
+        if self.return_sgf:
+            return self._make_sgf(game_controller, game).serialise()
         if self.sgf_dirname is None or self.sgf_filename is None:
-            return
+            return None
         pathname = os.path.join(self.sgf_dirname, self.sgf_filename)
         sgf_game = self._make_sgf(game_controller, game)
         self._write_sgf(pathname, sgf_game.serialise())
+        return None
 
     def _record_void_game(self, game_controller, game, game_end_message):
         """Record the game in the void sgf directory if it had any moves.
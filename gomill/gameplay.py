@@ -196,6 +196,30 @@ class Game(object):
             self._set_over()
 
 
+def replay_opening(game, moves):
+    """Play an opening's moves in a Game.
+
+    game  -- Game
+    moves -- list of pairs (colour, move)
+
+    Raises ValueError with an appropriate message if the moves aren't a legal
+    continuation of the game, or if they end it.
+
+    """
+    for colour, move in moves:
+        if game.is_over:
+            raise ValueError("move %d: game is over" % (game.move_count + 1))
+        if colour != game.next_player:
+            raise ValueError("move %d: %s is next to play" %
+                             (game.move_count + 1, game.next_player))
+        game.record_move(colour, move)
+        if game.seen_forfeit:
+            raise ValueError("move %d: %s" %
+                             (game.move_count + 1, game.forfeit_reason))
+    if game.is_over:
+        raise ValueError("opening ends the game")
+
+
 def adjust_score(raw_score, komi, handicap_compensation='no', handicap=0):
     """Adjust an area score for komi and handicap.
 
@@ -488,6 +512,17 @@ class Backend(object):
         """
         raise NotImplementedError
 
+    def notify_opening(self, moves):
+        """Inform both players of a sequence of opening moves.
+
+        moves -- list of pairs (colour, move)
+                 move is (row, col), or None for a pass
+
+        The moves have already been checked for legality.
+
+        """
+        raise NotImplementedError
+
     def get_move(self, colour):
         """Ask a player for its move.
 
@@ -568,6 +603,7 @@ class Game_runner(object):
       runner.set_result_class(...) [optional]
       runner.prepare()
       runner.set_handicap(...) [optional]
+      runner.set_opening(...) [optional]
       runner.run()
       runner.make_sgf()
 
@@ -595,6 +631,7 @@ class Game_runner(object):
         self.result_class = Result
         self.additional_sgf_props = []
         self.handicap_stones = None
+        self.opening = None
         self.moves = []
         self.final_diagnostics = None
         self.game_score = None
@@ -677,11 +714,33 @@ class Game_runner(object):
         self.additional_sgf_props.append(('HA', handicap))
         self.handicap_stones = points
 
+    def set_opening(self, moves):
+        """Arrange for the game to start from a sequence of opening moves.
+
+        moves -- list of pairs (colour, move)
+                 move is (row, col), or None for a pass
+
+        Raises ValueError if the moves aren't a legal start to the game
+        (including if they would end it).
+
+        Propagates any exceptions from the backend notify_opening() method.
+
+        The opening moves are included in get_moves() and make_sgf() (without
+        comments), and count towards the move limit.
+
+        """
+        if self._state not in (1, 2) or self.opening is not None:
+            raise GameRunnerStateError
+        replay_opening(self._make_empty_game(), moves)
+        self._state = 2
+        self.opening = moves
+        self.backend.notify_opening(moves)
+
     def _set_final_diagnostics(self, colour, comment):
         if comment is not None:
             self.final_diagnostics = Diagnostics(colour, comment)
 
-    def _make_game(self):
+    def _make_empty_game(self):
         board = boards.Board(self.board_size)
         if self.handicap_stones:
             board.apply_setup(self.handicap_stones, [], [])
@@ -690,6 +749,14 @@ class Game_runner(object):
             first_player = 'b'
         game = Game(board, first_player)
         game.set_move_limit(self.move_limit)
+        return game
+
+    def _make_game(self):
+        game = self._make_empty_game()
+        if self.opening:
+            replay_opening(game, self.opening)
+            self.moves.extend(
+                (colour, move, None) for colour, move in self.opening)
         game.set_game_over_callback(self.backend.end_game)
         return game
 
@@ -10,6 +10,7 @@ import re
 import signal
 import subprocess
 
+from gomill import cpu_affinity as gomill_cpu_affinity
 from gomill.utils import *
 from gomill.common import *
 
@@ -103,6 +104,11 @@ class Gtp_channel(object):
         self.log_dest = log_dest
         self.log_prefix = prefix
 
+    def disable_logging(self):
+        """Stop logging messages sent and received over the channel."""
+        self.log_dest = None
+        self.log_prefix = None
+
     def _log(self, marker, message):
         """Log a message.
 
@@ -383,6 +389,8 @@ class Subprocess_gtp_channel(Linebased_gtp_channel):
       stderr  -- destination for standard error output (optional)
       cwd     -- working directory to change to (optional)
       env     -- new environment (optional)
+      cpu_affinity -- list of CPU numbers to restrict the subprocess to
+                      (optional)
     Instantiation will raise GtpChannelError if the process can't be started.
 
     This starts the subprocess and speaks GTP over its standard input and
@@ -397,12 +405,22 @@ class Subprocess_gtp_channel(Linebased_gtp_channel):
     Closing the channel waits for the subprocess to exit.
 
     """
-    def __init__(self, command, stderr=None, cwd=None, env=None):
+    def __init__(self, command, stderr=None, cwd=None, env=None,
+                 cpu_affinity=None):
         Linebased_gtp_channel.__init__(self)
+        if cpu_affinity is None:
+            preexec_fn = permit_sigpipe
+        else:
+            if not gomill_cpu_affinity.is_supported():
+                raise GtpChannelError(
+                    "cpu affinity isn't supported on this system")
+            def preexec_fn():
+                permit_sigpipe()
+                gomill_cpu_affinity.set_cpu_affinity(cpu_affinity)
         try:
             p = subprocess.Popen(
                 command,
-                preexec_fn=permit_sigpipe, close_fds=True,
+                preexec_fn=preexec_fn, close_fds=True,
                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
                 stderr=stderr, cwd=cwd, env=env)
         except EnvironmentError, e:
@@ -539,7 +557,65 @@ class Gtp_controller(object):
         """
         if self.channel_is_closed:
             raise StandardError("channel is closed")
+        prepared = self._prepare_command(command, arguments)
+        try:
+            is_sending = True
+            self.channel.send_command(prepared[0], prepared[1])
+            is_sending = False
+            is_failure, response = self.channel.get_response()
+        except GtpChannelError, e:
+            self._handle_channel_error(e, prepared, is_sending)
+            raise
+        if is_failure:
+            self._raise_failure_response(prepared, response)
+        return response
+
+    def do_pipelined_commands(self, commands):
+        """Send several commands to the engine without waiting for responses.
+
+        commands -- list of tuples (command, arguments)
+                    (command and arguments as for do_command)
+
+        Sends all the commands, then reads all the responses.
+
+        Returns a list of the result texts (in the same form as do_command).
+
+        If the engine returns a failure response to any of the commands, raises
+        BadGtpResponse describing the first such failure (after all the
+        responses have been read).
+
+        Raises GtpChannelError in the same circumstances as do_command, marking
+        the channel as bad.
+
+        """
+        if self.channel_is_closed:
+            raise StandardError("channel is closed")
+        prepared_commands = [self._prepare_command(command, arguments)
+                             for (command, arguments) in commands]
+        prepared = None
+        try:
+            is_sending = True
+            for prepared in prepared_commands:
+                self.channel.send_command(prepared[0], prepared[1])
+            is_sending = False
+            responses = []
+            for prepared in prepared_commands:
+                responses.append(self.channel.get_response())
+        except GtpChannelError, e:
+            self._handle_channel_error(e, prepared, is_sending)
+            raise
+        for prepared, (is_failure, response) in zip(prepared_commands,
+                                                    responses):
+            if is_failure:
+                self._raise_failure_response(prepared, response)
+        return [response for (is_failure, response) in responses]
+
+    def _prepare_command(self, command, arguments):
+        """Apply encoding and aliases to a command.
 
+        Returns a tuple (translated command, fixed arguments, is first command)
+
+        """
         def fix_argument(argument):
             if isinstance(argument, unicode):
                 return argument.encode("utf-8")
@@ -551,40 +627,38 @@ class Gtp_controller(object):
         translated_command = self.gtp_aliases.get(fixed_command, fixed_command)
         is_first_command = self.is_first_command
         self.is_first_command = False
+        return translated_command, fixed_arguments, is_first_command
 
-        def format_command():
-            desc = "%s" % (" ".join([translated_command] + fixed_arguments))
-            if is_first_command:
-                return "first command (%s)" % desc
-            else:
-                return "'%s'" % desc
+    def _format_command(self, prepared):
+        translated_command, fixed_arguments, is_first_command = prepared
+        desc = "%s" % (" ".join([translated_command] + fixed_arguments))
+        if is_first_command:
+            return "first command (%s)" % desc
+        else:
+            return "'%s'" % desc
+
+    def _handle_channel_error(self, e, prepared, is_sending):
+        self.channel_is_bad = True
+        if isinstance(e, GtpTransportError):
+            error_label = "transport error"
+        elif isinstance(e, GtpProtocolError):
+            error_label = "GTP protocol error"
+        else:
+            error_label = "error"
+        if is_sending:
+            msg = "%s sending %s to %s:\n%s"
+        else:
+            msg = "%s reading response to %s from %s:\n%s"
+        e.args = (msg % (error_label, self._format_command(prepared),
+                         self.name, e),)
 
-        try:
-            is_sending = True
-            self.channel.send_command(translated_command, fixed_arguments)
-            is_sending = False
-            is_failure, response = self.channel.get_response()
-        except GtpChannelError, e:
-            self.channel_is_bad = True
-            if isinstance(e, GtpTransportError):
-                error_label = "transport error"
-            elif isinstance(e, GtpProtocolError):
-                error_label = "GTP protocol error"
-            else:
-                error_label = "error"
-            if is_sending:
-                msg = "%s sending %s to %s:\n%s"
-            else:
-                msg = "%s reading response to %s from %s:\n%s"
-            e.args = (msg % (error_label, format_command(), self.name, e),)
-            raise
-        if is_failure:
-            raise BadGtpResponse(
-                "failure response from %s to %s:\n%s" %
-                (format_command(), self.name, response),
-                gtp_command=translated_command, gtp_arguments=fixed_arguments,
-                gtp_error_message=response)
-        return response
+    def _raise_failure_response(self, prepared, response):
+        translated_command, fixed_arguments, _ = prepared
+        raise BadGtpResponse(
+            "failure response from %s to %s:\n%s" %
+            (self._format_command(prepared), self.name, response),
+            gtp_command=translated_command, gtp_arguments=fixed_arguments,
+            gtp_error_message=response)
 
     def _known_command(self, command, do_command):
         """Common implementation for known_command and safe_known_command."""
@@ -790,6 +864,9 @@ class Engine_description(object):
 
     Engine_descriptions are suitable for pickling.
 
+    Engine_descriptions are treated as immutable; get_shared_key() is provided
+    so that the job manager doesn't send the same description repeatedly.
+
     """
     def __init__(self, raw_name, raw_version, raw_description):
         self.raw_name = raw_name
@@ -811,6 +888,9 @@ class Engine_description(object):
         else:
             self.description = None
 
+    def get_shared_key(self):
+        return (self.raw_name, self.raw_version, self.description)
+
     @staticmethod
     def _fix_version(name, version):
         if name is not None and version.lower().startswith(name.lower()):
@@ -939,11 +1019,13 @@ class Game_controller(object):
     ## Configuration API
 
     def set_player_controller(self, colour, controller,
-                              check_protocol_version=True):
+                              check_protocol_version=True,
+                              engine_description=None):
         """Specify a player using a Gtp_controller.
 
         controller             -- Gtp_controller
         check_protocol_version -- bool (default True)
+        engine_description     -- Engine_description (default None)
 
         By convention, the controller's name should be 'player <player code>'.
 
@@ -951,7 +1033,7 @@ class Game_controller(object):
         GTP protocol version <> 2 (raises BadGtpResponse).
 
         Sets the engine_descriptions entry for the player, using GTP commands
-        (see Engine_description).
+        (see Engine_description), unless engine_description is supplied.
 
         Propagates GtpChannelError if there's a low-level error checking the
         protocol version or from the engine-description commands.
@@ -961,8 +1043,9 @@ class Game_controller(object):
         if check_protocol_version:
             controller.check_protocol_version()
         player_code = self.players[colour]
-        self.engine_descriptions[colour] = \
-            Engine_description.from_controller(controller)
+        if engine_description is None:
+            engine_description = Engine_description.from_controller(controller)
+        self.engine_descriptions[colour] = engine_description
 
     def set_player_subprocess(self, colour, command,
                               check_protocol_version=True, **kwargs):
@@ -1044,6 +1127,26 @@ class Game_controller(object):
         else:
             return controller.do_command(command, *arguments)
 
+    def send_pipelined_commands(self, colour, commands):
+        """Send several GTP commands to one of the players at once.
+
+        colour   -- player to talk to ('b' or 'w')
+        commands -- list of tuples (command, arguments)
+
+        Returns a list of the responses.
+
+        Raises BadGtpResponse if the engine returns a failure response to any
+        of the commands.
+
+        In cautious mode, the commands are sent one at a time (as if by
+        send_command()).
+
+        """
+        if self.in_cautious_mode:
+            return [self.send_command(colour, command, *arguments)
+                    for (command, arguments) in commands]
+        return self.controllers[colour].do_pipelined_commands(commands)
+
     def maybe_send_command(self, colour, command, *arguments):
         """Send the specified GTP command, if supported.
 
@@ -1096,6 +1199,19 @@ class Game_controller(object):
             controller.safe_close()
             self.late_errors += controller.retrieve_error_messages()
 
+    def release_player(self, colour):
+        """Stop managing the specified player's controller, without closing it.
+
+        Returns the Gtp_controller.
+
+        After this, close_players() will leave the controller open, and
+        get_resource_usage_cpu_times() will report None for the player.
+
+        Raises KeyError if the player has not been set.
+
+        """
+        return self.controllers.pop(colour)
+
     def describe_late_errors(self):
         """Retrieve the late error messages.
 
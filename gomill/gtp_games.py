@@ -236,6 +236,12 @@ class _Gtp_backend(gameplay.Backend):
                 "bad response from fixed_handicap command "
                 "to %s: %s" % (self.gc.players[colour], vertices))
 
+    def notify_opening(self, moves):
+        commands = [("play", [colour, format_vertex(move)])
+                    for colour, move in moves]
+        for colour in "b", "w":
+            self.gc.send_pipelined_commands(colour, commands)
+
     def get_move(self, colour):
         if (self.claim_allowed[colour] and
             self.gc.known_command(colour, "gomill-genmove_ex")):
@@ -352,6 +358,7 @@ class Gtp_game(object):
         game.set_move_callback(...)
       game.prepare()
       game.set_handicap(...) [optional]
+      game.set_opening(...) [optional]
       game.run()
       Any combination of:
         game.get_moves()
@@ -483,6 +490,26 @@ class Gtp_game(object):
         self.backend.handicap = handicap
         self.game_runner.set_handicap(handicap, is_free)
 
+    def set_opening(self, moves):
+        """Arrange for the game to start from a sequence of opening moves.
+
+        moves -- list of pairs (colour, move)
+                 move is (row, col), or None for a pass
+
+        Raises ValueError if the moves aren't a legal start to the game.
+
+        The moves are sent to both engines using 'play' commands (each engine's
+        commands are pipelined).
+
+        Propagates BadGtpResponse if an engine returns a failure response to any
+        of the play commands.
+
+        Propagates GtpChannelError if there is trouble communicating with an
+        engine.
+
+        """
+        self.game_runner.set_opening(moves)
+
     def run(self):
         """Run a complete game between the two players.
 
@@ -1,12 +1,21 @@
 """Job system supporting multiprocessing."""
 
+import os
 import sys
+import time
+import signal
+import socket
+import threading
+import Queue
+import cPickle as pickle
+from cStringIO import StringIO
 
 from gomill import compact_tracebacks
 
 multiprocessing = None
 
 NoJobAvailable = object()
+NoJobAvailableYet = object()
 
 class JobFailed(StandardError):
     """Error reported by a job."""
@@ -26,140 +35,862 @@ def _initialise_multiprocessing():
         return
     try:
         import multiprocessing
+        import multiprocessing.connection
     except ImportError:
         multiprocessing = None
 
+_worker_cleanup_functions = []
+
+def register_worker_cleanup(fn):
+    """Arrange for a function to be called when a worker finishes.
+
+    fn -- function taking an optional worker id
+
+    The function is called in each worker process (or in the main process, for
+    the in-process job manager) after its last job, with no arguments.
+
+    Threaded_job_manager's worker threads share a process, so each of them
+    calls the function with its own worker id when it finishes; the function
+    should then release only the resources belonging to that worker.
+
+    Exceptions from the function are ignored.
+
+    This is intended for releasing resources which jobs keep between runs.
+
+    """
+    if fn not in _worker_cleanup_functions:
+        _worker_cleanup_functions.append(fn)
+
+def _run_worker_cleanup_functions(worker_id=None):
+    for fn in _worker_cleanup_functions:
+        try:
+            if worker_id is None:
+                fn()
+            else:
+                fn(worker_id)
+        except Exception:
+            pass
+
+# Maximum number of shared objects a Shared_object_packer will remember before
+# starting again.
+MAX_SHARED_OBJECTS = 1000
+
+# Maximum number of workers for Multiprocessing_job_manager and
+# Threaded_job_manager
+MAX_WORKERS = 1023
+
+class Shared_object_packer(object):
+    """Pickle objects for another process, sending shared objects only once.
+
+    An object is treated as shared if it has a get_shared_key() method. This
+    should return a hashable value which determines the object's contents
+    (objects with equal keys are treated as interchangeable, so the key must
+    change if the object does).
+
+    The first time an object with a given key is packed, it's sent along with
+    the message; after that, messages refer to it by a serial number.
+
+    Each packer must be used with a single Shared_object_unpacker, which must
+    unpack the messages in the order in which they were packed.
+
+    """
+    def __init__(self):
+        self.serials = {}
+        self.next_serial = 0
+
+    def pack(self, obj):
+        """Return a pickleable message representing 'obj'."""
+        reset = (len(self.serials) >= MAX_SHARED_OBJECTS)
+        if reset:
+            self.serials.clear()
+        new_objects = []
+        def persistent_id(o):
+            get_shared_key = getattr(o, 'get_shared_key', None)
+            if get_shared_key is None:
+                return None
+            key = get_shared_key()
+            serial = self.serials.get(key)
+            if serial is None:
+                serial = self.next_serial
+                self.next_serial += 1
+                self.serials[key] = serial
+                new_objects.append((serial, o))
+            return serial
+        f = StringIO()
+        pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.inst_persistent_id = persistent_id
+        pickler.dump(obj)
+        return reset, new_objects, f.getvalue()
+
+class Shared_object_unpacker(object):
+    """Unpack messages from a Shared_object_packer."""
+    def __init__(self):
+        self.shared_objects = {}
+
+    def unpack(self, message):
+        """Return the object represented by a message."""
+        reset, new_objects, s = message
+        if reset:
+            self.shared_objects.clear()
+        self.shared_objects.update(new_objects)
+        unpickler = pickle.Unpickler(StringIO(s))
+        unpickler.persistent_load = self.shared_objects.__getitem__
+        return unpickler.load()
+
+
 class Worker_finish_signal(object):
     pass
 worker_finish_signal = Worker_finish_signal()
 
-def worker_run_jobs(job_queue, response_queue, worker_id):
+def _run_job(job, worker_id):
+    """Run a job in a worker, returning its response or a JobError."""
+    try:
+        response = job.run(worker_id)
+    except JobFailed, e:
+        response = JobError(job, str(e))
+        sys.exc_clear()
+        del e
+    except Exception:
+        response = JobError(
+            job, compact_tracebacks.format_traceback(skip=1))
+        sys.exc_clear()
+    return response
+
+def get_process_rss():
+    """Return the current process's resident set size in bytes.
+
+    Returns None if it isn't available.
+
+    """
+    try:
+        f = open("/proc/self/statm")
+        try:
+            pages = int(f.read().split()[1])
+        finally:
+            f.close()
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (EnvironmentError, ValueError, IndexError, AttributeError):
+        pass
+    # Fall back to the peak resident set size
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return max_rss
+    return max_rss * 1024
+
+def worker_run_jobs(job_queue, response_queue, worker_id, generation=0,
+                    max_jobs=None, max_rss=None):
+    """Main function for a multiprocessing worker.
+
+    Responses are sent as tuples (tag, message, retiring), where tag is
+    (worker_id, generation), so that the job manager can ignore responses from
+    workers which it has replaced.
+
+    If max_jobs or max_rss (bytes) is set, the worker retires after the first
+    job which takes it past the limit: it sets 'retiring' in that job's
+    response and exits.
+
+    The worker puts itself in a new process group, so that the job manager
+    can kill it together with any subprocesses its jobs have started.
+
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
     try:
         #pid = os.getpid()
         #sys.stderr.write("worker %d starting\n" % pid)
-        while True:
-            job = job_queue.get()
-            #sys.stderr.write("worker %d: %s\n" % (pid, repr(job)))
-            if isinstance(job, Worker_finish_signal):
+        unpacker = Shared_object_unpacker()
+        packer = Shared_object_packer()
+        tag = (worker_id, generation)
+        jobs_run = 0
+        retiring = False
+        while not retiring:
+            message = job_queue.get()
+            if isinstance(message, Worker_finish_signal):
                 break
-            try:
-                response = job.run(worker_id)
-            except JobFailed, e:
-                response = JobError(job, str(e))
-                sys.exc_clear()
-                del e
-            except Exception:
-                response = JobError(
-                    job, compact_tracebacks.format_traceback(skip=1))
-                sys.exc_clear()
-            response_queue.put(response)
+            job = unpacker.unpack(message)
+            #sys.stderr.write("worker %d: %s\n" % (pid, repr(job)))
+            response = _run_job(job, worker_id)
+            jobs_run += 1
+            if max_jobs is not None and jobs_run >= max_jobs:
+                retiring = True
+            elif max_rss is not None:
+                rss = get_process_rss()
+                if rss is not None and rss > max_rss:
+                    retiring = True
+            response_queue.put((tag, packer.pack(response), retiring))
         #sys.stderr.write("worker %d finishing\n" % pid)
-        response_queue.cancel_join_thread()
+        _run_worker_cleanup_functions()
+        if not retiring:
+            # When retiring, the last response must be flushed before the
+            # process exits (the job manager is still reading the queue).
+            response_queue.cancel_join_thread()
     # Unfortunately, there will be places in the child that this doesn't cover.
     # But it will avoid the ugly traceback in most cases.
     except KeyboardInterrupt:
         sys.exit(3)
 
+class Job_manager_stats(object):
+    """Timing statistics for a run of a job manager.
+
+    Public attributes:
+      start_time       -- time.time() when the run started
+      timings          -- map category -> pair (call count, total seconds)
+      jobs_completed   -- int (including jobs reported as errors)
+      worker_busy_time -- map worker id -> total seconds spent running jobs
+      max_backlog      -- int (most responses seen waiting to be processed)
+
+    The job managers record timings in these categories:
+      get_job          -- calls to the job source's get_job()
+      process_response -- calls to process_response() and
+                          process_error_response()
+      wait             -- waiting for responses from workers (including
+                          waits which time out)
+
+    The job source may add its own categories using add_time().
+
+    Worker busy time is recorded when each job's response is received. The
+    in-process job manager's worker id is None.
+
+    """
+    def __init__(self):
+        self.start_time = time.time()
+        self.timings = {}
+        self.jobs_completed = 0
+        self.worker_busy_time = {}
+        self.max_backlog = 0
+
+    def start(self, worker_ids):
+        """Start timing a run.
+
+        worker_ids -- list of worker ids (more may be seen later)
+
+        """
+        self.start_time = time.time()
+        for worker_id in worker_ids:
+            self.worker_busy_time.setdefault(worker_id, 0.0)
+
+    def add_time(self, category, seconds):
+        """Record a call which took the specified time."""
+        count, total = self.timings.get(category, (0, 0.0))
+        self.timings[category] = (count + 1, total + seconds)
+
+    def job_finished(self, worker_id, seconds):
+        """Record that a worker finished a job which took the specified time."""
+        self.jobs_completed += 1
+        self.worker_busy_time[worker_id] = (
+            self.worker_busy_time.get(worker_id, 0.0) + seconds)
+
+    def note_backlog(self, backlog):
+        """Record the number of responses waiting to be processed."""
+        if backlog > self.max_backlog:
+            self.max_backlog = backlog
+
+    def describe(self):
+        """Return a multiline description of the statistics.
+
+        The result doesn't end with a newline.
+
+        """
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        result = []
+        result.append("elapsed time: %.1fs" % elapsed)
+        result.append("jobs completed: %d (%.1f per hour)" %
+                      (self.jobs_completed,
+                       self.jobs_completed * 3600.0 / elapsed))
+        result.append("max response backlog: %d" % self.max_backlog)
+        for category in sorted(self.timings):
+            count, total = self.timings[category]
+            result.append(
+                "%s: %d calls, %.3fs total, %.2fms mean, %.1f%% of elapsed" %
+                (category, count, total, 1000.0 * total / count,
+                 100.0 * total / elapsed))
+        for worker_id in sorted(self.worker_busy_time):
+            busy = min(self.worker_busy_time[worker_id], elapsed)
+            if worker_id is None:
+                worker_name = "in-process worker"
+            else:
+                worker_name = "worker %s" % worker_id
+            result.append("%s: busy %.1fs, idle %.1fs (%.1f%% busy)" %
+                          (worker_name, busy, elapsed - busy,
+                           100.0 * busy / elapsed))
+        return "\n".join(result)
+
+
 class Job_manager(object):
+    """Abstract base class for job managers.
+
+    A job source has methods
+      get_job()                           -- returns a job, NoJobAvailable,
+                                             or NoJobAvailableYet
+      process_response(response)
+      process_error_response(job, message)
+    and optionally
+      cancel_job(job)                     -- see Multiprocessing_job_manager
+                                             and Network_job_manager
+      get_worker_count()                  -- see Multiprocessing_job_manager
+      poll()
+
+    A job manager runs jobs until get_job() returns NoJobAvailable and all
+    running jobs have finished.
+
+    NoJobAvailableYet means that there's no job now, but there may be one
+    later: the job manager asks again after a short wait (about poll_interval
+    seconds, or sooner if a response arrives).
+
+    If the job source has a poll() method, the job manager calls it (from the
+    thread which calls get_job()) at least about every poll_interval seconds
+    while it's waiting for responses, except for In_process_job_manager,
+    which calls it only between jobs.
+
+    """
+    # How often (in seconds) to call the job source while waiting
+    poll_interval = 1.0
+
     def __init__(self):
         self.passed_exceptions = []
+        self.stats = Job_manager_stats()
 
     def pass_exception(self, cls):
         self.passed_exceptions.append(cls)
 
+    def _get_job(self, job_source):
+        started = time.time()
+        try:
+            return job_source.get_job()
+        except Exception, e:
+            for cls in self.passed_exceptions:
+                if isinstance(e, cls):
+                    raise
+            raise JobSourceError(
+                "error from get_job()\n%s" %
+                compact_tracebacks.format_traceback(skip=1))
+        finally:
+            self.stats.add_time('get_job', time.time() - started)
+
+    def _process_response(self, job_source, response):
+        """Pass a response (or JobError) to the job source."""
+        started = time.time()
+        try:
+            self._send_response(job_source, response)
+        finally:
+            self.stats.add_time('process_response', time.time() - started)
+
+    def _poll(self, job_source):
+        """Call the job source's poll() method, if it has one."""
+        poll = getattr(job_source, 'poll', None)
+        if poll is None:
+            return
+        try:
+            poll()
+        except Exception, e:
+            for cls in self.passed_exceptions:
+                if isinstance(e, cls):
+                    raise
+            raise JobSourceError(
+                "error from poll()\n%s" %
+                compact_tracebacks.format_traceback(skip=1))
+
+    def _get_worker_count(self, job_source):
+        """Call the job source's get_worker_count() method, if it has one.
+
+        Returns an int from 1 to MAX_WORKERS, or None.
+
+        """
+        get_worker_count = getattr(job_source, 'get_worker_count', None)
+        if get_worker_count is None:
+            return None
+        try:
+            n = get_worker_count()
+        except Exception, e:
+            for cls in self.passed_exceptions:
+                if isinstance(e, cls):
+                    raise
+            raise JobSourceError(
+                "error from get_worker_count()\n%s" %
+                compact_tracebacks.format_traceback(skip=1))
+        if n is not None and not 1 <= n <= MAX_WORKERS:
+            raise JobSourceError(
+                "get_worker_count() returned invalid count: %r" % (n,))
+        return n
+
+    def _apply_worker_count(self, job_source, idle_workers, active_jobs):
+        """Start or dismiss workers, if the job source asks for it.
+
+        idle_workers -- list of worker ids
+        active_jobs  -- dict whose keys are the busy workers' ids
+
+        Updates idle_workers.
+
+        This is for job managers which keep their worker count in
+        number_of_workers and implement _start_worker() and
+        _dismiss_worker().
+
+        """
+        n = self._get_worker_count(job_source)
+        if n is None or n == self.number_of_workers:
+            return
+        old_n = self.number_of_workers
+        self.number_of_workers = n
+        for worker_id in range(n, old_n):
+            # Busy workers are dismissed when they finish their jobs
+            if worker_id in idle_workers:
+                idle_workers.remove(worker_id)
+                self._dismiss_worker(worker_id)
+        for worker_id in range(old_n, n):
+            # A busy worker may not have been dismissed yet
+            if worker_id not in active_jobs:
+                self._start_worker(worker_id)
+                idle_workers.insert(0, worker_id)
+
+    def _cancel_jobs(self, job_source, jobs):
+        """Offer unstarted jobs to the job source's cancel_job().
+
+        Removes the jobs which it cancels from the list 'jobs'.
+
+        """
+        cancel_job = getattr(job_source, 'cancel_job', None)
+        if cancel_job is None:
+            return
+        try:
+            jobs[:] = [job for job in jobs if not cancel_job(job)]
+        except Exception, e:
+            for cls in self.passed_exceptions:
+                if isinstance(e, cls):
+                    raise
+            raise JobSourceError(
+                "error from cancel_job()\n%s" %
+                compact_tracebacks.format_traceback(skip=1))
+
+    def _send_response(self, job_source, response):
+        if isinstance(response, JobError):
+            try:
+                job_source.process_error_response(
+                    response.job, response.msg)
+            except Exception, e:
+                for cls in self.passed_exceptions:
+                    if isinstance(e, cls):
+                        raise
+                raise JobSourceError(
+                    "error from process_error_response()\n%s" %
+                    compact_tracebacks.format_traceback(skip=1))
+        else:
+            try:
+                job_source.process_response(response)
+            except Exception, e:
+                for cls in self.passed_exceptions:
+                    if isinstance(e, cls):
+                        raise
+                raise JobSourceError(
+                    "error from process_response()\n%s" %
+                    compact_tracebacks.format_traceback(skip=1))
+
 class Multiprocessing_job_manager(Job_manager):
-    def __init__(self, number_of_workers):
+    """Job manager which runs jobs in worker processes.
+
+    Instantiate with
+      number_of_workers -- int
+      job_timeout       -- number of seconds, or None
+
+    Workers are identified by an integer from 0 to number_of_workers-1, which
+    is passed to each job's run() method.
+
+    If a worker process dies, or takes longer than job_timeout (wall-clock
+    time) to run a job, its job is reported to the job source as an error and
+    a new process is started with the same worker id. (A worker which exceeds
+    job_timeout is killed, along with any subprocesses it has started; so are
+    any subprocesses left behind by a worker which dies.)
+
+    Each worker runs in its own process group, so it doesn't see SIGINT from
+    the terminal; if KeyboardInterrupt is raised in run_jobs(), the job
+    manager passes SIGINT on to the workers.
+
+    Optional keyword arguments:
+      max_jobs_per_worker -- int
+      max_worker_rss      -- int (bytes)
+      prefetch            -- int (default 0)
+
+    A worker process which has run max_jobs_per_worker jobs, or whose resident
+    set size has grown beyond max_worker_rss, exits after its current job and
+    is replaced by a new process with the same worker id.
+
+    If prefetch is nonzero, while all the workers are busy the job manager
+    takes up to that many further jobs from the job source, so that a worker
+    which finishes a job can be given its next one straight away.
+
+    If get_job() returns NoJobAvailable while there are prefetched jobs, and
+    the job source has a cancel_job() method, the job manager calls
+    cancel_job(job) for each prefetched job. If this returns true, the job is
+    discarded without being run (otherwise it's run as usual).
+
+    If the job source has a get_worker_count() method, the job manager calls
+    it after each call to poll(). If it returns a number (from 1 to
+    MAX_WORKERS) different from number_of_workers, the job manager starts new
+    workers, or tells the workers with the highest ids to exit (each after
+    finishing its current job), so that the workers are again those with ids
+    from 0 to number_of_workers-1. Returning None leaves the workers alone.
+
+    """
+    # How often (in seconds) to check whether the workers are still alive.
+    check_interval = 2.0
+
+    def __init__(self, number_of_workers, job_timeout=None,
+                 max_jobs_per_worker=None, max_worker_rss=None, prefetch=0):
         Job_manager.__init__(self)
         _initialise_multiprocessing()
         if multiprocessing is None:
             raise StandardError("multiprocessing not available")
-        if not 1 <= number_of_workers < 1024:
+        if not 1 <= number_of_workers <= MAX_WORKERS:
             raise ValueError
         self.number_of_workers = number_of_workers
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss = max_worker_rss
+        self.prefetch = prefetch
 
     def start_workers(self):
-        self.job_queue = multiprocessing.Queue()
+        # Each worker has its own job queue, so that we know which shared
+        # objects it has seen.
+        n = self.number_of_workers
+        self.job_queues = [None] * n
         self.response_queue = multiprocessing.Queue()
-        self.workers = []
-        for i in range(self.number_of_workers):
-            worker = multiprocessing.Process(
-                target=worker_run_jobs,
-                args=(self.job_queue, self.response_queue, i))
-            self.workers.append(worker)
-        for worker in self.workers:
-            worker.start()
+        self.packers = [None] * n
+        self.unpackers = [None] * n
+        self.workers = [None] * n
+        self.generations = [-1] * n
+        # Dismissed worker processes which haven't yet been seen to exit
+        self.dismissed_workers = []
+        for worker_id in range(n):
+            self._start_worker(worker_id)
+        self.stats.start(range(n))
+
+    def _start_worker(self, worker_id):
+        """Start a worker process (replacing any previous one)."""
+        if worker_id == len(self.workers):
+            for l in (self.job_queues, self.packers, self.unpackers,
+                      self.workers):
+                l.append(None)
+            self.generations.append(-1)
+        generation = self.generations[worker_id] + 1
+        job_queue = multiprocessing.Queue()
+        worker = multiprocessing.Process(
+            target=worker_run_jobs,
+            args=(job_queue, self.response_queue, worker_id, generation,
+                  self.max_jobs_per_worker, self.max_worker_rss))
+        self.job_queues[worker_id] = job_queue
+        self.packers[worker_id] = Shared_object_packer()
+        self.unpackers[worker_id] = Shared_object_unpacker()
+        self.workers[worker_id] = worker
+        self.generations[worker_id] = generation
+        worker.start()
+
+    def _forget_worker(self, worker_id):
+        """Leave a worker id without a process."""
+        self.job_queues[worker_id] = None
+        self.workers[worker_id] = None
+
+    def _dismiss_worker(self, worker_id):
+        """Tell an idle worker process to exit, and forget it."""
+        self.job_queues[worker_id].put(worker_finish_signal)
+        self.dismissed_workers.append(self.workers[worker_id])
+        self._forget_worker(worker_id)
+
+    def _signal_worker(self, worker, sig):
+        """Send a signal to a worker's process group.
+
+        Returns False if there is no such process group (eg, if the worker
+        hasn't got as far as creating it, or the group has no members left).
+
+        """
+        try:
+            os.killpg(worker.pid, sig)
+        except (OSError, AttributeError):
+            return False
+        return True
+
+    def _check_workers(self, job_source, active_jobs):
+        """Replace dead and overdue workers.
+
+        active_jobs -- map worker id -> pair (job, start time)
+
+        Reports the jobs of replaced workers as errors, and removes them from
+        active_jobs. (Workers which are due to be dismissed aren't replaced.)
+
+        """
+        now = time.time()
+        # Checking whether a process is alive reaps it if it has exited
+        self.dismissed_workers = [worker for worker in self.dismissed_workers
+                                  if worker.is_alive()]
+        for worker_id, worker in enumerate(self.workers):
+            if worker is None:
+                continue
+            job, started = active_jobs.get(worker_id, (None, None))
+            if not worker.is_alive():
+                if job is not None and worker.exitcode == 0:
+                    # Retired normally; its response is waiting in the queue
+                    continue
+                msg = "worker process died (exit code %s)" % worker.exitcode
+                # Kill any engines it left running
+                self._signal_worker(worker, signal.SIGKILL)
+            elif (job is not None and self.job_timeout is not None and
+                  now - started > self.job_timeout):
+                if not self._signal_worker(worker, signal.SIGKILL):
+                    worker.terminate()
+                msg = ("worker process killed: job took longer than %s "
+                       "seconds" % self.job_timeout)
+            else:
+                continue
+            worker.join()
+            if worker_id < self.number_of_workers:
+                self._start_worker(worker_id)
+            else:
+                self._forget_worker(worker_id)
+            if job is not None:
+                del active_jobs[worker_id]
+                self.stats.job_finished(worker_id, now - started)
+                self._process_response(job_source, JobError(job, msg))
+
+    def _send_job(self, worker_id, job, active_jobs):
+        #sys.stderr.write("MGR: sending %s\n" % repr(job))
+        self.job_queues[worker_id].put(self.packers[worker_id].pack(job))
+        active_jobs[worker_id] = (job, time.time())
 
     def run_jobs(self, job_source):
-        active_jobs = 0
+        try:
+            self._run_jobs(job_source)
+        except KeyboardInterrupt:
+            for worker in self.workers + self.dismissed_workers:
+                if worker is not None:
+                    self._signal_worker(worker, signal.SIGINT)
+            raise
+
+    def _run_jobs(self, job_source):
+        # Map worker id -> pair (job, start time)
+        active_jobs = {}
+        # Most recently used last, so we tend to reuse the same workers.
+        idle_workers = range(self.number_of_workers-1, -1, -1)
+        # Jobs taken from the job source which haven't been sent to a worker
+        prefetched_jobs = []
+        # Set when get_job() returns NoJobAvailable, to avoid asking for more
+        # prefetched jobs until we have another response.
+        source_is_dry = False
+        next_check = time.time() + self.check_interval
         while True:
-            if active_jobs < self.number_of_workers:
-                try:
-                    job = job_source.get_job()
-                except Exception, e:
-                    for cls in self.passed_exceptions:
-                        if isinstance(e, cls):
-                            raise
-                    raise JobSourceError(
-                        "error from get_job()\n%s" %
-                        compact_tracebacks.format_traceback(skip=1))
-                if job is not NoJobAvailable:
-                    #sys.stderr.write("MGR: sending %s\n" % repr(job))
-                    self.job_queue.put(job)
-                    active_jobs += 1
+            source_is_waiting = False
+            if idle_workers:
+                if prefetched_jobs:
+                    job = prefetched_jobs.pop(0)
+                else:
+                    job = self._get_job(job_source)
+                if job is NoJobAvailableYet:
+                    source_is_waiting = True
+                elif job is not NoJobAvailable:
+                    self._send_job(idle_workers.pop(), job, active_jobs)
                     continue
-            if active_jobs == 0:
+            elif len(prefetched_jobs) < self.prefetch and not source_is_dry:
+                job = self._get_job(job_source)
+                if job is NoJobAvailable:
+                    source_is_dry = True
+                    self._cancel_jobs(job_source, prefetched_jobs)
+                elif job is NoJobAvailableYet:
+                    source_is_dry = True
+                else:
+                    prefetched_jobs.append(job)
+                continue
+            if not active_jobs and not source_is_waiting:
                 break
 
-            response = self.response_queue.get()
-            if isinstance(response, JobError):
-                try:
-                    job_source.process_error_response(
-                        response.job, response.msg)
-                except Exception, e:
-                    for cls in self.passed_exceptions:
-                        if isinstance(e, cls):
-                            raise
-                    raise JobSourceError(
-                        "error from process_error_response()\n%s" %
-                        compact_tracebacks.format_traceback(skip=1))
+            waiting_started = time.time()
+            try:
+                tag, message, retiring = self.response_queue.get(
+                    timeout=min(self.check_interval, self.poll_interval))
+            except Queue.Empty:
+                self.stats.add_time('wait', time.time() - waiting_started)
             else:
+                self.stats.add_time('wait', time.time() - waiting_started)
                 try:
-                    job_source.process_response(response)
-                except Exception, e:
-                    for cls in self.passed_exceptions:
-                        if isinstance(e, cls):
-                            raise
-                    raise JobSourceError(
-                        "error from process_response()\n%s" %
-                        compact_tracebacks.format_traceback(skip=1))
-            active_jobs -= 1
-            #sys.stderr.write("MGR: received response %s\n" % repr(response))
+                    self.stats.note_backlog(self.response_queue.qsize() + 1)
+                except NotImplementedError:
+                    pass
+                worker_id, generation = tag
+                # Ignore late responses from workers which have been replaced
+                if generation == self.generations[worker_id]:
+                    job, started = active_jobs.pop(worker_id)
+                    self.stats.job_finished(worker_id, time.time() - started)
+                    response = self.unpackers[worker_id].unpack(message)
+                    if worker_id >= self.number_of_workers:
+                        # Due to be dismissed
+                        if retiring:
+                            self.workers[worker_id].join()
+                            self._forget_worker(worker_id)
+                        else:
+                            self._dismiss_worker(worker_id)
+                    else:
+                        if retiring:
+                            self.workers[worker_id].join()
+                            self._start_worker(worker_id)
+                        if prefetched_jobs:
+                            # Keep the worker busy while we process the
+                            # response
+                            self._send_job(
+                                worker_id, prefetched_jobs.pop(0), active_jobs)
+                        else:
+                            idle_workers.append(worker_id)
+                    source_is_dry = False
+                    self._process_response(job_source, response)
+                    #sys.stderr.write(
+                    #    "MGR: received response %s\n" % repr(response))
+            if time.time() >= next_check:
+                busy = set(active_jobs)
+                self._check_workers(job_source, active_jobs)
+                idle_workers.extend(
+                    worker_id for worker_id in busy.difference(active_jobs)
+                    if worker_id < self.number_of_workers)
+                next_check = time.time() + self.check_interval
+            self._poll(job_source)
+            self._apply_worker_count(job_source, idle_workers, active_jobs)
 
     def finish(self):
-        for _ in range(self.number_of_workers):
-            self.job_queue.put(worker_finish_signal)
-        for worker in self.workers:
-            worker.join()
-        self.job_queue = None
+        for job_queue in self.job_queues:
+            if job_queue is not None:
+                job_queue.put(worker_finish_signal)
+        for worker in self.workers + self.dismissed_workers:
+            if worker is not None:
+                worker.join()
+        self.job_queues = None
         self.response_queue = None
 
-class In_process_job_manager(Job_manager):
+def thread_run_jobs(job_queue, response_queue, worker_id):
+    while True:
+        job = job_queue.get()
+        if isinstance(job, Worker_finish_signal):
+            break
+        response_queue.put((worker_id, _run_job(job, worker_id)))
+    _run_worker_cleanup_functions(worker_id)
+
+class Threaded_job_manager(Job_manager):
+    """Job manager which runs jobs in threads within this process.
+
+    This is suitable for jobs which spend their time waiting for
+    subprocesses: it avoids the cost of a Python interpreter per worker, and
+    jobs and responses are passed to and from the workers without pickling.
+
+    Jobs must not share mutable state, as they run concurrently.
+
+    Each worker thread calls the worker cleanup functions, passing its worker
+    id, when it finishes.
+
+    If the job source has a get_worker_count() method, the number of worker
+    threads can be changed during the run, as for
+    Multiprocessing_job_manager.
+
+    """
+    def __init__(self, number_of_workers):
+        Job_manager.__init__(self)
+        if not 1 <= number_of_workers <= MAX_WORKERS:
+            raise ValueError
+        self.number_of_workers = number_of_workers
+
     def start_workers(self):
-        pass
+        self.job_queues = []
+        self.response_queue = Queue.Queue()
+        self.workers = []
+        # Dismissed worker threads, which may not have finished yet
+        self.dismissed_workers = []
+        for worker_id in range(self.number_of_workers):
+            self._start_worker(worker_id)
+        self.stats.start(range(self.number_of_workers))
+
+    def _start_worker(self, worker_id):
+        """Start a worker thread."""
+        if worker_id == len(self.workers):
+            self.job_queues.append(None)
+            self.workers.append(None)
+        job_queue = Queue.Queue()
+        worker = threading.Thread(
+            target=thread_run_jobs,
+            args=(job_queue, self.response_queue, worker_id))
+        # Don't keep the process alive after KeyboardInterrupt
+        worker.setDaemon(True)
+        self.job_queues[worker_id] = job_queue
+        self.workers[worker_id] = worker
+        worker.start()
+
+    def _dismiss_worker(self, worker_id):
+        """Tell an idle worker thread to finish, and forget it."""
+        self.job_queues[worker_id].put(worker_finish_signal)
+        self.dismissed_workers.append(self.workers[worker_id])
+        self.job_queues[worker_id] = None
+        self.workers[worker_id] = None
 
     def run_jobs(self, job_source):
+        # Map worker id -> start time
+        active_jobs = {}
+        # Most recently used last, so we tend to reuse the same workers.
+        idle_workers = range(self.number_of_workers-1, -1, -1)
         while True:
+            source_is_waiting = False
+            if idle_workers:
+                job = self._get_job(job_source)
+                if job is NoJobAvailableYet:
+                    source_is_waiting = True
+                elif job is not NoJobAvailable:
+                    worker_id = idle_workers.pop()
+                    self.job_queues[worker_id].put(job)
+                    active_jobs[worker_id] = time.time()
+                    continue
+            if not active_jobs and not source_is_waiting:
+                break
+
+            waiting_started = time.time()
+            # (Queue.get() without a timeout would block KeyboardInterrupt)
             try:
-                job = job_source.get_job()
-            except Exception, e:
-                for cls in self.passed_exceptions:
-                    if isinstance(e, cls):
-                        raise
-                raise JobSourceError(
-                    "error from get_job()\n%s" %
-                    compact_tracebacks.format_traceback(skip=1))
+                worker_id, response = self.response_queue.get(
+                    timeout=self.poll_interval)
+            except Queue.Empty:
+                self.stats.add_time('wait', time.time() - waiting_started)
+                self._poll(job_source)
+                self._apply_worker_count(job_source, idle_workers, active_jobs)
+                continue
+            now = time.time()
+            self.stats.add_time('wait', now - waiting_started)
+            self.stats.note_backlog(self.response_queue.qsize() + 1)
+            self.stats.job_finished(worker_id, now - active_jobs.pop(worker_id))
+            if worker_id >= self.number_of_workers:
+                self._dismiss_worker(worker_id)
+            else:
+                idle_workers.append(worker_id)
+            self._process_response(job_source, response)
+            self._poll(job_source)
+            self._apply_worker_count(job_source, idle_workers, active_jobs)
+
+    def finish(self):
+        for job_queue in self.job_queues:
+            if job_queue is not None:
+                job_queue.put(worker_finish_signal)
+        for worker in self.workers + self.dismissed_workers:
+            if worker is not None:
+                worker.join()
+        self.job_queues = None
+        self.response_queue = None
+
+class In_process_job_manager(Job_manager):
+    def start_workers(self):
+        self.stats.start([None])
+
+    def run_jobs(self, job_source):
+        while True:
+            job = self._get_job(job_source)
             if job is NoJobAvailable:
                 break
+            if job is NoJobAvailableYet:
+                time.sleep(self.poll_interval)
+                self._poll(job_source)
+                continue
+            started = time.time()
             try:
                 response = job.run(None)
             except Exception, e:
@@ -167,44 +898,329 @@ class In_process_job_manager(Job_manager):
                     msg = str(e)
                 else:
                     msg = compact_tracebacks.format_traceback(skip=1)
-                try:
-                    job_source.process_error_response(job, msg)
-                except Exception, e:
-                    for cls in self.passed_exceptions:
-                        if isinstance(e, cls):
-                            raise
-                    raise JobSourceError(
-                        "error from process_error_response()\n%s" %
-                        compact_tracebacks.format_traceback(skip=1))
+                response = JobError(job, msg)
+            self.stats.job_finished(None, time.time() - started)
+            self._process_response(job_source, response)
+            self._poll(job_source)
+
+    def finish(self):
+        _run_worker_cleanup_functions()
+
+class _Network_worker(object):
+    """Manager-side record of a connected network worker."""
+    def __init__(self, worker_id, connection):
+        self.worker_id = worker_id
+        self.connection = connection
+        self.packer = Shared_object_packer()
+        self.unpacker = Shared_object_unpacker()
+        self.is_connected = True
+
+class Network_job_manager(Job_manager):
+    """Job manager which runs jobs in workers connecting over TCP.
+
+    Instantiate with
+      address -- pair (host, port) to listen on
+      authkey -- string which workers must also use
+
+    Workers are started independently (see run_network_worker()), and may
+    connect and disconnect at any time. If a worker disconnects while it is
+    running a job, the job is reported to the job source as an error (as for
+    a worker process which dies); a job which couldn't be sent to a worker is
+    sent to another one.
+
+    While no workers are connected, the job manager keeps at most one job
+    waiting for a worker. It offers that job to the job source's cancel_job()
+    (see Multiprocessing_job_manager) about every idle_poll_interval seconds,
+    and once there's no job waiting it calls get_job() again, so that the job
+    source can still end the run.
+
+    If port is 0, an unused port is chosen; after start_workers() the address
+    attribute gives the address actually in use.
+
+    """
+    # How often (in seconds) to ask the job source for work when there are no
+    # workers connected, so that it can decide to stop.
+    idle_poll_interval = 1.0
+
+    def __init__(self, address, authkey):
+        Job_manager.__init__(self)
+        _initialise_multiprocessing()
+        if multiprocessing is None:
+            raise StandardError("multiprocessing not available")
+        self.requested_address = address
+        self.authkey = authkey
+        self.address = None
+        self.listener = None
+        self.workers = []
+
+    def start_workers(self):
+        self.events = Queue.Queue()
+        self.listener = multiprocessing.connection.Listener(
+            self.requested_address, authkey=self.authkey)
+        self.address = self.listener.address
+        self.next_worker_id = 0
+        self.is_closing = False
+        thread = threading.Thread(target=self._accept_connections)
+        thread.setDaemon(True)
+        thread.start()
+        self.stats.start([])
+
+    def _accept_connections(self):
+        listener = self.listener
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception:
+                if self.is_closing:
+                    break
+                # Failed connection attempt (eg, wrong authkey)
+                continue
+            if self.is_closing:
+                connection.close()
+                break
+            worker = _Network_worker(self.next_worker_id, connection)
+            self.next_worker_id += 1
+            try:
+                connection.send(worker.worker_id)
+            except Exception:
+                connection.close()
+                continue
+            self.events.put(('connect', worker, None))
+            thread = threading.Thread(target=self._read_responses,
+                                      args=(worker,))
+            thread.setDaemon(True)
+            thread.start()
+
+    def _read_responses(self, worker):
+        while True:
+            try:
+                message = worker.connection.recv()
+            except Exception:
+                break
+            self.events.put(('response', worker, message))
+        self.events.put(('disconnect', worker, None))
+
+    def _disconnect(self, worker):
+        if worker.is_connected:
+            worker.is_connected = False
+            try:
+                worker.connection.close()
+            except Exception:
+                pass
+
+    def run_jobs(self, job_source):
+        # Most recently used last, so we tend to reuse the same workers.
+        idle_workers = []
+        # Map worker -> pair (job, start time)
+        active_jobs = {}
+        # Jobs taken from the job source which haven't been run yet
+        requeued_jobs = []
+        while True:
+            source_is_waiting = False
+            if idle_workers:
+                if requeued_jobs:
+                    job = requeued_jobs.pop(0)
+                else:
+                    job = self._get_job(job_source)
+                if job is NoJobAvailableYet:
+                    source_is_waiting = True
+                elif job is not NoJobAvailable:
+                    worker = idle_workers.pop()
+                    message = worker.packer.pack(job)
+                    try:
+                        worker.connection.send(message)
+                    except Exception:
+                        # Its reader thread will report the disconnection
+                        self._disconnect(worker)
+                        requeued_jobs.insert(0, job)
+                    else:
+                        active_jobs[worker] = (job, time.time())
+                    continue
+                if not active_jobs and not source_is_waiting:
+                    break
+
+            waiting_started = time.time()
+            try:
+                event, worker, message = self.events.get(
+                    timeout=min(self.idle_poll_interval, self.poll_interval))
+            except Queue.Empty:
+                self.stats.add_time('wait', time.time() - waiting_started)
+                if not idle_workers and not active_jobs:
+                    # No workers: give the job source the chance to abandon
+                    # any waiting jobs, and to stop.
+                    self._cancel_jobs(job_source, requeued_jobs)
+                    if not requeued_jobs:
+                        job = self._get_job(job_source)
+                        if job is NoJobAvailable:
+                            break
+                        if job is not NoJobAvailableYet:
+                            requeued_jobs.append(job)
+                self._poll(job_source)
+                continue
+            self.stats.add_time('wait', time.time() - waiting_started)
+
+            if event == 'connect':
+                self.workers.append(worker)
+                idle_workers.append(worker)
+            elif event == 'disconnect':
+                self._disconnect(worker)
+                if worker in idle_workers:
+                    idle_workers.remove(worker)
+                self.workers.remove(worker)
+                job, started = active_jobs.pop(worker, (None, None))
+                if job is not None:
+                    self.stats.job_finished(
+                        worker.worker_id, time.time() - started)
+                    self._process_response(
+                        job_source,
+                        JobError(job, "network worker disconnected"))
             else:
-                try:
-                    job_source.process_response(response)
-                except Exception, e:
-                    for cls in self.passed_exceptions:
-                        if isinstance(e, cls):
-                            raise
-                    raise JobSourceError(
-                        "error from process_response()\n%s" %
-                        compact_tracebacks.format_traceback(skip=1))
+                if worker not in active_jobs:
+                    continue
+                now = time.time()
+                self.stats.note_backlog(self.events.qsize() + 1)
+                job, started = active_jobs.pop(worker)
+                self.stats.job_finished(worker.worker_id, now - started)
+                idle_workers.append(worker)
+                response = worker.unpacker.unpack(message)
+                self._process_response(job_source, response)
+            self._poll(job_source)
 
     def finish(self):
-        pass
+        if self.listener is not None:
+            # Wake up the thread waiting in accept()
+            self.is_closing = True
+            try:
+                socket.create_connection(self.address, 5).close()
+            except EnvironmentError:
+                pass
+            try:
+                self.listener.close()
+            except Exception:
+                pass
+            self.listener = None
+        while True:
+            try:
+                event, worker, message = self.events.get_nowait()
+            except Queue.Empty:
+                break
+            if event == 'connect':
+                self.workers.append(worker)
+        for worker in self.workers:
+            if worker.is_connected:
+                try:
+                    worker.connection.send(worker_finish_signal)
+                except Exception:
+                    pass
+                self._disconnect(worker)
+        self.workers = []
+
+def parse_network_address(s):
+    """Interpret a HOST:PORT string.
+
+    Returns a pair (host, port). An empty host means all interfaces.
+
+    Raises ValueError if the string isn't acceptable.
+
+    """
+    host, sep, port_s = s.rpartition(":")
+    if not sep:
+        raise ValueError("no port specified")
+    try:
+        port = int(port_s)
+    except ValueError:
+        raise ValueError("bad port number: %s" % port_s)
+    if not 0 <= port < 65536:
+        raise ValueError("bad port number: %s" % port_s)
+    return host, port
+
+def run_network_worker(address, authkey):
+    """Connect to a Network_job_manager and run jobs until told to stop.
+
+    address -- pair (host, port)
+    authkey -- string
+
+    Returns when the job manager finishes or the connection is lost.
+
+    Raises EnvironmentError if it can't connect to the job manager.
+
+    Raises multiprocessing.AuthenticationError if the authkey isn't accepted.
+
+    """
+    _initialise_multiprocessing()
+    if multiprocessing is None:
+        raise StandardError("multiprocessing not available")
+    connection = multiprocessing.connection.Client(address, authkey=authkey)
+    try:
+        worker_id = connection.recv()
+        unpacker = Shared_object_unpacker()
+        packer = Shared_object_packer()
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, EnvironmentError):
+                break
+            if isinstance(message, Worker_finish_signal):
+                break
+            job = unpacker.unpack(message)
+            response = _run_job(job, worker_id)
+            try:
+                connection.send(packer.pack(response))
+            except EnvironmentError:
+                break
+    finally:
+        connection.close()
+        _run_worker_cleanup_functions()
 
 def run_jobs(job_source, max_workers=None, allow_mp=True,
-             passed_exceptions=None):
+             passed_exceptions=None, listen_address=None, authkey=None,
+             use_threads=False, job_timeout=None,
+             max_jobs_per_worker=None, max_worker_rss=None, prefetch=0,
+             stats=None):
+    """Run jobs from a job source until it has no more.
+
+    If listen_address is given, jobs are run by network workers (see
+    Network_job_manager), and allow_mp and max_workers are ignored.
+
+    If use_threads is true, jobs are run by max_workers threads (see
+    Threaded_job_manager), and allow_mp is ignored.
+
+    job_timeout, max_jobs_per_worker, max_worker_rss, and prefetch are passed
+    to Multiprocessing_job_manager; they're ignored for the other job
+    managers.
+
+    If stats is given, it should be a Job_manager_stats object; the job manager
+    records its timings there.
+
+    """
     if allow_mp:
         _initialise_multiprocessing()
         if multiprocessing is None:
             allow_mp = False
-    if allow_mp:
+    if listen_address is not None:
+        job_manager = Network_job_manager(listen_address, authkey)
+    elif use_threads:
+        if max_workers is None:
+            raise ValueError("max_workers is required with use_threads")
+        job_manager = Threaded_job_manager(max_workers)
+    elif allow_mp:
         if max_workers is None:
             max_workers = multiprocessing.cpu_count()
-        job_manager = Multiprocessing_job_manager(max_workers)
+        job_manager = Multiprocessing_job_manager(
+            max_workers, job_timeout,
+            max_jobs_per_worker=max_jobs_per_worker,
+            max_worker_rss=max_worker_rss,
+            prefetch=prefetch)
     else:
         job_manager = In_process_job_manager()
     if passed_exceptions:
         for cls in passed_exceptions:
             job_manager.pass_exception(cls)
+    if stats is not None:
+        job_manager.stats = stats
+    _run_job_manager(job_manager, job_source)
+
+def _run_job_manager(job_manager, job_source):
     job_manager.start_workers()
     try:
         job_manager.run_jobs(job_source)
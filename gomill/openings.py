@@ -0,0 +1,135 @@
+"""Opening positions for tournament games.
+
+An opening is a list of pairs (colour, move), starting with Black and
+alternating; move is (row, col), or None for a pass.
+
+"""
+
+from gomill import boards
+from gomill import gameplay
+from gomill import sgf
+from gomill import sgf_grammar
+from gomill import sgf_moves
+from gomill.common import move_from_vertex, opponent_of
+
+
+def check_opening(moves, board_size):
+    """Check that an opening is a legal start to a game.
+
+    moves      -- list of pairs (colour, move)
+    board_size -- int
+
+    Raises ValueError with an appropriate message if it isn't.
+
+    """
+    gameplay.replay_opening(gameplay.Game(boards.Board(board_size)), moves)
+
+def parse_move_sequences(s, board_size):
+    """Read openings from move-sequence text.
+
+    s          -- 8-bit string
+    board_size -- int
+
+    Returns a list of openings.
+
+    Each nonblank line describes one opening, as a sequence of GTP vertices
+    separated by whitespace (Black plays first). Text from a # character to the
+    end of a line is ignored.
+
+    Raises ValueError if there is an invalid vertex or an illegal move.
+
+    """
+    result = []
+    for line_number, line in enumerate(s.splitlines()):
+        line = line.split("#", 1)[0]
+        vertices = line.split()
+        if not vertices:
+            continue
+        moves = []
+        colour = 'b'
+        try:
+            for vertex in vertices:
+                moves.append((colour, move_from_vertex(vertex, board_size)))
+                colour = opponent_of(colour)
+            check_opening(moves, board_size)
+        except ValueError, e:
+            raise ValueError("line %d: %s" % (line_number + 1, e))
+        result.append(moves)
+    return result
+
+def parse_sgf_openings(s, board_size):
+    """Read openings from an SGF collection.
+
+    s          -- 8-bit string
+    board_size -- int
+
+    Returns a list of openings, one for each game in the collection.
+
+    Each opening is the moves from the game's main sequence. The games must
+    have the specified board size, and no setup stones.
+
+    Raises ValueError if there is an error parsing the collection, or any game
+    isn't suitable.
+
+    """
+    result = []
+    for i, coarse_game in enumerate(sgf_grammar.parse_sgf_collection(s)):
+        try:
+            sgf_game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
+            if sgf_game.get_size() != board_size:
+                raise ValueError("board size is %d" % sgf_game.get_size())
+            board, moves = sgf_moves.get_setup_and_moves(sgf_game)
+            if not board.is_empty():
+                raise ValueError("setup stones aren't supported")
+            check_opening(moves, board_size)
+        except ValueError, e:
+            raise ValueError("game %d: %s" % (i, e))
+        result.append(moves)
+    return result
+
+def read_openings(pathname, board_size):
+    """Read openings from a file.
+
+    pathname   -- pathname of an SGF collection or a move-sequence file
+    board_size -- int
+
+    Returns a nonempty list of openings.
+
+    The file is treated as an SGF collection if its first non-whitespace
+    character is '('; otherwise it's read using parse_move_sequences().
+
+    Raises EnvironmentError if the file can't be read.
+
+    Raises ValueError if the file's contents aren't acceptable.
+
+    """
+    f = open(pathname)
+    try:
+        s = f.read()
+    finally:
+        f.close()
+    if s.lstrip().startswith("("):
+        result = parse_sgf_openings(s, board_size)
+    else:
+        result = parse_move_sequences(s, board_size)
+    if not result:
+        raise ValueError("no openings found")
+    return result
+
+# map (pathname, board_size) -> list of openings
+_openings_cache = {}
+
+def get_openings(pathname, board_size):
+    """Variant of read_openings() which caches its results.
+
+    Each file is read at most once per process (for each board size).
+
+    """
+    key = (pathname, board_size)
+    try:
+        return _openings_cache[key]
+    except KeyError:
+        pass
+    result = read_openings(pathname, board_size)
+    _openings_cache[key] = result
+    return result
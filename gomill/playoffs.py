@@ -171,6 +171,7 @@ class Playoff(tournaments.Tournament):
         p('')
         self.write_screen_report(out)
         self.write_ghost_matchup_reports(out)
+        self.write_duplicate_reports(out)
         p('')
         self.write_player_descriptions(out)
         p('')
@@ -5,6 +5,8 @@ import sys
 from optparse import OptionParser
 
 from gomill import compact_tracebacks
+from gomill import job_manager
+from gomill.ringmaster_pools import Ringmaster_pool
 from gomill.ringmasters import (
     Ringmaster, RingmasterError, RingmasterInternalError)
 
@@ -12,28 +14,69 @@ from gomill.ringmasters import (
 # Action functions return the desired exit status; implicit return is fine to
 # indicate a successful exit.
 
-def do_run(ringmaster, options):
+def prepare_for_run(ringmaster, options):
+    """Run startup checks and load the status for the run action.
+
+    Returns False if the startup checks fail.
+
+    """
     if not options.quiet:
         print "running startup checks on all players"
     if not ringmaster.check_players(discard_stderr=True):
         print "(use the 'check' command to see stderr output)"
-        return 1
+        return False
     if options.log_gtp:
         ringmaster.enable_gtp_logging()
-    if options.quiet:
-        ringmaster.set_display_mode('quiet')
     if ringmaster.status_file_exists():
         ringmaster.load_status()
     else:
         ringmaster.set_clean_status()
+    return True
+
+def set_workers(runner, options):
+    """Apply the worker options to a Ringmaster or Ringmaster_pool."""
     if options.parallel is not None:
-        ringmaster.set_parallel_worker_count(options.parallel)
+        runner.set_parallel_worker_count(options.parallel)
+    runner.set_workers_mode(options.workers_mode)
+    if options.listen is not None:
+        authkey = os.environ.get("GOMILL_AUTHKEY")
+        if not authkey:
+            raise RingmasterError("--listen requires GOMILL_AUTHKEY to be set")
+        runner.set_listen_address(options.listen, authkey)
+
+def do_run(ringmaster, options):
+    if not prepare_for_run(ringmaster, options):
+        return 1
+    if options.quiet:
+        ringmaster.set_display_mode('quiet')
+    set_workers(ringmaster, options)
     ringmaster.run(options.max_games)
     ringmaster.report()
 
+def run_pool(ringmasters, options):
+    """Run several competitions together (the --pool option)."""
+    for ringmaster in ringmasters:
+        if not options.quiet:
+            print "%s:" % ringmaster.competition_code,
+        if not prepare_for_run(ringmaster, options):
+            return 1
+    pool = Ringmaster_pool(ringmasters)
+    set_workers(pool, options)
+    pool.run(options.max_games)
+    for ringmaster in ringmasters:
+        ringmaster.report()
+
 def do_stop(ringmaster, options):
     ringmaster.write_command("stop")
 
+def do_control(ringmaster, options):
+    if not options.control_args:
+        raise RingmasterError("control: no command specified")
+    reply = ringmaster.send_control_command(options.control_args)
+    print reply
+    if reply.startswith("error:"):
+        return 1
+
 def do_show(ringmaster, options):
     if not ringmaster.status_file_exists():
         raise RingmasterError("no status file")
@@ -53,29 +96,56 @@ def do_check(ringmaster, options):
     if not ringmaster.check_players(discard_stderr=False):
         return 1
 
+def do_merge(ringmaster, options):
+    if options.shard is not None:
+        raise RingmasterError("--shard can't be used with merge")
+    shards_merged = ringmaster.merge_shards()
+    ringmaster.report()
+    if not options.quiet:
+        print "merged %d shards" % shards_merged
+
+def do_stats(ringmaster, options):
+    ringmaster.print_stats()
+
 def do_debugstatus(ringmaster, options):
     ringmaster.print_status()
 
 _actions = {
     "run" : do_run,
     "stop" : do_stop,
+    "control" : do_control,
     "show" : do_show,
     "report" : do_report,
     "reset" : do_reset,
     "check" : do_check,
+    "merge" : do_merge,
+    "stats" : do_stats,
     "debugstatus" : do_debugstatus,
     }
 
 
 def run(argv, ringmaster_class):
-    usage = ("%prog [options] <control file> [command]\n\n"
-             "commands: run (default), stop, show, report, reset, check")
+    usage = ("%prog [options] <control file> [command]\n"
+             "       %prog [options] <control file> control <instruction>\n"
+             "       %prog [options] --pool <control file> ...\n\n"
+             "commands: run (default), stop, control, show, report, reset, "
+             "check, merge, stats")
     parser = OptionParser(usage=usage, prog="ringmaster",
                           version=ringmaster_class.public_version)
     parser.add_option("--max-games", "-g", type="int",
                       help="maximum number of games to play in this run")
     parser.add_option("--parallel", "-j", type="int",
                       help="number of worker processes")
+    parser.add_option("--workers-mode", choices=("processes", "threads"),
+                      default="processes", metavar="MODE",
+                      help="run parallel games using 'processes' (default) "
+                      "or 'threads'")
+    parser.add_option("--listen", metavar="HOST:PORT",
+                      help="run games using network workers")
+    parser.add_option("--shard", metavar="K/N",
+                      help="play only shard K of N")
+    parser.add_option("--pool", action="store_true",
+                      help="run several competitions sharing the workers")
     parser.add_option("--quiet", "-q", action="store_true",
                       help="be silent except for warnings and errors")
     parser.add_option("--log-gtp", action="store_true",
@@ -83,22 +153,53 @@ def run(argv, ringmaster_class):
     (options, args) = parser.parse_args(argv)
     if len(args) == 0:
         parser.error("no control file specified")
-    if len(args) > 2:
+    if (len(args) > 2 and not options.pool and
+        args[1] != "control"):
         parser.error("too many arguments")
-    if len(args) == 1:
-        command = "run"
+    if options.workers_mode == "threads" and options.parallel is None:
+        parser.error("--workers-mode=threads requires --parallel")
+    if options.listen is not None:
+        if options.parallel is not None:
+            parser.error("--listen can't be used with --parallel")
+        try:
+            options.listen = job_manager.parse_network_address(options.listen)
+        except ValueError, e:
+            parser.error("--listen: %s" % e)
+    if options.shard is not None:
+        try:
+            shard_s, shard_count_s = options.shard.split("/")
+            options.shard = (int(shard_s), int(shard_count_s))
+        except ValueError:
+            parser.error("--shard: expected K/N")
+    if options.pool:
+        if options.shard is not None:
+            parser.error("--shard can't be used with --pool")
+        ctl_pathnames = args
     else:
-        command = args[1]
-    try:
-        action = _actions[command]
-    except KeyError:
-        parser.error("no such command: %s" % command)
-    ctl_pathname = args[0]
+        if len(args) == 1:
+            command = "run"
+        else:
+            command = args[1]
+        try:
+            action = _actions[command]
+        except KeyError:
+            parser.error("no such command: %s" % command)
+        ctl_pathnames = args[:1]
+        options.control_args = args[2:]
     try:
-        if not os.path.exists(ctl_pathname):
-            raise RingmasterError("control file %s not found" % ctl_pathname)
-        ringmaster = ringmaster_class(ctl_pathname)
-        exit_status = action(ringmaster, options)
+        ringmasters = []
+        for ctl_pathname in ctl_pathnames:
+            if not os.path.exists(ctl_pathname):
+                raise RingmasterError(
+                    "control file %s not found" % ctl_pathname)
+            ringmasters.append(ringmaster_class(ctl_pathname))
+        if options.pool:
+            exit_status = run_pool(ringmasters, options)
+        else:
+            ringmaster, = ringmasters
+            if options.shard is not None and command != "merge":
+                ringmaster.set_shard(*options.shard)
+            exit_status = action(ringmaster, options)
     except RingmasterError, e:
         print >>sys.stderr, "ringmaster:", e
         exit_status = 1
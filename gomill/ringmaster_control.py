@@ -0,0 +1,167 @@
+"""Runtime control of the ringmaster via a Unix-domain socket.
+
+The protocol is line-based: the client connects, sends a single line
+containing a command and its arguments (separated by whitespace), and reads
+the reply until the server closes the connection.
+
+Replies which describe an error begin with 'error: '.
+
+"""
+
+import errno
+import os
+import socket
+
+
+def is_supported():
+    """Check whether control sockets can be used on this system."""
+    return hasattr(socket, 'AF_UNIX')
+
+
+class Control_server(object):
+    """Accept commands on a Unix-domain socket.
+
+    Instantiate with
+      pathname -- filename for the socket
+      handler  -- function taking a list of strings, returning a string
+
+    The handler is called with the command's arguments (the first of which is
+    the command name); its return value is sent to the client as the reply. If
+    the handler raises ValueError, the reply is the error message (prefixed
+    with 'error: ').
+
+    The server doesn't use a thread: call check() regularly to handle any
+    pending commands.
+
+    """
+    # How long (in seconds) to wait for a client to send its command
+    client_timeout = 2.0
+
+    # Longest command line accepted
+    max_command_length = 1024
+
+    def __init__(self, pathname, handler):
+        self.pathname = pathname
+        self.handler = handler
+        self.sock = None
+
+    def open(self):
+        """Create the socket and start listening.
+
+        Removes any existing file with the socket's pathname (the caller
+        should make sure it isn't in use).
+
+        Raises EnvironmentError (including socket.error) if the socket can't be
+        created.
+
+        """
+        if not is_supported():
+            raise EnvironmentError("Unix-domain sockets aren't supported")
+        try:
+            os.remove(self.pathname)
+        except EnvironmentError, e:
+            if e.errno != errno.ENOENT:
+                raise
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.pathname)
+            sock.listen(5)
+            sock.setblocking(False)
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+
+    def check(self):
+        """Handle any pending commands.
+
+        Returns the number of commands handled.
+
+        Errors communicating with a client are ignored.
+
+        """
+        handled = 0
+        while True:
+            try:
+                connection, _ = self.sock.accept()
+            except socket.error, e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                 errno.EINTR):
+                    return handled
+                raise
+            try:
+                try:
+                    self._handle_connection(connection)
+                except socket.error:
+                    pass
+            finally:
+                connection.close()
+            handled += 1
+
+    def _read_command(self, connection):
+        data = []
+        length = 0
+        while length <= self.max_command_length:
+            s = connection.recv(4096)
+            if not s:
+                break
+            data.append(s)
+            length += len(s)
+            if "\n" in s:
+                break
+        return "".join(data).split("\n", 1)[0]
+
+    def _handle_connection(self, connection):
+        connection.setblocking(True)
+        connection.settimeout(self.client_timeout)
+        args = self._read_command(connection).split()
+        if not args:
+            reply = "error: no command"
+        else:
+            try:
+                reply = self.handler(args)
+            except ValueError, e:
+                reply = "error: %s" % e
+        connection.sendall(reply.rstrip("\n") + "\n")
+
+    def close(self):
+        """Stop listening and remove the socket file."""
+        if self.sock is None:
+            return
+        self.sock.close()
+        self.sock = None
+        try:
+            os.remove(self.pathname)
+        except EnvironmentError:
+            pass
+
+
+def send_command(pathname, args, timeout=10.0):
+    """Send a command to a Control_server and return its reply.
+
+    pathname -- filename of the server's socket
+    args     -- nonempty list of strings (command name and arguments)
+    timeout  -- float (seconds)
+
+    Returns the reply, as a string without a trailing newline.
+
+    Raises EnvironmentError (including socket.error) if there's an error
+    communicating with the server.
+
+    """
+    if not is_supported():
+        raise EnvironmentError("Unix-domain sockets aren't supported")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(pathname)
+        sock.sendall(" ".join(args) + "\n")
+        data = []
+        while True:
+            s = sock.recv(4096)
+            if not s:
+                break
+            data.append(s)
+    finally:
+        sock.close()
+    return "".join(data).rstrip("\n")
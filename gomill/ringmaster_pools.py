@@ -0,0 +1,188 @@
+"""Run several competitions sharing one set of workers."""
+
+from __future__ import division
+
+from gomill import compact_tracebacks
+from gomill import job_manager
+from gomill import ringmaster_presenters
+from gomill import terminal_input
+from gomill.competitions import CompetitionError
+from gomill.ringmasters import RingmasterError, RingmasterInternalError
+
+
+class Pool_job(object):
+    """A job from one of a Ringmaster_pool's competitions.
+
+    Public attributes:
+      index -- int (which of the pool's ringmasters the job came from)
+      job   -- the ringmaster's Game_job
+
+    run() returns a pair (index, response).
+
+    """
+    def __init__(self, index, job):
+        self.index = index
+        self.job = job
+
+    def run(self, worker_id):
+        return self.index, self.job.run(worker_id)
+
+
+class Ringmaster_pool(object):
+    """Run several competitions using a single job manager.
+
+    Instantiate with a nonempty list of Ringmasters, whose status must already
+    be loaded.
+
+    Each competition keeps its own state file, logs, and game records, and
+    can be stopped independently using its command file or control socket.
+
+    Games are shared between the competitions in proportion to their
+    pool_weight settings: each new game comes from the competition which has
+    started the fewest games in this run relative to its weight (among those
+    which have a game available).
+
+    The job manager's settings (game_timeout, max_jobs_per_worker,
+    max_worker_rss, and prefetch_games) are taken from the first competition,
+    and only the first competition's control socket accepts the 'workers'
+    instruction.
+
+    The competitions' live displays are replaced by warnings labelled with
+    their competition codes.
+
+    """
+    def __init__(self, ringmasters):
+        if not ringmasters:
+            raise ValueError("no ringmasters")
+        self.ringmasters = list(ringmasters)
+        self.games_started = [0] * len(self.ringmasters)
+        self.terminal_reader = None
+        for ringmaster in self.ringmasters:
+            ringmaster.set_presenter(ringmaster_presenters.Quiet_presenter(
+                label=ringmaster.competition_code))
+            ringmaster.disable_terminal_reader()
+        for ringmaster in self.ringmasters[1:]:
+            ringmaster.disable_worker_control()
+
+    def set_parallel_worker_count(self, n):
+        """See Ringmaster.set_parallel_worker_count()."""
+        for ringmaster in self.ringmasters:
+            ringmaster.set_parallel_worker_count(n)
+
+    def set_workers_mode(self, mode):
+        """See Ringmaster.set_workers_mode()."""
+        for ringmaster in self.ringmasters:
+            ringmaster.set_workers_mode(mode)
+
+    def set_listen_address(self, address, authkey):
+        """See Ringmaster.set_listen_address()."""
+        for ringmaster in self.ringmasters:
+            ringmaster.set_listen_address(address, authkey)
+
+    def _initialise_terminal_reader(self):
+        self.terminal_reader = terminal_input.Terminal_reader()
+        self.terminal_reader.initialise()
+
+    def _call(self, index, method_name, *args):
+        """Call a method of one of the ringmasters.
+
+        Adds the competition code to the message of any RingmasterError or
+        CompetitionError (converting the latter to RingmasterError).
+
+        """
+        ringmaster = self.ringmasters[index]
+        try:
+            return getattr(ringmaster, method_name)(*args)
+        except (RingmasterError, CompetitionError), e:
+            raise RingmasterError("%s: %s" % (ringmaster.competition_code, e))
+
+    def _get_schedule_order(self):
+        """Return the ringmaster indexes in the order they should be asked
+        for games.
+
+        """
+        return sorted(
+            range(len(self.ringmasters)),
+            key=lambda i: (self.games_started[i] /
+                           self.ringmasters[i].pool_weight, i))
+
+    def get_job(self):
+        """Job supply function for the job manager."""
+        if self.terminal_reader.stop_was_requested():
+            self.terminal_reader.acknowledge()
+            for ringmaster in self.ringmasters:
+                if not ringmaster.stopping:
+                    ringmaster._halt_competition(
+                        "stop instruction received from terminal")
+        result = job_manager.NoJobAvailable
+        for index in self._get_schedule_order():
+            job = self._call(index, 'get_job')
+            if job is job_manager.NoJobAvailableYet:
+                result = job
+            elif job is not job_manager.NoJobAvailable:
+                self.games_started[index] += 1
+                return Pool_job(index, job)
+        return result
+
+    def poll(self):
+        """Polling function for the job manager."""
+        for index in range(len(self.ringmasters)):
+            self._call(index, 'poll')
+
+    def process_response(self, response):
+        """Job response function for the job manager."""
+        index, response = response
+        self._call(index, 'process_response', response)
+
+    def process_error_response(self, job, message):
+        """Job error response function for the job manager."""
+        self._call(job.index, 'process_error_response', job.job, message)
+
+    def cancel_job(self, job):
+        """Job cancellation function for the job manager."""
+        return self._call(job.index, 'cancel_job', job.job)
+
+    def get_worker_count(self):
+        """Worker count function for the job manager."""
+        return self._call(0, 'get_worker_count')
+
+    def _abort_runs(self, description, details=None):
+        for ringmaster in self.ringmasters:
+            ringmaster._abort_run(description, details)
+
+    def run(self, max_games=None):
+        """Run the competitions.
+
+        max_games -- int or None (maximum games to start in this run, for each
+                     competition)
+
+        Returns when each competition has stopped for one of the reasons
+        described in Ringmaster.run().
+
+        """
+        for ringmaster in self.ringmasters:
+            ringmaster._start_run(max_games)
+        # The job manager's statistics cover the whole pool.
+        stats = self.ringmasters[0].job_stats
+        for ringmaster in self.ringmasters:
+            ringmaster.job_stats = stats
+        self._initialise_terminal_reader()
+        try:
+            job_manager.run_jobs(
+                job_source=self,
+                **self.ringmasters[0]._get_job_manager_arguments())
+        except KeyboardInterrupt:
+            self._abort_runs("interrupted")
+            raise
+        except RingmasterError, e:
+            self._abort_runs("finished with error", e)
+            raise
+        except (job_manager.JobSourceError, RingmasterInternalError), e:
+            self._abort_runs("finished with internal error", e)
+            raise RingmasterInternalError(e)
+        except:
+            self._abort_runs("finished with internal error",
+                             compact_tracebacks.format_traceback())
+            raise
+        for ringmaster in self.ringmasters:
+            ringmaster._finish_run()
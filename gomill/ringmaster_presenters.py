@@ -80,14 +80,21 @@ class Quiet_presenter(Presenter):
 
     Warnings go to stderr.
 
+    If label is given, it's prefixed to each warning.
+
     """
     shows_warnings_only = True
 
+    def __init__(self, label=None):
+        self.label = label
+
     def clear(self, channel):
         pass
 
     def say(self, channel, s):
         if channel == 'warnings':
+            if self.label is not None:
+                s = "%s: %s" % (self.label, s)
             print >>sys.stderr, s
 
     def refresh(self):
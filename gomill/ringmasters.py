@@ -9,6 +9,8 @@ import os
 import re
 import shutil
 import sys
+import time
+from cStringIO import StringIO
 
 try:
     import fcntl
@@ -16,14 +18,35 @@ except ImportError:
     fcntl = None
 
 from gomill import compact_tracebacks
+from gomill import cpu_affinity
 from gomill import game_jobs
 from gomill import job_manager
+from gomill import ringmaster_control
 from gomill import ringmaster_presenters
+from gomill import sgf
 from gomill import terminal_input
 from gomill.settings import *
 from gomill.competitions import (
     NoGameAvailable, CompetitionError, ControlFileError)
 
+def interpret_cpu_affinity(v):
+    if v == 'auto':
+        return v
+    result = []
+    for i, cpus in enumerate(interpret_sequence(v)):
+        try:
+            cpus = [interpret_int(cpu) for cpu in interpret_sequence(cpus)]
+            if not cpus:
+                raise ValueError("no cpus listed")
+            if min(cpus) < 0:
+                raise ValueError("negative cpu number")
+        except ValueError, e:
+            raise ValueError("slot %d: %s" % (i, e))
+        result.append(cpus)
+    if not result:
+        raise ValueError("empty list")
+    return result
+
 def interpret_python(source, provided_globals, display_filename):
     """Interpret Python code from a unicode string.
 
@@ -74,6 +97,9 @@ class Ringmaster(object):
     # Channel used for printing
     stdout = sys.stdout
 
+    # How often (in seconds) to log job manager statistics during a run
+    stats_interval = 600
+
     def __init__(self, control_pathname):
         """Instantiate and initialise a Ringmaster.
 
@@ -83,37 +109,98 @@ class Ringmaster(object):
 
         """
         self.display_mode = 'clearing'
+        self.custom_presenter = None
+        self.use_terminal_reader = True
         self.worker_count = None
+        self.workers_mode = 'processes'
+        self.cpu_affinity_map = None
+        self.job_stats = None
+        self.next_stats_time = None
+        self.listen_address = None
+        self.authkey = None
         self.max_games_this_run = None
         self.presenter = None
         self.terminal_reader = None
         self.stopping = False
         self.stopping_reason = None
+        self.cancelling_prefetched_games = False
+        self.control_server = None
+        self.paused = False
+        # Whether the control socket may change worker_count
+        self.allow_worker_control = True
+        # Maximum number of games in progress, set via the control socket (for
+        # network workers)
+        self.simultaneous_game_limit = None
         # Map game_id -> int
         self.game_error_counts = {}
         self.write_gtp_logs = False
+        # Collection file for game records (see sgf_collection_size)
+        self.sgf_collection_file = None
+        self.sgf_collection_offset = None
+        self.sgf_collection_game_count = None
+        self.sgf_index_file = None
+        # Map game_id -> (filename, offset), or None if not yet read
+        self.sgf_locations = None
 
         self.control_pathname = control_pathname
         self.base_directory, control_filename = os.path.split(control_pathname)
         self.competition_code, ext = os.path.splitext(control_filename)
-        if ext in (".log", ".status", ".cmd", ".hist",
-                   ".report", ".games", ".void", ".gtplogs"):
+        if ext in (".log", ".status", ".cmd", ".sock", ".hist", ".report",
+                   ".stats", ".games", ".void", ".gtplogs"):
             raise RingmasterError("forbidden control file extension: %s" % ext)
-        stem = os.path.join(self.base_directory, self.competition_code)
+        self.shard = None
+        self.shard_count = None
+        self._set_pathnames(
+            os.path.join(self.base_directory, self.competition_code))
+
+        self.status_is_loaded = False
+        try:
+            self._load_control_file()
+        except ControlFileError, e:
+            raise RingmasterError("error in control file:\n%s" % e)
+
+    def _set_pathnames(self, stem):
+        """Set the pathnames of the competition's output files."""
         self.log_pathname = stem + ".log"
         self.status_pathname = stem + ".status"
         self.command_pathname = stem + ".cmd"
+        self.socket_pathname = stem + ".sock"
         self.history_pathname = stem + ".hist"
         self.report_pathname = stem + ".report"
+        self.stats_pathname = stem + ".stats"
         self.sgf_dir_pathname = stem + ".games"
+        self.sgf_index_pathname = os.path.join(self.sgf_dir_pathname, "index")
         self.void_dir_pathname = stem + ".void"
         self.gtplog_dir_pathname = stem + ".gtplogs"
 
-        self.status_is_loaded = False
+    def _get_shard_stem(self, shard):
+        return os.path.join(self.base_directory,
+                            "%s.shard%d" % (self.competition_code, shard))
+
+    def set_shard(self, shard, shard_count):
+        """Run only one shard of the competition.
+
+        shard       -- int (counting from 0)
+        shard_count -- int
+
+        The shard has its own state and output files (named like
+        <code>.shard<n>.status); use merge_shards() to combine them.
+
+        Call this before loading or setting the status.
+
+        Raises RingmasterError if the competition doesn't support sharding.
+
+        """
+        if not 0 <= shard < shard_count:
+            raise RingmasterError("shard number out of range")
         try:
-            self._load_control_file()
-        except ControlFileError, e:
-            raise RingmasterError("error in control file:\n%s" % e)
+            self.competition.set_shard(shard, shard_count)
+        except NotImplementedError:
+            raise RingmasterError(
+                "competition type doesn't support sharding")
+        self.shard = shard
+        self.shard_count = shard_count
+        self._set_pathnames(self._get_shard_stem(shard))
 
     def set_stdout(self, f):
         """Set the ringmaster's standard output.
@@ -303,10 +390,26 @@ class Ringmaster(object):
             self.historyfile.close()
         except EnvironmentError, e:
             raise RingmasterError("error closing history file:\n%s" % e)
+        try:
+            self._close_sgf_collection()
+            if self.sgf_index_file is not None:
+                self.sgf_index_file.close()
+                self.sgf_index_file = None
+        except EnvironmentError, e:
+            raise RingmasterError("error closing game record file:\n%s" % e)
 
     ringmaster_settings = [
         Setting('record_games', interpret_bool, True),
+        Setting('sgf_collection_size', allow_none(interpret_positive_int),
+                None),
         Setting('stderr_to_log', interpret_bool, True),
+        Setting('game_timeout', allow_none(interpret_positive_float), None),
+        Setting('max_jobs_per_worker', allow_none(interpret_positive_int),
+                None),
+        Setting('max_worker_rss', allow_none(interpret_positive_int), None),
+        Setting('cpu_affinity', allow_none(interpret_cpu_affinity), None),
+        Setting('prefetch_games', allow_none(interpret_positive_int), None),
+        Setting('pool_weight', interpret_positive_float, 1.0),
         ]
 
     def _initialise_from_control_file(self, config):
@@ -328,6 +431,73 @@ class Ringmaster(object):
     def set_parallel_worker_count(self, n):
         self.worker_count = n
 
+    def set_workers_mode(self, mode):
+        """Specify how to run parallel games.
+
+        mode -- 'processes' or 'threads'
+
+        This has no effect unless set_parallel_worker_count() is used.
+
+        """
+        if mode not in ('processes', 'threads'):
+            raise ValueError
+        self.workers_mode = mode
+
+    def _set_cpu_affinity_map(self):
+        """Work out which CPUs each worker slot's players should use.
+
+        Sets cpu_affinity_map (list of lists of ints, or None).
+
+        """
+        self.cpu_affinity_map = None
+        if self.cpu_affinity is None or self.worker_count is None:
+            return
+        if self.workers_mode == 'threads':
+            # Affinity is set in a preexec_fn, which isn't safe in a child
+            # forked from a multithreaded process.
+            raise RingmasterError(
+                "cpu_affinity can't be used with --workers-mode=threads")
+        if not cpu_affinity.is_supported():
+            raise RingmasterError(
+                "cpu_affinity isn't supported on this system")
+        if self.cpu_affinity == 'auto':
+            self.cpu_affinity_map = cpu_affinity.allocate_cpus(
+                cpu_affinity.get_available_cpus(), self.worker_count)
+        else:
+            self.cpu_affinity_map = self.cpu_affinity
+        for slot, cpus in enumerate(self.cpu_affinity_map):
+            if slot >= self.worker_count:
+                break
+            self.log("slot %d uses cpus %s" %
+                     (slot, ",".join(map(str, cpus))))
+
+    def _get_max_worker_rss_bytes(self):
+        if self.max_worker_rss is None:
+            return None
+        # The setting is in megabytes
+        return self.max_worker_rss * 1024 * 1024
+
+    def set_listen_address(self, address, authkey):
+        """Run games using network workers.
+
+        address -- pair (host, port) to listen on
+        authkey -- string which the workers must also use
+
+        """
+        self.listen_address = address
+        self.authkey = authkey
+
+    def _is_parallel(self):
+        return (self.worker_count is not None or
+                self.listen_address is not None)
+
+    def _get_max_worker_count(self):
+        """Return the most workers the 'workers' instruction may ask for."""
+        if self.cpu_affinity_map is not None:
+            # Further workers would have no CPUs assigned
+            return len(self.cpu_affinity_map)
+        return job_manager.MAX_WORKERS
+
     def log(self, s):
         print >>self.logfile, s
         self.logfile.flush()
@@ -356,11 +526,32 @@ class Ringmaster(object):
             raise RingmasterError("unknown presenter type: %s" % presenter_code)
         self.display_mode = presenter_code
 
+    def set_presenter(self, presenter):
+        """Specify a Presenter object to use during run().
+
+        This overrides set_display_mode().
+
+        """
+        self.custom_presenter = presenter
+
+    def disable_terminal_reader(self):
+        """Don't check the terminal for stop instructions during run()."""
+        self.use_terminal_reader = False
+
+    def disable_worker_control(self):
+        """Refuse the control socket's 'workers' instruction during run()."""
+        self.allow_worker_control = False
+
     def _initialise_presenter(self):
-        self.presenter = self._presenter_classes[self.display_mode]()
+        if self.custom_presenter is not None:
+            self.presenter = self.custom_presenter
+        else:
+            self.presenter = self._presenter_classes[self.display_mode]()
 
     def _initialise_terminal_reader(self):
         self.terminal_reader = terminal_input.Terminal_reader()
+        if not self.use_terminal_reader:
+            self.terminal_reader.disable()
         self.terminal_reader.initialise()
 
     def get_sgf_filename(self, game_id):
@@ -372,6 +563,140 @@ class Ringmaster(object):
         return os.path.join(self.sgf_dir_pathname,
                             self.get_sgf_filename(game_id))
 
+    def get_sgf_collection_filename(self, game_id):
+        """Return the filename for a collection file given its first game id."""
+        return "collection_%s.sgf" % game_id
+
+    def get_sgf_location(self, game_id):
+        """Find the sgf game record for a game.
+
+        Returns a pair (pathname, offset), or None if there is no record.
+
+        offset is the position of the game's opening '(' in the file. It is
+        zero unless the game was recorded in a collection file (see the
+        sgf_collection_size setting).
+
+        Games in collection files are found using the game record index.
+
+        """
+        try:
+            filename, offset = self._get_sgf_locations()[game_id]
+        except KeyError:
+            pathname = self.get_sgf_pathname(game_id)
+            if not os.path.exists(pathname):
+                return None
+            return pathname, 0
+        return os.path.join(self.sgf_dir_pathname, filename), offset
+
+    def load_sgf_game(self, game_id):
+        """Read the sgf game record for a game.
+
+        Returns an sgf.Sgf_game.
+
+        Raises RingmasterError if there is no record, or it can't be read.
+
+        """
+        location = self.get_sgf_location(game_id)
+        if location is None:
+            raise RingmasterError("no game record for game %s" % game_id)
+        pathname, offset = location
+        try:
+            with open(pathname, "rb") as f:
+                f.seek(offset)
+                for _, sgf_game in sgf.Sgf_game.iter_collection(f):
+                    return sgf_game
+        except (EnvironmentError, ValueError), e:
+            raise RingmasterError("error reading game record for game %s:\n%s"
+                                  % (game_id, e))
+        raise RingmasterError("error reading game record for game %s:\n"
+                              "no SGF data found" % game_id)
+
+    def _get_sgf_locations(self):
+        if self.sgf_locations is None:
+            self.sgf_locations = self._read_sgf_index(self.sgf_index_pathname)
+        return self.sgf_locations
+
+    @staticmethod
+    def _read_sgf_index(pathname):
+        """Read a game record index file.
+
+        Returns a dict game_id -> (filename, offset).
+
+        Returns an empty dict if the file doesn't exist.
+
+        If a game appears more than once, the last entry is used. Incomplete
+        lines (from an interrupted run) are ignored.
+
+        """
+        result = {}
+        try:
+            f = open(pathname)
+        except EnvironmentError, e:
+            if e.errno == errno.ENOENT:
+                return result
+            raise RingmasterError("error reading game record index:\n%s" % e)
+        try:
+            for line in f:
+                try:
+                    game_id, filename, offset_s = line.rstrip("\n").split("\t")
+                    result[game_id] = (filename, int(offset_s))
+                except ValueError:
+                    continue
+        except EnvironmentError, e:
+            raise RingmasterError("error reading game record index:\n%s" % e)
+        finally:
+            f.close()
+        return result
+
+    def _start_sgf_collection(self, game_id):
+        """Open a new collection file for game records.
+
+        game_id -- the first game to be written to the file
+
+        """
+        self._close_sgf_collection()
+        f = open(os.path.join(self.sgf_dir_pathname,
+                              self.get_sgf_collection_filename(game_id)), "ab")
+        # The file already exists if this game has been recorded before (if
+        # the ringmaster was interrupted before saving its state).
+        f.seek(0, os.SEEK_END)
+        self.sgf_collection_file = f
+        self.sgf_collection_offset = f.tell()
+        self.sgf_collection_game_count = 0
+        if self.sgf_index_file is None:
+            self.sgf_index_file = open(self.sgf_index_pathname, "a")
+
+    def _close_sgf_collection(self):
+        if self.sgf_collection_file is not None:
+            self.sgf_collection_file.close()
+            self.sgf_collection_file = None
+
+    def _record_sgf(self, game_id, sgf_data):
+        """Append a game record to the current collection file.
+
+        Starts a new collection file when the current one is full (and at the
+        start of each run), and adds the game to the game record index.
+
+        """
+        try:
+            if (self.sgf_collection_file is None or
+                self.sgf_collection_game_count >= self.sgf_collection_size):
+                self._start_sgf_collection(game_id)
+            f = self.sgf_collection_file
+            offset = self.sgf_collection_offset
+            f.write(sgf_data)
+            f.flush()
+            filename = os.path.basename(f.name)
+            self.sgf_index_file.write("%s\t%s\t%d\n" %
+                                      (game_id, filename, offset))
+            self.sgf_index_file.flush()
+        except EnvironmentError, e:
+            raise RingmasterError("error writing game record:\n%s" % e)
+        self.sgf_collection_offset += len(sgf_data)
+        self.sgf_collection_game_count += 1
+        if self.sgf_locations is not None:
+            self.sgf_locations[game_id] = (filename, offset)
+
 
     # State attributes (*: in persistent state):
     #  * void_game_count   -- int
@@ -388,17 +713,30 @@ class Ringmaster(object):
 
     def write_status(self):
         """Write the persistent state file."""
+        started = time.time()
+        try:
+            self._write_competition_status()
+        finally:
+            self._record_time('write_status', started)
+
+    def _write_competition_status(self):
         competition_status = self.competition.get_status()
         status = {
             'void_game_count' : self.void_game_count,
             'comp_vn'         : self.competition.status_format_version,
             'comp'            : competition_status,
+            'shard'           : self._get_shard_spec(),
             }
         try:
             self._write_status((self.status_format_version, status))
         except EnvironmentError, e:
             raise RingmasterError("error writing persistent state:\n%s" % e)
 
+    def _get_shard_spec(self):
+        if self.shard is None:
+            return None
+        return (self.shard, self.shard_count)
+
     def _load_status(self):
         """Return the unpickled contents of the persistent state file."""
         with open(self.status_pathname, "rb") as f:
@@ -415,6 +753,7 @@ class Ringmaster(object):
             self.games_in_progress = {}
             self.games_to_replay = {}
             competition_status = status['comp']
+            shard_spec = status.get('shard')
         except pickle.UnpicklingError:
             raise RingmasterError("corrupt status file")
         except EnvironmentError, e:
@@ -424,6 +763,11 @@ class Ringmaster(object):
         except Exception, e:
             # Probably an exception from __setstate__ somewhere
             raise RingmasterError("incompatible status file")
+        if shard_spec != self._get_shard_spec():
+            if shard_spec is None:
+                raise RingmasterError("status file is not for a shard")
+            raise RingmasterError(
+                "status file is for shard %d of %d" % shard_spec)
         try:
             self.competition.set_status(competition_status)
         except CompetitionError, e:
@@ -474,6 +818,24 @@ class Ringmaster(object):
         except EnvironmentError, e:
             raise RingmasterError("error writing command file:\n%s" % e)
 
+    def send_control_command(self, args):
+        """Send a command to the running competition's control socket.
+
+        args -- nonempty list of strings (command name and arguments)
+
+        Returns the reply, as a string without a trailing newline.
+
+        """
+        try:
+            return ringmaster_control.send_command(self.socket_pathname, args)
+        except EnvironmentError, e:
+            if getattr(e, 'errno', None) in (errno.ENOENT, errno.ECONNREFUSED):
+                raise RingmasterError(
+                    "can't connect to control socket "
+                    "(is the competition running?)")
+            raise RingmasterError(
+                "error communicating with control socket:\n%s" % e)
+
     def get_tournament_results(self):
         """Provide access to the tournament's results.
 
@@ -504,14 +866,210 @@ class Ringmaster(object):
         """
         self.competition.write_short_report(self.stdout)
 
-    def _halt_competition(self, reason):
+    def _record_time(self, category, started):
+        """Add to the job manager statistics, if a run is in progress.
+
+        started -- time.time() when the operation started
+
+        """
+        if self.job_stats is not None:
+            self.job_stats.add_time(category, time.time() - started)
+
+    def _write_stats_file(self, s):
+        """Write the contents of the stats file."""
+        f = open(self.stats_pathname + ".new", "w")
+        f.write(s)
+        f.close()
+        os.rename(self.stats_pathname + ".new", self.stats_pathname)
+
+    def _read_stats_file(self):
+        """Return the contents of the stats file."""
+        with open(self.stats_pathname) as f:
+            return f.read()
+
+    def _write_stats(self):
+        """Log the job manager statistics and write them to the stats file."""
+        description = self.job_stats.describe()
+        self.log("job manager statistics:\n%s" % "\n".join(
+            "  " + line for line in description.split("\n")))
+        try:
+            self._write_stats_file(description + "\n")
+        except EnvironmentError, e:
+            self.warn("error writing stats file:\n%s" % e)
+        self.next_stats_time = time.time() + self.stats_interval
+
+    def _check_stats_interval(self):
+        if (self.job_stats is not None and
+            time.time() >= self.next_stats_time):
+            self._write_stats()
+
+    def print_stats(self):
+        """Print the job manager statistics from the most recent run.
+
+        This is for the 'stats' command.
+
+        """
+        try:
+            self.stdout.write(self._read_stats_file())
+        except EnvironmentError, e:
+            if e.errno == errno.ENOENT:
+                raise RingmasterError("no stats file")
+            raise RingmasterError("error reading stats file:\n%s" % e)
+
+    def _open_control_socket(self):
+        """Start listening on the control socket.
+
+        If the socket can't be created, logs the reason and continues without
+        it.
+
+        """
+        if not ringmaster_control.is_supported():
+            return
+        server = ringmaster_control.Control_server(
+            self.socket_pathname, self._handle_control_command)
+        try:
+            server.open()
+        except EnvironmentError, e:
+            self.log("not using control socket: %s" % e)
+            return
+        self.control_server = server
+
+    def _close_control_socket(self):
+        if self.control_server is None:
+            return
+        self.control_server.close()
+        self.control_server = None
+
+    def poll(self):
+        """Polling function for the job manager.
+
+        Handles commands from the control socket, and stop requests from the
+        terminal or the .cmd file (so that they're noticed even while the job
+        manager isn't asking for jobs).
+
+        """
+        if not self.stopping:
+            self._check_for_stop_request()
+            if self.stopping:
+                self._update_display()
+        if self.control_server is None:
+            return
+        if self.control_server.check():
+            self._update_display()
+
+    def _describe_state(self):
+        """Return a string describing the run's state for the control socket.
+
+        """
+        out = StringIO()
+        if self.stopping:
+            print >>out, "stopping: %s" % self.stopping_reason
+        elif self.paused:
+            print >>out, "paused"
+        else:
+            print >>out, "running"
+        print >>out, "games in progress: %s" % (
+            " ".join(sorted(self.games_in_progress)) or "none")
+        if self.listen_address is None and self.worker_count is not None:
+            print >>out, "workers: %d" % self.worker_count
+        if self.simultaneous_game_limit is not None:
+            print >>out, "simultaneous game limit: %d" % (
+                self.simultaneous_game_limit)
+        if self.max_games_this_run is not None:
+            print >>out, "will start at most %d more games in this run" % (
+                self.max_games_this_run)
+        if self.void_game_count > 0:
+            print >>out, "%d void games; see log file." % self.void_game_count
+        self.competition.write_screen_report(out)
+        return out.getvalue()
+
+    def _handle_control_command(self, args):
+        """Handler for the control socket.
+
+        args -- nonempty list of strings
+
+        Returns the reply to send.
+
+        Raises ValueError if the command isn't acceptable.
+
+        """
+        command, args = args[0], args[1:]
+        def check_arg_count(n):
+            if len(args) != n:
+                raise ValueError("%s: expected %d arguments" % (command, n))
+        def parse_count(s, minimum):
+            try:
+                n = int(s)
+            except ValueError:
+                n = -1
+            if n < minimum:
+                raise ValueError("%s: invalid count: %s" % (command, s))
+            return n
+        if command == "status":
+            check_arg_count(0)
+            return self._describe_state()
+        elif command == "pause":
+            check_arg_count(0)
+            if not self.paused:
+                self.paused = True
+                self.log("pausing: no new games will be started")
+        elif command == "resume":
+            check_arg_count(0)
+            if self.paused:
+                self.paused = False
+                self.log("resuming")
+        elif command == "workers":
+            check_arg_count(1)
+            if not self._is_parallel():
+                raise ValueError("workers: not running parallel games")
+            n = parse_count(args[0], 1)
+            if self.listen_address is not None:
+                # The network workers come and go as they please
+                self.simultaneous_game_limit = n
+                self.log("limiting simultaneous games to %d" % n)
+            else:
+                if not self.allow_worker_control:
+                    raise ValueError(
+                        "workers: the pool's first competition controls "
+                        "the workers")
+                maximum = self._get_max_worker_count()
+                if n > maximum:
+                    raise ValueError("workers: at most %d workers allowed" %
+                                     maximum)
+                self.worker_count = n
+                self.log("setting number of workers to %d" % n)
+        elif command == "limit":
+            check_arg_count(2)
+            matchup_id = args[0]
+            n = parse_count(args[1], 0)
+            try:
+                self.competition.set_matchup_game_limit(matchup_id, n)
+            except NotImplementedError:
+                raise ValueError("limit: not supported by this competition")
+            except CompetitionError, e:
+                raise ValueError("limit: %s" % e)
+            self.log("game limit for matchup %s set to %d for this run" %
+                     (matchup_id, n))
+        elif command == "stop":
+            check_arg_count(0)
+            if not self.stopping:
+                self._halt_competition("stop command received")
+        else:
+            raise ValueError("unknown command: %s" % command)
+        return "ok"
+
+    def _halt_competition(self, reason, cancel_prefetched_games=True):
         """Make the competition stop submitting new games.
 
         reason -- message for the log and the status box.
 
+        If cancel_prefetched_games is true, games which the job manager has
+        prefetched but not started are abandoned (see cancel_job()).
+
         """
         self.stopping = True
         self.stopping_reason = reason
+        self.cancelling_prefetched_games = cancel_prefetched_games
         self.log("halting competition: %s" % reason)
 
     def _update_display(self):
@@ -522,23 +1080,34 @@ class Ringmaster(object):
         """
         if self.presenter.shows_warnings_only:
             return
+        started = time.time()
+        try:
+            self._refresh_display()
+        finally:
+            self._record_time('update_display', started)
+
+    def _refresh_display(self):
         def p(s):
             self.say('status', s)
         self.presenter.clear('status')
         if self.stopping:
-            if self.worker_count is None or not self.games_in_progress:
+            if not self._is_parallel() or not self.games_in_progress:
                 p("halting: %s" % self.stopping_reason)
             else:
                 p("waiting for workers to finish: %s" %
                   self.stopping_reason)
         if self.games_in_progress:
-            if self.worker_count is None:
+            if not self._is_parallel():
                 gms = "game"
             else:
                 gms = "%d games" % len(self.games_in_progress)
             p("%s in progress: %s" %
               (gms, " ".join(sorted(self.games_in_progress))))
         if not self.stopping:
+            if self.paused:
+                p("paused: no new games will be started")
+            elif self.simultaneous_game_limit is not None:
+                p("at most %d games at once" % self.simultaneous_game_limit)
             if self.max_games_this_run is not None:
                 p("will start at most %d more games in this run" %
                   self.max_games_this_run)
@@ -563,13 +1132,17 @@ class Ringmaster(object):
         job.sgf_game_name = "%s %s" % (self.competition_code, job.game_id)
         if self.record_games:
             job.sgf_filename = self.get_sgf_filename(job.game_id)
-            job.sgf_dirname = self.sgf_dir_pathname
+            if self.sgf_collection_size is None:
+                job.sgf_dirname = self.sgf_dir_pathname
+            else:
+                job.return_sgf = True
             job.void_sgf_dirname = self.void_dir_pathname
         if self.write_gtp_logs:
             job.gtp_log_pathname = os.path.join(
                     self.gtplog_dir_pathname, "%s.log" % job.game_id)
         if self.stderr_to_log:
             job.stderr_pathname = self.log_pathname
+        job.cpu_affinity_map = self.cpu_affinity_map
 
     def get_job(self):
         """Job supply function for the job manager."""
@@ -580,30 +1153,21 @@ class Ringmaster(object):
     def _get_job(self):
         """Main implementation of get_job()."""
 
+        if not self.stopping:
+            self._check_for_stop_request()
         if self.stopping:
             return job_manager.NoJobAvailable
 
-        if self.terminal_reader.stop_was_requested():
-            self._halt_competition("stop instruction received from terminal")
-            if self.presenter.shows_warnings_only:
-                self.terminal_reader.acknowledge()
-            return job_manager.NoJobAvailable
-
-        try:
-            if os.path.exists(self.command_pathname):
-                command = open(self.command_pathname).read()
-                if command == "stop":
-                    self._halt_competition("stop command received")
-                    try:
-                        os.remove(self.command_pathname)
-                    except EnvironmentError, e:
-                        self.warn("error removing .cmd file:\n%s" % e)
-                    return job_manager.NoJobAvailable
-        except EnvironmentError, e:
-            self.warn("error reading .cmd file:\n%s" % e)
+        if self.paused:
+            return job_manager.NoJobAvailableYet
+        if (self.simultaneous_game_limit is not None and
+            len(self.games_in_progress) >= self.simultaneous_game_limit):
+            return job_manager.NoJobAvailableYet
         if self.max_games_this_run is not None:
             if self.max_games_this_run == 0:
-                self._halt_competition("max-games reached for this run")
+                # Prefetched games count towards max-games, so let them run
+                self._halt_competition("max-games reached for this run",
+                                       cancel_prefetched_games=False)
                 return job_manager.NoJobAvailable
             self.max_games_this_run -= 1
 
@@ -624,6 +1188,55 @@ class Ringmaster(object):
 
         return job
 
+    def _check_for_stop_request(self):
+        """Halt the competition if the terminal or .cmd file asks for it."""
+        if self.terminal_reader.stop_was_requested():
+            self._halt_competition("stop instruction received from terminal")
+            if self.presenter.shows_warnings_only:
+                self.terminal_reader.acknowledge()
+            return
+
+        try:
+            if os.path.exists(self.command_pathname):
+                command = open(self.command_pathname).read()
+                if command == "stop":
+                    self._halt_competition("stop command received")
+                    try:
+                        os.remove(self.command_pathname)
+                    except EnvironmentError, e:
+                        self.warn("error removing .cmd file:\n%s" % e)
+        except EnvironmentError, e:
+            self.warn("error reading .cmd file:\n%s" % e)
+
+    def get_worker_count(self):
+        """Worker count function for the job manager.
+
+        Returns the number of workers to use (which the control socket may
+        change), or None for network workers.
+
+        """
+        if self.listen_address is not None:
+            return None
+        return self.worker_count
+
+    def cancel_job(self, job):
+        """Job cancellation function for the job manager.
+
+        This is called for games which the job manager has prefetched but not
+        started, when get_job() has returned NoJobAvailable.
+
+        Returns True if the game should be abandoned.
+
+        An abandoned game is left issued-but-not-fixed in the competition's
+        state, so it's played in a later run.
+
+        """
+        if not (self.stopping and self.cancelling_prefetched_games):
+            return False
+        del self.games_in_progress[job.game_id]
+        self.log("abandoning game %s before it started" % job.game_id)
+        return True
+
     def process_response(self, response):
         """Job response function for the job manager."""
         # We log before processing the result, in case there's an error from the
@@ -633,6 +1246,8 @@ class Ringmaster(object):
             self.warn(warning)
         for log_entry in response.log_entries:
             self.log(log_entry)
+        if response.sgf_data is not None:
+            self._record_sgf(response.game_id, response.sgf_data)
         result_description = self.competition.process_game_result(response)
         del self.games_in_progress[response.game_id]
         self.write_status()
@@ -640,6 +1255,7 @@ class Ringmaster(object):
             result_description = response.game_result.describe()
         self.say('results', "game %s: %s" % (
             response.game_id, result_description))
+        self._check_stats_interval()
 
     def process_error_response(self, job, message):
         """Job error response function for the job manager."""
@@ -662,28 +1278,18 @@ class Ringmaster(object):
             # No need to log: _halt competition will do so
             self.say('warnings', "halting run due to void games")
             self._halt_competition("too many void games")
+        self._check_stats_interval()
 
-    def run(self, max_games=None):
-        """Run the competition.
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
 
-        max_games -- int or None (maximum games to start in this run)
+    def _start_run(self, max_games):
+        """Prepare to run the competition (first part of run()).
 
-        Returns when max_games have been played in this run, when the
-        Competition is over, or when a 'stop' command is received via the
-        command file.
+        Opens the log files and initialises the display.
 
         """
-        def now():
-            return datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-
-        def log_games_in_progress():
-            try:
-                msg = "games in progress were: %s" % (
-                    " ".join(sorted(self.games_in_progress)))
-            except Exception:
-                pass
-            self.log(msg)
-
         self._open_files()
         self.competition.set_event_logger(self.log)
         self.competition.set_history_logger(self.log_history)
@@ -691,37 +1297,93 @@ class Ringmaster(object):
         self._initialise_presenter()
         self._initialise_terminal_reader()
 
-        allow_mp = (self.worker_count is not None)
-        self.log("run started at %s with max_games %s" % (now(), max_games))
-        if allow_mp:
-            self.log("using %d worker processes" % self.worker_count)
+        self.log("run started at %s with max_games %s" %
+                 (self._now(), max_games))
+        if self.listen_address is not None:
+            self.log("listening for network workers on %s:%d" %
+                     self.listen_address)
+        elif self.worker_count is not None:
+            self.log("using %d worker %s" %
+                     (self.worker_count, self.workers_mode))
+        self._set_cpu_affinity_map()
+        self.job_stats = job_manager.Job_manager_stats()
+        self.next_stats_time = time.time() + self.stats_interval
         self.max_games_this_run = max_games
+        self._open_control_socket()
         self._update_display()
+
+    def _get_job_manager_arguments(self):
+        """Return keyword arguments for job_manager.run_jobs().
+
+        Returns a dict which doesn't include job_source.
+
+        """
+        allow_mp = (self.worker_count is not None)
+        return dict(
+            allow_mp=allow_mp, max_workers=self.worker_count,
+            listen_address=self.listen_address, authkey=self.authkey,
+            use_threads=(allow_mp and self.workers_mode == 'threads'),
+            job_timeout=self.game_timeout,
+            max_jobs_per_worker=self.max_jobs_per_worker,
+            max_worker_rss=self._get_max_worker_rss_bytes(),
+            prefetch=(self.prefetch_games or 0),
+            stats=self.job_stats,
+            passed_exceptions=[RingmasterError, CompetitionError,
+                               RingmasterInternalError])
+
+    def _abort_run(self, description, details=None):
+        """Log that a run ended abnormally (last part of run()).
+
+        description -- eg "interrupted"
+        details     -- string to log, or None
+
+        """
+        self.log("run %s at %s" % (description, self._now()))
+        if details is not None:
+            self.log(details)
+        try:
+            self.log("games in progress were: %s" %
+                     " ".join(sorted(self.games_in_progress)))
+        except Exception:
+            pass
+        self._write_stats()
+        self._close_control_socket()
+
+    def _finish_run(self):
+        """Log that a run ended normally (last part of run())."""
+        self._write_stats()
+        self._close_control_socket()
+        self.log("run finished at %s" % self._now())
+        self._close_files()
+
+    def run(self, max_games=None):
+        """Run the competition.
+
+        max_games -- int or None (maximum games to start in this run)
+
+        Returns when max_games have been played in this run, when the
+        Competition is over, or when a 'stop' command is received via the
+        command file.
+
+        """
+        self._start_run(max_games)
         try:
             job_manager.run_jobs(
-                job_source=self,
-                allow_mp=allow_mp, max_workers=self.worker_count,
-                passed_exceptions=[RingmasterError, CompetitionError,
-                                   RingmasterInternalError])
+                job_source=self, **self._get_job_manager_arguments())
         except KeyboardInterrupt:
-            self.log("run interrupted at %s" % now())
-            log_games_in_progress()
+            self._abort_run("interrupted")
             raise
         except (RingmasterError, CompetitionError), e:
-            self.log("run finished with error at %s\n%s" % (now(), e))
-            log_games_in_progress()
+            self._abort_run("finished with error", e)
             raise RingmasterError(e)
         except (job_manager.JobSourceError, RingmasterInternalError), e:
-            self.log("run finished with internal error at %s\n%s" % (now(), e))
-            log_games_in_progress()
+            self._abort_run("finished with internal error", e)
             raise RingmasterInternalError(e)
         except:
-            self.log("run finished with internal error at %s" % now())
-            self.log(compact_tracebacks.format_traceback())
-            log_games_in_progress()
+            self._abort_run("finished with internal error",
+                            compact_tracebacks.format_traceback())
             raise
-        self.log("run finished at %s" % now())
-        self._close_files()
+        self._finish_run()
 
     def delete_state_and_output(self):
         """Delete all files generated by this competition.
@@ -733,8 +1395,10 @@ class Ringmaster(object):
             self.log_pathname,
             self.status_pathname,
             self.command_pathname,
+            self.socket_pathname,
             self.history_pathname,
             self.report_pathname,
+            self.stats_pathname,
             ]:
             if os.path.exists(pathname):
                 try:
@@ -752,6 +1416,157 @@ class Ringmaster(object):
                 except EnvironmentError, e:
                     print >>sys.stderr, e
 
+    def merge_shards(self):
+        """Combine the state and game records of a sharded competition.
+
+        Finds the state files written by set_shard() runs, and writes a state
+        file for the whole competition combining their results. Game records
+        are linked (or copied) into the competition's own directories. The
+        shards' files are left in place.
+
+        Returns the number of shards merged.
+
+        Refuses to overwrite an existing state file for the competition.
+
+        """
+        if self.shard is not None:
+            raise RingmasterError("can't merge into a shard")
+        if self.status_file_exists():
+            raise RingmasterError(
+                "status file already exists (use reset to remove it)")
+        shard_files = self._read_shard_status_files()
+        if not shard_files:
+            raise RingmasterError("no shard status files found")
+        shard_statuses = []
+        void_game_count = 0
+        shard_count = None
+        for shard, contents in shard_files:
+            pathname = self._get_shard_stem(shard) + ".status"
+            try:
+                status_format_version, status = contents
+                if (status_format_version != self.status_format_version or
+                    status['comp_vn'] !=
+                    self.competition.status_format_version):
+                    raise StandardError
+                shard_spec = status['shard']
+                if shard_spec is None or shard_spec[0] != shard:
+                    raise StandardError
+            except Exception:
+                raise RingmasterError("incompatible status file: %s" %
+                                      pathname)
+            if shard_count is None:
+                shard_count = shard_spec[1]
+            elif shard_spec[1] != shard_count:
+                raise RingmasterError(
+                    "shard status files disagree about the number of shards")
+            void_game_count += status['void_game_count']
+            shard_statuses.append((shard, shard_count, status['comp']))
+        missing = sorted(set(range(shard_count)) -
+                         set(shard for shard, _ in shard_files))
+        if missing:
+            raise RingmasterError(
+                "missing status files for shards: %s" %
+                " ".join(str(shard) for shard in missing))
+
+        try:
+            competition_status = self.competition.merge_shard_statuses(
+                shard_statuses)
+        except NotImplementedError:
+            raise RingmasterError(
+                "competition type doesn't support sharding")
+        except CompetitionError, e:
+            raise RingmasterError("error merging shards: %s" % e)
+        try:
+            self.competition.set_status(competition_status)
+        except CompetitionError, e:
+            raise RingmasterError("error loading competition state: %s" % e)
+        self.void_game_count = void_game_count
+        self.games_in_progress = {}
+        self.games_to_replay = {}
+        self.status_is_loaded = True
+
+        index_filename = os.path.basename(self.sgf_index_pathname)
+        index_lines = []
+        for shard, _ in shard_files:
+            stem = self._get_shard_stem(shard)
+            for src_dir, dst_dir in [
+                (stem + ".games", self.sgf_dir_pathname),
+                (stem + ".void", self.void_dir_pathname),
+                ]:
+                try:
+                    self._link_files(src_dir, dst_dir, skip=[index_filename])
+                except EnvironmentError, e:
+                    raise RingmasterError(
+                        "error merging game records:\n%s" % e)
+            index_lines += [
+                "%s\t%s\t%d\n" % (game_id, filename, offset)
+                for game_id, (filename, offset) in sorted(
+                    self._read_sgf_index(
+                        os.path.join(stem + ".games", index_filename)
+                    ).iteritems())]
+        if index_lines:
+            try:
+                with open(self.sgf_index_pathname, "w") as f:
+                    f.writelines(index_lines)
+            except EnvironmentError, e:
+                raise RingmasterError(
+                    "error merging game record index:\n%s" % e)
+        self.write_status()
+        return len(shard_files)
+
+    def _read_shard_status_files(self):
+        """Find and read the state files for this competition's shards.
+
+        Returns a list of pairs (shard, unpickled status file contents),
+        ordered by shard.
+
+        """
+        prefix = "%s.shard" % self.competition_code
+        result = []
+        try:
+            for filename in sorted(os.listdir(self.base_directory or
+                                              os.curdir)):
+                if not (filename.startswith(prefix) and
+                        filename.endswith(".status")):
+                    continue
+                shard_s = filename[len(prefix):-len(".status")]
+                if not shard_s.isdigit():
+                    continue
+                pathname = os.path.join(self.base_directory, filename)
+                try:
+                    with open(pathname, "rb") as f:
+                        contents = pickle.load(f)
+                except pickle.UnpicklingError:
+                    raise RingmasterError("corrupt status file: %s" % pathname)
+                result.append((int(shard_s), contents))
+        except EnvironmentError, e:
+            raise RingmasterError("error loading status file:\n%s" % e)
+        result.sort(key=lambda pair: pair[0])
+        return result
+
+    @staticmethod
+    def _link_files(src_dir, dst_dir, skip=()):
+        """Hard-link (or copy) all the files in one directory to another.
+
+        Files whose names are in 'skip' are left alone.
+
+        """
+        if not os.path.isdir(src_dir):
+            return
+        if not os.path.exists(dst_dir):
+            os.mkdir(dst_dir)
+        for filename in os.listdir(src_dir):
+            if filename in skip:
+                continue
+            src = os.path.join(src_dir, filename)
+            dst = os.path.join(dst_dir, filename)
+            if os.path.exists(dst):
+                os.remove(dst)
+            try:
+                os.link(src, dst)
+            except (EnvironmentError, AttributeError):
+                shutil.copy2(src, dst)
+
     def check_players(self, discard_stderr=False):
         """Check that the engines required for the competition will run.
 
@@ -23,6 +23,8 @@ class Node(object):
     Changing the SZ property isn't allowed.
 
     """
+    __slots__ = ('_property_map', '_presenter', '__weakref__')
+
     def __init__(self, property_map, presenter):
         # Map identifier (PropIdent) -> nonempty list of raw values
         self._property_map = property_map
@@ -340,23 +342,55 @@ class Tree_node(Node):
       parent -- the nodes's parent Tree_node (None for the root node)
 
     """
+    # For nodes loaded from a parse tree, _children is None until the node's
+    # children are first needed; until then, _coarse_tree and _coarse_index
+    # identify the node's property map in the parse tree.
+    __slots__ = ('owner', 'parent', '_children',
+                 '_coarse_tree', '_coarse_index')
+
     def __init__(self, parent, properties):
         self.owner = parent.owner
         self.parent = parent
         self._children = []
+        self._coarse_tree = None
         Node.__init__(self, properties, parent._presenter)
 
+    def _expand(self):
+        """Create the node's children from the parse tree.
+
+        Returns the list of children.
+
+        The children are themselves left unexpanded.
+
+        """
+        game_tree = self._coarse_tree
+        index = self._coarse_index + 1
+        self._coarse_tree = None
+        if index < len(game_tree.sequence):
+            children = [_make_unexpanded_node(self, game_tree, index)]
+        else:
+            children = [_make_unexpanded_node(self, child_tree, 0)
+                        for child_tree in game_tree.children]
+        self._children = children
+        return children
+
+    def _get_children(self):
+        children = self._children
+        if children is None:
+            children = self._expand()
+        return children
+
     def _add_child(self, node):
-        self._children.append(node)
+        self._get_children().append(node)
 
     def __len__(self):
-        return len(self._children)
+        return len(self._get_children())
 
     def __getitem__(self, key):
-        return self._children[key]
+        return self._get_children()[key]
 
     def index(self, child):
-        return self._children.index(child)
+        return self._get_children().index(child)
 
     def new_child(self, index=None):
         """Create a new Tree_node and add it as this node's last child.
@@ -369,9 +403,9 @@ class Tree_node(Node):
         """
         child = Tree_node(self, {})
         if index is None:
-            self._children.append(child)
+            self._get_children().append(child)
         else:
-            self._children.insert(index, child)
+            self._get_children().insert(index, child)
         return child
 
     def delete(self):
@@ -406,9 +440,9 @@ class Tree_node(Node):
         self.parent._children.remove(self)
         self.parent = new_parent
         if index is None:
-            new_parent._children.append(self)
+            new_parent._get_children().append(self)
         else:
-            new_parent._children.insert(index, self)
+            new_parent._get_children().insert(index, self)
 
     def find(self, identifier):
         """Find the nearest ancestor-or-self containing the specified property.
@@ -441,47 +475,58 @@ class Tree_node(Node):
             raise KeyError
         return node.get(identifier)
 
+def _make_unexpanded_node(parent, game_tree, index):
+    """Create a Tree_node for a node from a parse tree.
+
+    parent    -- Tree_node
+    game_tree -- Coarse_game_tree
+    index     -- index into game_tree.sequence
+
+    The new node's children aren't created until they're needed.
+
+    """
+    node = Tree_node.__new__(Tree_node)
+    node.owner = parent.owner
+    node.parent = parent
+    node._children = None
+    node._coarse_tree = game_tree
+    node._coarse_index = index
+    node._property_map = game_tree.sequence[index]
+    node._presenter = parent._presenter
+    return node
+
 class _Root_tree_node(Tree_node):
     """Variant of Tree_node used for a game root."""
+    __slots__ = ()
+
     def __init__(self, property_map, owner):
         self.owner = owner
         self.parent = None
         self._children = []
+        self._coarse_tree = None
         Node.__init__(self, property_map, owner.presenter)
 
-class _Unexpanded_root_tree_node(_Root_tree_node):
-    """Variant of _Root_tree_node used with 'loaded' Sgf_games."""
-    def __init__(self, owner, coarse_tree):
-        _Root_tree_node.__init__(self, coarse_tree.sequence[0], owner)
-        self._coarse_tree = coarse_tree
-
-    def _expand(self):
-        sgf_grammar.make_tree(
-            self._coarse_tree, self, Tree_node, Tree_node._add_child)
-        delattr(self, '_coarse_tree')
-        self.__class__ = _Root_tree_node
-
-    def __len__(self):
-        self._expand()
-        return self.__len__()
-
-    def __getitem__(self, key):
-        self._expand()
-        return self.__getitem__(key)
-
-    def index(self, child):
-        self._expand()
-        return self.index(child)
-
-    def new_child(self, index=None):
-        self._expand()
-        return self.new_child(index)
-
     def _main_sequence_iter(self):
+        """Variant of Sgf_game.main_sequence_iter() for an unexpanded root."""
         presenter = self._presenter
         for properties in sgf_grammar.main_sequence_iter(self._coarse_tree):
             yield Node(properties, presenter)
 
+def _make_unexpanded_root(owner, game_tree):
+    """Create a _Root_tree_node for a parse tree.
+
+    owner     -- Sgf_game
+    game_tree -- Coarse_game_tree
+
+    The rest of the tree isn't created until it's needed.
+
+    """
+    root = _Root_tree_node(game_tree.sequence[0], owner)
+    root._children = None
+    root._coarse_tree = game_tree
+    root._coarse_index = 0
+    return root
+
 
 class Sgf_game(object):
     """An SGF game tree.
@@ -518,12 +563,15 @@ class Sgf_game(object):
         return game
 
     def __init__(self, *args, **kwargs):
-        self.root = _Root_tree_node({}, self)
-        self.root.set_raw('FF', "4")
-        self.root.set_raw('GM', "1")
-        self.root.set_raw('SZ', str(self.size))
-        # Read the encoding back so we get the normalised form
-        self.root.set_raw('CA', self.presenter.encoding)
+        # These values are known to be valid, so this bypasses set_raw().
+        # Reading the encoding back from the presenter gives the normalised
+        # form.
+        self.root = _Root_tree_node({
+            'FF' : ["4"],
+            'GM' : ["1"],
+            'SZ' : [str(self.size)],
+            'CA' : [self.presenter.encoding],
+            }, self)
 
     @classmethod
     def from_coarse_game_tree(cls, coarse_game, override_encoding=None):
@@ -561,7 +609,7 @@ class Sgf_game(object):
         else:
             encoding = override_encoding
         game = cls.__new__(cls, size, encoding)
-        game.root = _Unexpanded_root_tree_node(game, coarse_game)
+        game.root = _make_unexpanded_root(game, coarse_game)
         if override_encoding is not None:
             game.root.set_raw("CA", game.presenter.encoding)
         return game
@@ -581,6 +629,31 @@ class Sgf_game(object):
         coarse_game = sgf_grammar.parse_sgf_game(s)
         return cls.from_coarse_game_tree(coarse_game, override_encoding)
 
+    @classmethod
+    def iter_collection(cls, f, override_encoding=None):
+        """Alternative constructor: read Sgf_games from a collection file.
+
+        f -- file-like object with a read() method (eg a file or an mmap)
+
+        Returns an iterator yielding pairs (offset, Sgf_game). See
+        sgf_grammar.iter_sgf_collection() for details.
+
+        Only one game's data is read into memory at a time; each game's tree
+        is expanded only when it's first used.
+
+        Raises ValueError if it can't parse a game.
+
+        See from_coarse_game_tree for details of size and encoding handling.
+
+        """
+        for i, (offset, coarse_game) in enumerate(
+                sgf_grammar.iter_sgf_collection(f)):
+            try:
+                game = cls.from_coarse_game_tree(coarse_game, override_encoding)
+            except ValueError, e:
+                raise ValueError("error parsing game %d: %s" % (i, e))
+            yield offset, game
+
     def serialise(self, wrap=79):
         """Serialise the SGF data as a string.
 
@@ -605,18 +678,47 @@ class Sgf_game(object):
         than 'wrap'.
 
         """
+        encoding = self._get_target_encoding()
+        serialised = sgf_grammar.serialise_game_tree(
+            self._make_coarse_game_tree(), wrap)
+        if encoding == self.root.get_encoding():
+            return serialised
+        else:
+            return serialised.decode(self.root.get_encoding()).encode(encoding)
+
+    def write(self, f, wrap=79):
+        """Serialise the SGF data to a file.
+
+        f    -- file-like object with a write() method
+        wrap -- int (default 79), or None
+
+        Writes the same data as serialise() would return. Unless the data has
+        to be transcoded, it's written a line at a time rather than built up
+        as a single string.
+
+        Returns the number of bytes written.
+
+        Raises the same exceptions as serialise(), before writing anything.
+
+        """
+        encoding = self._get_target_encoding()
+        if encoding != self.root.get_encoding():
+            serialised = self.serialise(wrap)
+            f.write(serialised)
+            return len(serialised)
+        return sgf_grammar.write_game_tree(
+            f, self._make_coarse_game_tree(), wrap)
+
+    def _get_target_encoding(self):
         try:
-            encoding = self.get_charset()
+            return self.get_charset()
         except ValueError:
             raise ValueError("unsupported charset: %s" %
                              self.root.get_raw_list("CA"))
-        coarse_tree = sgf_grammar.make_coarse_game_tree(
+
+    def _make_coarse_game_tree(self):
+        return sgf_grammar.make_coarse_game_tree(
             self.root, lambda node:node, Node.get_raw_property_map)
-        serialised = sgf_grammar.serialise_game_tree(coarse_tree, wrap)
-        if encoding == self.root.get_encoding():
-            return serialised
-        else:
-            return serialised.decode(self.root.get_encoding()).encode(encoding)
 
 
     def get_property_presenter(self):
@@ -703,7 +805,7 @@ class Sgf_game(object):
         nodes without building the entire game tree.
 
         """
-        if isinstance(self.root, _Unexpanded_root_tree_node):
+        if self.root._children is None:
             return self.root._main_sequence_iter()
         return iter(self.get_main_sequence())
 
@@ -806,3 +908,44 @@ class Sgf_game(object):
             date = datetime.date.today()
         self.root.set('DT', date.strftime("%Y-%m-%d"))
 
+
+class Sgf_collection_writer(object):
+    """Write Sgf_games to a file, as an SGF collection.
+
+    Instantiate with
+      f      -- file-like object with a write() method
+      offset -- int (default 0): the number of bytes already in the file
+      wrap   -- int (default 79), or None
+
+    Each game is streamed to the file as it's written (see Sgf_game.write()),
+    so memory use doesn't grow with the size of the collection.
+
+    To add games to an existing collection, open the file in append mode and
+    pass its size as 'offset'.
+
+    Public attributes (treat as read-only):
+      offset     -- int: the offset at which the next game will start
+      game_count -- int: the number of games written by this writer
+
+    """
+    def __init__(self, f, offset=0, wrap=79):
+        self.f = f
+        self.offset = offset
+        self.wrap = wrap
+        self.game_count = 0
+
+    def write_game(self, sgf_game):
+        """Append a game to the collection.
+
+        sgf_game -- Sgf_game
+
+        Returns the offset of the game's opening '(' (as used by
+        Sgf_game.iter_collection()).
+
+        Propagates exceptions from Sgf_game.write().
+
+        """
+        offset = self.offset
+        self.offset += sgf_game.write(self.f, self.wrap)
+        self.game_count += 1
+        return offset
@@ -37,6 +37,39 @@ _tokenise_re = re.compile(r"""
     (?P<D> [;()] )                                # delimiter
 )
 """, re.VERBOSE | re.DOTALL)
+# Used by _parse_sgf_game() instead of _tokenise_re. This matches a property
+# with all its values at once (the final group is always 'MORE' in that case),
+# and has a shortcut for the common case of a node starting with a move.
+_parse_re = re.compile(r"""
+\s*
+(?:
+    # node whose first property is a single move
+    ; \s* (?P<MI> [BW] ) \s* \[ (?P<MV> [a-zA-Z]{0,2} ) \] (?! \s* \[ )
+    |
+    (?P<P> [A-Za-z]{1,64} ) \s*                     # PropIdent
+    \[ (?P<V1> [^\\\]]* (?: \\. [^\\\]]* )* ) \]    # its first PropValue
+    (?P<MORE>                                       # any further PropValues
+        (?: \s* \[ [^\\\]]* (?: \\. [^\\\]]* )* \] )* )
+    |
+    (?P<D> [;()] )                                  # delimiter
+    |
+    (?P<I> [A-Za-z]{1,64} )                         # PropIdent with no value
+    |
+    (?P<V> \[ [^\\\]]* (?: \\. [^\\\]]* )* \] )     # PropValue on its own
+)
+""", re.VERBOSE | re.DOTALL)
+_value_findall = re.compile(r"\[ ( [^\\\]]* (?: \\. [^\\\]]* )* ) \]",
+                            re.VERBOSE | re.DOTALL).findall
+# Text which might become a token if more data were appended
+_incomplete_tail_re = re.compile(r"""
+\s*
+(?:
+    \[ [^\\\]]* (?: \\. [^\\\]]* )* \\?     # unterminated PropValue
+    |
+    [A-Za-z]*                               # PropIdent
+)
+\Z
+""", re.VERBOSE | re.DOTALL)
 
 
 def is_valid_property_identifier(s):
@@ -141,69 +174,99 @@ class Coarse_game_tree(object):
         self.sequence = [] # must be at least one node
         self.children = [] # may be empty
 
+class _Unexpected_end(ValueError):
+    """Error from _parse_sgf_game(): the game is incomplete.
+
+    Public attribute:
+      position -- index of the first text which couldn't be parsed
+
+    """
+    def __init__(self, position):
+        ValueError.__init__(self, "unexpected end of SGF data")
+        self.position = position
+
 def _parse_sgf_game(s, start_position):
-    """Common implementation for parse_sgf_game and parse_sgf_games."""
-    tokens, end_position = tokenise(s, start_position)
-    if not tokens:
+    """Common implementation for parse_sgf_game and parse_sgf_games.
+
+    Returns a pair (Coarse_game_tree, end position), or (None, None) if no
+    game was found.
+
+    Raises _Unexpected_end if the data (or the parseable part of it) ends
+    before the end of the game.
+
+    This accepts the same input as running tokenise() and then assembling the
+    tokens, but works directly from the regular expression matches.
+
+    """
+    m = _find_start_re.search(s, start_position)
+    if not m:
         return None, None
+    i = m.start()
+    match = _parse_re.match
     stack = []
     game_tree = None
     sequence = None
     properties = None
-    index = 0
-    try:
-        while True:
-            token_type, token = tokens[index]
-            index += 1
-            if token_type == 'V':
-                raise ValueError("unexpected value")
-            if token_type == 'D':
-                if token == ';':
-                    if sequence is None:
-                        raise ValueError("unexpected node")
-                    properties = {}
-                    sequence.append(properties)
-                else:
-                    if sequence is not None:
-                        if not sequence:
-                            raise ValueError("empty sequence")
-                        game_tree.sequence = sequence
-                        sequence = None
-                    if token == '(':
-                        stack.append(game_tree)
-                        game_tree = Coarse_game_tree()
-                        sequence = []
-                    else:
-                        # token == ')'
-                        variation = game_tree
-                        game_tree = stack.pop()
-                        if game_tree is None:
-                            break
-                        game_tree.children.append(variation)
-                    properties = None
+    while True:
+        m = match(s, i)
+        if m is None:
+            raise _Unexpected_end(i)
+        i = m.end()
+        group = m.lastgroup
+        if group == 'MV':
+            if sequence is None:
+                raise ValueError("unexpected node")
+            properties = {m.group('MI') : [m.group('MV')]}
+            sequence.append(properties)
+        elif group == 'MORE':
+            prop_ident = m.group('P')
+            if not prop_ident.isupper():
+                prop_ident = prop_ident.translate(None, _lcchars)
+            more = m.group('MORE')
+            if more:
+                prop_values = [m.group('V1')] + _value_findall(more)
+            else:
+                prop_values = [m.group('V1')]
+            if properties is None:
+                if match(s, i) is None:
+                    raise _Unexpected_end(i)
+                raise ValueError("property value outside a node")
+            if prop_ident in properties:
+                properties[prop_ident] += prop_values
             else:
-                # token_type == 'I'
-                prop_ident = token
-                prop_values = []
-                while True:
-                    token_type, token = tokens[index]
-                    if token_type != 'V':
-                        break
-                    index += 1
-                    prop_values.append(token)
-                if not prop_values:
-                    raise ValueError("property with no values")
-                try:
-                    if prop_ident in properties:
-                        properties[prop_ident] += prop_values
-                    else:
-                        properties[prop_ident] = prop_values
-                except TypeError:
-                    raise ValueError("property value outside a node")
-    except IndexError:
-        raise ValueError("unexpected end of SGF data")
-    assert index == len(tokens)
-    return variation, end_position
+                properties[prop_ident] = prop_values
+        elif group == 'D':
+            token = m.group('D')
+            if token == ';':
+                if sequence is None:
+                    raise ValueError("unexpected node")
+                properties = {}
+                sequence.append(properties)
+            else:
+                if sequence is not None:
+                    if not sequence:
+                        raise ValueError("empty sequence")
+                    game_tree.sequence = sequence
+                    sequence = None
+                if token == '(':
+                    stack.append(game_tree)
+                    game_tree = Coarse_game_tree()
+                    sequence = []
+                else:
+                    # token == ')'
+                    variation = game_tree
+                    game_tree = stack.pop()
+                    if game_tree is None:
+                        return variation, i
+                    game_tree.children.append(variation)
+                properties = None
+        elif group == 'I':
+            if match(s, i) is None:
+                raise _Unexpected_end(i)
+            raise ValueError("property with no values")
+        else:
+            # group == 'V'
+            raise ValueError("unexpected value")
 
 def parse_sgf_game(s):
     """Read a single SGF game from a string, returning the parse tree.
@@ -262,6 +325,98 @@ def parse_sgf_collection(s):
         raise ValueError("no SGF data found")
     return result
 
+def iter_sgf_collection(f, chunk_size=65536):
+    """Read an SGF game collection from a file, one game at a time.
+
+    f          -- file-like object with a read() method (eg a file or an mmap)
+    chunk_size -- int (number of bytes to read at a time)
+
+    Returns an iterator yielding pairs (offset, Coarse_game_tree), where offset
+    is the position of the game's opening '(', counting from the position 'f'
+    had when iteration started.
+
+    Only one game is held in memory at a time, so memory use is bounded by the
+    size of the largest game (plus chunk_size) rather than the size of the
+    collection.
+
+    Raises ValueError if there is an error parsing a game. See
+    parse_sgf_collection() for details.
+
+    Ignores non-SGF data in the same way as parse_sgf_collection(). Unlike
+    parse_sgf_collection(), yields nothing (rather than raising ValueError) if
+    there are no games.
+
+    """
+    buf = ""
+    # Offset of buf[0] from the starting position of f
+    buf_offset = 0
+    # Index into buf from which to look for the next game
+    position = 0
+    at_eof = False
+    game_number = 0
+    while True:
+        m = _find_start_re.search(buf, position)
+        if m is None:
+            if at_eof:
+                return
+            # Keep anything which could be the start of a '(;'
+            i = buf.rfind("(", position)
+            if i == -1 or buf[i+1:].strip():
+                i = len(buf)
+            buf_offset += i
+            buf = buf[i:]
+            position = 0
+            data = f.read(chunk_size)
+            if not data:
+                at_eof = True
+            buf += data
+            continue
+        start = m.start()
+        while True:
+            try:
+                game_tree, end = _parse_sgf_game(buf, start)
+            except _Unexpected_end, e:
+                if at_eof or not _incomplete_tail_re.match(buf, e.position):
+                    raise ValueError(
+                        "error parsing game %d: %s" % (game_number, e))
+            except ValueError, e:
+                raise ValueError("error parsing game %d: %s" % (game_number, e))
+            else:
+                break
+            # Discard everything before the game, and read enough that
+            # re-parsing is linear in the game size
+            buf_offset += start
+            buf = buf[start:]
+            start = 0
+            data = f.read(max(chunk_size, len(buf)))
+            if not data:
+                at_eof = True
+            buf += data
+        yield buf_offset + start, game_tree
+        game_number += 1
+        position = end
+
+
+def _iter_block_format(pieces, width):
+    """Generator version of block_format().
+
+    Yields strings which make up block_format()'s result when concatenated
+    (one string per output line).
+
+    """
+    line = []
+    line_length = 0
+    separator = ""
+    for s in pieces:
+        if line_length + len(s) > width:
+            yield separator + "".join(line)
+            separator = "\n"
+            line = []
+            line_length = 0
+        line.append(s)
+        line_length += len(s)
+    if line_length:
+        yield separator + "".join(line)
 
 def block_format(pieces, width=79):
     """Concatenate strings, adding newlines.
@@ -277,58 +432,95 @@ def block_format(pieces, width=79):
     single long line in the output.
 
     """
-    lines = []
-    line = ""
-    for s in pieces:
-        if len(line) + len(s) > width:
-            lines.append(line)
-            line = ""
-        line += s
-    if line:
-        lines.append(line)
-    return "\n".join(lines)
-
-def serialise_game_tree(game_tree, wrap=79):
-    """Serialise an SGF game as a string.
+    return "".join(_iter_block_format(pieces, width))
 
-    game_tree -- Coarse_game_tree
-    wrap      -- int (default 79), or None
+def _iter_serialised_pieces(game_tree):
+    """Yield the pieces of a serialised game tree, without line breaks.
 
-    Returns an 8-bit string, ending with a newline.
-
-    If 'wrap' is not None, makes some effort to keep output lines no longer
-    than 'wrap'.
+    Yields one string for each property (and for each bracket and semicolon),
+    finishing with a newline.
 
     """
-    l = []
     to_serialise = [game_tree]
     while to_serialise:
         game_tree = to_serialise.pop()
         if game_tree is None:
-            l.append(")")
+            yield ")"
             continue
-        l.append("(")
+        yield "("
         for properties in game_tree.sequence:
-            l.append(";")
+            yield ";"
+            # (property identifiers are unique, so the values are never
+            # compared)
+            items = sorted(properties.iteritems())
             # Force FF to the front, largely to work around a Quarry bug which
             # makes it ignore the first few bytes of the file.
-            for prop_ident, prop_values in sorted(
-                    properties.iteritems(),
-                    key=lambda (ident, _,): (-(ident=="FF"), ident)):
+            if 'FF' in properties:
+                items.sort(key=lambda (ident, _,): ident != "FF")
+            for prop_ident, prop_values in items:
                 # Make a single string for each property, to get prettier
                 # block_format output.
-                m = [prop_ident]
-                for value in prop_values:
-                    m.append("[%s]" % value)
-                l.append("".join(m))
+                if prop_values:
+                    yield "%s[%s]" % (prop_ident, "][".join(prop_values))
+                else:
+                    yield prop_ident
         to_serialise.append(None)
         to_serialise.extend(reversed(game_tree.children))
-    l.append("\n")
+    yield "\n"
+
+def serialise_game_tree(game_tree, wrap=79):
+    """Serialise an SGF game as a string.
+
+    game_tree -- Coarse_game_tree
+    wrap      -- int (default 79), or None
+
+    Returns an 8-bit string, ending with a newline.
+
+    If 'wrap' is not None, makes some effort to keep output lines no longer
+    than 'wrap'.
+
+    """
+    pieces = _iter_serialised_pieces(game_tree)
     if wrap is None:
-        return "".join(l)
+        return "".join(pieces)
     else:
-        return block_format(l, wrap)
+        return block_format(pieces, wrap)
 
+def _iter_node_chunks(pieces):
+    """Group serialised pieces into one string for each node."""
+    chunk = []
+    for s in pieces:
+        if s == ";" and chunk:
+            yield "".join(chunk)
+            chunk = []
+        chunk.append(s)
+    if chunk:
+        yield "".join(chunk)
+
+def write_game_tree(f, game_tree, wrap=79):
+    """Serialise an SGF game to a file.
+
+    f         -- file-like object with a write() method
+    game_tree -- Coarse_game_tree
+    wrap      -- int (default 79), or None
+
+    Writes the same data as serialise_game_tree() would return, without
+    building the whole string in memory.
+
+    Returns the number of bytes written.
+
+    """
+    if wrap is None:
+        # Join the pieces for each node, so as not to call write() for every
+        # bracket and semicolon.
+        chunks = _iter_node_chunks(_iter_serialised_pieces(game_tree))
+    else:
+        chunks = _iter_block_format(_iter_serialised_pieces(game_tree), wrap)
+    written = 0
+    for chunk in chunks:
+        f.write(chunk)
+        written += len(chunk)
+    return written
 
 def make_tree(game_tree, root, node_builder, node_adder):
     """Construct a node tree from a Coarse_game_tree.
@@ -0,0 +1,407 @@
+"""Index the metadata of SGF game records in an SQLite database.
+
+The index records, for each game in a set of SGF files (including
+collections), the main root properties, the number of moves in the main line,
+and where to find the game (the file's pathname and the byte offset of the
+game within it).
+
+Files are indexed in parallel using multiprocessing. Updating an existing
+index only reads files which are new or whose modification time or size has
+changed.
+
+"""
+
+import os
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from gomill import sgf
+
+
+class SgfIndexError(StandardError):
+    """Error reported by Sgf_index."""
+
+
+# (column name, SQL type, SGF property identifier)
+_metadata_columns = [
+    ('size',      'INTEGER', 'SZ'),
+    ('komi',      'REAL',    'KM'),
+    ('handicap',  'INTEGER', 'HA'),
+    ('player_b',  'TEXT',    'PB'),
+    ('player_w',  'TEXT',    'PW'),
+    ('rank_b',    'TEXT',    'BR'),
+    ('rank_w',    'TEXT',    'WR'),
+    ('result',    'TEXT',    'RE'),
+    ('date',      'TEXT',    'DT'),
+    ('event',     'TEXT',    'EV'),
+    ]
+
+_game_columns = (
+    ['path', 'offset', 'game_number'] +
+    [name for (name, _, _) in _metadata_columns] +
+    ['winner', 'move_count'])
+
+_schema = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS games (
+    file_id INTEGER NOT NULL REFERENCES files(file_id),
+    offset INTEGER NOT NULL,
+    game_number INTEGER NOT NULL,
+    %s,
+    winner TEXT,
+    move_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_file_id ON games (file_id);
+CREATE INDEX IF NOT EXISTS games_player_b ON games (player_b);
+CREATE INDEX IF NOT EXISTS games_player_w ON games (player_w);
+CREATE INDEX IF NOT EXISTS games_size ON games (size);
+""" % ",\n    ".join("%s %s" % (name, sql_type)
+                     for (name, sql_type, _) in _metadata_columns)
+
+
+class Game_record(object):
+    """Index entry for a single game.
+
+    Public attributes:
+      path        -- string (the file's pathname)
+      offset      -- int (byte offset of the game in the file)
+      game_number -- int (position of the game in the file, from 0)
+      size        -- int or None
+      komi        -- float or None
+      handicap    -- int or None
+      player_b    -- 8-bit utf-8 string or None (PB)
+      player_w    -- 8-bit utf-8 string or None (PW)
+      rank_b      -- 8-bit utf-8 string or None (BR)
+      rank_w      -- 8-bit utf-8 string or None (WR)
+      result      -- 8-bit utf-8 string or None (RE)
+      date        -- 8-bit utf-8 string or None (DT)
+      event       -- 8-bit utf-8 string or None (EV)
+      winner      -- 'b', 'w', or None
+      move_count  -- int (number of B and W properties in the main line)
+
+    Metadata attributes are None if the property is absent or malformed.
+
+    """
+    def __init__(self, row):
+        for name, value in zip(_game_columns, row):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return "<Game_record %s:%d>" % (self.path, self.offset)
+
+    def read_game(self):
+        """Read the game from its file.
+
+        Returns an Sgf_game.
+
+        Raises ValueError if the game can't be parsed (or isn't there), or
+        EnvironmentError if the file can't be read.
+
+        """
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for _, game in sgf.Sgf_game.iter_collection(f):
+                return game
+        raise ValueError("no game at offset %d" % self.offset)
+
+
+def describe_game(game, offset, game_number):
+    """Return the index fields for a single game.
+
+    game        -- Sgf_game
+    offset      -- int
+    game_number -- int
+
+    Returns a tuple of values for the columns of the games table (except
+    file_id).
+
+    """
+    root = game.get_root()
+    values = [offset, game_number]
+    for _, _, identifier in _metadata_columns:
+        try:
+            values.append(root.get(identifier))
+        except (KeyError, ValueError):
+            values.append(None)
+    values.append(game.get_winner())
+    move_count = 0
+    for node in game.main_sequence_iter():
+        if node.has_property('B') or node.has_property('W'):
+            move_count += 1
+    values.append(move_count)
+    return tuple(values)
+
+def index_file(pathname):
+    """Read the games from an SGF file.
+
+    Returns a tuple (pathname, records, error)
+      records -- list of tuples, as returned by describe_game()
+      error   -- string or None
+
+    If there is an error reading or parsing the file, 'records' contains the
+    games found before the error.
+
+    This is the function which is run in the worker processes.
+
+    """
+    records = []
+    try:
+        with open(pathname, "rb") as f:
+            for game_number, (offset, game) in enumerate(
+                    sgf.Sgf_game.iter_collection(f)):
+                records.append(describe_game(game, offset, game_number))
+    except (EnvironmentError, ValueError), e:
+        return pathname, records, str(e)
+    return pathname, records, None
+
+def is_sgf_filename(pathname):
+    """Check whether a filename has an SGF extension."""
+    return os.path.splitext(pathname)[1].lower() == ".sgf"
+
+def find_sgf_files(pathnames):
+    """Find the SGF files to index.
+
+    pathnames -- list of pathnames of files or directories
+
+    Returns a sorted list of absolute pathnames.
+
+    Directories are searched recursively for files with an .sgf extension.
+    Pathnames of files are included whatever their extension.
+
+    Raises SgfIndexError if a pathname doesn't exist.
+
+    """
+    result = set()
+    for pathname in pathnames:
+        pathname = os.path.abspath(pathname)
+        if os.path.isdir(pathname):
+            for dirpath, dirnames, filenames in os.walk(pathname):
+                for filename in filenames:
+                    if is_sgf_filename(filename):
+                        result.add(os.path.join(dirpath, filename))
+        elif os.path.isfile(pathname):
+            result.add(pathname)
+        else:
+            raise SgfIndexError("not found: %s" % pathname)
+    return sorted(result)
+
+
+class Update_statistics(object):
+    """Information about an Sgf_index.update() run.
+
+    Public attributes:
+      files_indexed   -- int (new or changed files read)
+      files_unchanged -- int
+      files_removed   -- int (files no longer present, dropped from the index)
+      games_indexed   -- int (games found in the files which were read)
+      errors          -- list of pairs (pathname, message)
+
+    """
+    def __init__(self):
+        self.files_indexed = 0
+        self.files_unchanged = 0
+        self.files_removed = 0
+        self.games_indexed = 0
+        self.errors = []
+
+
+class Sgf_index(object):
+    """An SQLite database of SGF game metadata.
+
+    Instantiate with the pathname of the database file (which is created if
+    it doesn't exist).
+
+    Raises SgfIndexError if the database can't be opened, or if sqlite3 isn't
+    available.
+
+    Call close() when finished with the index.
+
+    """
+    # Number of files to index between commits
+    commit_interval = 500
+
+    def __init__(self, pathname):
+        if sqlite3 is None:
+            raise SgfIndexError("sqlite3 is not available")
+        self.pathname = pathname
+        try:
+            self.connection = sqlite3.connect(pathname)
+            self.connection.text_factory = str
+            self.connection.executescript(_schema)
+        except sqlite3.Error, e:
+            raise SgfIndexError("can't open index %s: %s" % (pathname, e))
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def _get_stored_files(self):
+        """Return a dict path -> (file_id, mtime, size)."""
+        result = {}
+        for file_id, path, mtime, size in self.connection.execute(
+                "SELECT file_id, path, mtime, size FROM files"):
+            result[path] = (file_id, mtime, size)
+        return result
+
+    def _remove_file(self, file_id):
+        self.connection.execute("DELETE FROM games WHERE file_id = ?",
+                                (file_id,))
+        self.connection.execute("DELETE FROM files WHERE file_id = ?",
+                                (file_id,))
+
+    def _store_file(self, path, mtime, size, records, error):
+        cursor = self.connection.execute(
+            "INSERT INTO files (path, mtime, size, error) VALUES (?, ?, ?, ?)",
+            (path, mtime, size, error))
+        file_id = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT INTO games VALUES (%s)" % ", ".join(
+                ["?"] * len(_game_columns)),
+            [(file_id,) + record for record in records])
+
+    def update(self, pathnames, processes=None, progress_callback=None):
+        """Bring the index up to date.
+
+        pathnames         -- list of pathnames of files or directories
+        processes         -- int (number of worker processes to use)
+        progress_callback -- function taking a pathname (optional)
+
+        Reads the SGF files found by find_sgf_files() which aren't in the
+        index, or whose modification time or size has changed since they were
+        indexed. Removes entries for indexed files which no longer exist
+        (whether or not they are under 'pathnames').
+
+        'processes' defaults to the number of CPUs. Files are read in the
+        current process if processes is 1 or multiprocessing isn't available.
+
+        progress_callback is called with each file's pathname after it has
+        been read.
+
+        Files which can't be read or parsed are still recorded in the index
+        (along with any games read before the error), so they aren't read
+        again until they change.
+
+        Returns an Update_statistics object.
+
+        Raises SgfIndexError if a pathname doesn't exist.
+
+        """
+        stats = Update_statistics()
+        stored = self._get_stored_files()
+        for path, (file_id, _, _) in stored.items():
+            if not os.path.isfile(path):
+                self._remove_file(file_id)
+                stats.files_removed += 1
+        to_index = {}
+        for path in find_sgf_files(pathnames):
+            try:
+                st = os.stat(path)
+            except EnvironmentError, e:
+                stats.errors.append((path, str(e)))
+                continue
+            try:
+                file_id, mtime, size = stored[path]
+            except KeyError:
+                pass
+            else:
+                if (mtime, size) == (st.st_mtime, st.st_size):
+                    stats.files_unchanged += 1
+                    continue
+                self._remove_file(file_id)
+            to_index[path] = (st.st_mtime, st.st_size)
+        self.connection.commit()
+
+        pool = None
+        if processes is None or processes > 1:
+            try:
+                import multiprocessing
+                pool = multiprocessing.Pool(processes)
+            except (ImportError, NotImplementedError):
+                pool = None
+        try:
+            if pool is None:
+                results = (index_file(path) for path in sorted(to_index))
+            else:
+                results = pool.imap_unordered(
+                    index_file, sorted(to_index), chunksize=8)
+            for path, records, error in results:
+                mtime, size = to_index[path]
+                self._store_file(path, mtime, size, records, error)
+                stats.files_indexed += 1
+                stats.games_indexed += len(records)
+                if error is not None:
+                    stats.errors.append((path, error))
+                if stats.files_indexed % self.commit_interval == 0:
+                    self.connection.commit()
+                if progress_callback is not None:
+                    progress_callback(path)
+            if pool is not None:
+                pool.close()
+                pool.join()
+                pool = None
+        finally:
+            if pool is not None:
+                pool.terminate()
+            self.connection.commit()
+        return stats
+
+    def find_games(self, player=None, **kwargs):
+        """Return the index entries for games matching the specified values.
+
+        player -- 8-bit utf-8 string (optional)
+
+        Other keyword arguments are attribute names from Game_record (except
+        'path', 'offset', 'game_number', and 'move_count'); only games with
+        the specified value for each are included.
+
+        If 'player' is specified, only games where that player played either
+        colour are included.
+
+        Returns a list of Game_records, in order of path and offset.
+
+        For example, to find the 9x9 games which 'gnugo' lost as white:
+          find_games(size=9, player_w='gnugo', winner='b')
+
+        """
+        clauses = []
+        values = []
+        for name, value in sorted(kwargs.items()):
+            if name not in _game_columns[3:-1]:
+                raise ValueError("unknown field: %s" % name)
+            clauses.append("games.%s = ?" % name)
+            values.append(value)
+        if player is not None:
+            clauses.append("(games.player_b = ? OR games.player_w = ?)")
+            values += [player, player]
+        sql = ("SELECT files.path, %s FROM games "
+               "JOIN files ON games.file_id = files.file_id" %
+               ", ".join("games.%s" % name for name in _game_columns[1:]))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY files.path, games.offset"
+        return [Game_record(row) for row in self.connection.execute(sql, values)]
+
+    def count_games(self):
+        """Return the number of games in the index."""
+        (count,), = self.connection.execute("SELECT COUNT(*) FROM games")
+        return count
+
+    def get_errors(self):
+        """Return the indexed files which couldn't be read completely.
+
+        Returns a list of pairs (pathname, error message), in order of
+        pathname.
+
+        """
+        return list(self.connection.execute(
+            "SELECT path, error FROM files WHERE error IS NOT NULL "
+            "ORDER BY path"))
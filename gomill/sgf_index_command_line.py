@@ -0,0 +1,121 @@
+"""Command-line interface to the SGF index."""
+
+import sys
+from optparse import OptionParser
+
+from gomill import compact_tracebacks
+from gomill.sgf_index import Sgf_index, SgfIndexError
+
+
+# Action functions return the desired exit status; implicit return is fine to
+# indicate a successful exit.
+
+def do_update(index, options, args):
+    if not args:
+        raise SgfIndexError("update: no files or directories specified")
+    if options.parallel is not None and options.parallel < 1:
+        raise SgfIndexError("--parallel must be at least 1")
+    stats = index.update(args, processes=options.parallel)
+    if not options.quiet:
+        for path, error in stats.errors:
+            print >>sys.stderr, "%s: %s" % (path, error)
+        print "indexed %d games from %d files (%d unchanged, %d removed)" % (
+            stats.games_indexed, stats.files_indexed,
+            stats.files_unchanged, stats.files_removed)
+
+def do_query(index, options, args):
+    if args:
+        raise SgfIndexError("query: unexpected arguments")
+    criteria = {}
+    for name in ('size', 'handicap', 'player_b', 'player_w', 'winner',
+                 'event'):
+        value = getattr(options, name)
+        if value is not None:
+            criteria[name] = value
+    for record in index.find_games(player=options.player, **criteria):
+        if options.paths_only:
+            print "%s:%d" % (record.path, record.offset)
+            continue
+        print "\t".join(
+            "" if value is None else str(value)
+            for value in (record.path, record.offset, record.size,
+                          record.player_b, record.player_w, record.result,
+                          record.move_count))
+
+def do_errors(index, options, args):
+    if args:
+        raise SgfIndexError("errors: unexpected arguments")
+    for path, error in index.get_errors():
+        print "%s: %s" % (path, error)
+
+def do_count(index, options, args):
+    if args:
+        raise SgfIndexError("count: unexpected arguments")
+    print index.count_games()
+
+_actions = {
+    "update" : do_update,
+    "query" : do_query,
+    "errors" : do_errors,
+    "count" : do_count,
+    }
+
+
+def run(argv):
+    usage = ("%prog [options] <index file> update <file or directory> ...\n"
+             "       %prog [options] <index file> query\n\n"
+             "commands: update, query, errors, count")
+    parser = OptionParser(usage=usage, prog="gomill-sgf-index")
+    parser.add_option("--parallel", "-j", type="int",
+                      help="number of worker processes for update "
+                      "(default: number of CPUs)")
+    parser.add_option("--quiet", "-q", action="store_true",
+                      help="don't report unreadable files or totals")
+    parser.add_option("--size", type="int",
+                      help="query: board size")
+    parser.add_option("--handicap", type="int",
+                      help="query: handicap")
+    parser.add_option("--player", metavar="NAME",
+                      help="query: player of either colour")
+    parser.add_option("--black", dest="player_b", metavar="NAME",
+                      help="query: black player")
+    parser.add_option("--white", dest="player_w", metavar="NAME",
+                      help="query: white player")
+    parser.add_option("--winner", choices=("b", "w"),
+                      help="query: winning colour (b or w)")
+    parser.add_option("--event", metavar="NAME",
+                      help="query: event (EV property)")
+    parser.add_option("--paths-only", action="store_true",
+                      help="query: show only each game's pathname and offset")
+    (options, args) = parser.parse_args(argv)
+    if len(args) == 0:
+        parser.error("no index file specified")
+    if len(args) == 1:
+        parser.error("no command specified")
+    command = args[1]
+    try:
+        action = _actions[command]
+    except KeyError:
+        parser.error("no such command: %s" % command)
+    try:
+        index = Sgf_index(args[0])
+        try:
+            exit_status = action(index, options, args[2:])
+        finally:
+            index.close()
+    except SgfIndexError, e:
+        print >>sys.stderr, "gomill-sgf-index:", e
+        exit_status = 1
+    except KeyboardInterrupt:
+        exit_status = 3
+    except:
+        print >>sys.stderr, "gomill-sgf-index: internal error"
+        compact_tracebacks.log_traceback()
+        exit_status = 4
+    sys.exit(exit_status)
+
+def main():
+    run(sys.argv[1:])
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """Higher-level processing of moves and positions from SGF games."""
 
 from gomill import boards
+from gomill import sgf_grammar
 from gomill import sgf_properties
 
 
@@ -57,6 +58,120 @@ def get_setup_and_moves(sgf_game, board=None):
             moves.append((colour, sgf_properties.interpret_go_point(raw, size)))
     return board, moves
 
+class Game_summary(object):
+    """Basic information about a game, as returned by extract_game_summary().
+
+    Public attributes:
+      size         -- int
+      komi         -- float
+      player_b     -- 8-bit utf-8 string, or None
+      player_w     -- 8-bit utf-8 string, or None
+      result       -- 8-bit utf-8 string, or None (the RE property)
+      winner       -- 'b', 'w', or None
+      setup_stones -- tuple (black_points, white_points, empty_points)
+      moves        -- list of pairs (colour, move)
+
+    The values are as returned by the corresponding Sgf_game and Node methods
+    (get_size(), get_komi(), get_player_name(), get_winner(), and
+    get_setup_stones() for the root node). 'moves' is as returned by
+    get_setup_and_moves().
+
+    """
+
+def summarise_coarse_game(coarse_game):
+    """Variant of extract_game_summary() working from a parse tree.
+
+    coarse_game -- sgf_grammar.Coarse_game_tree
+
+    """
+    root = coarse_game.sequence[0]
+    try:
+        size_s = root['SZ'][0]
+    except KeyError:
+        size = 19
+    else:
+        try:
+            size = int(size_s)
+        except ValueError:
+            raise ValueError("bad SZ property: %s" % size_s)
+    if not 1 <= size <= 26:
+        raise ValueError("size out of range: %s" % size)
+    encoding = root.get('CA', ["ISO-8859-1"])[0]
+    presenter = sgf_properties.Presenter(size, encoding)
+    def get(identifier, default):
+        values = root.get(identifier)
+        if values is None:
+            return default
+        return presenter.interpret(identifier, values)
+
+    summary = Game_summary()
+    summary.size = size
+    summary.komi = get('KM', 0.0)
+    summary.player_b = get('PB', None)
+    summary.player_w = get('PW', None)
+    summary.result = get('RE', None)
+    if summary.result and summary.result[0].lower() in ("b", "w"):
+        summary.winner = summary.result[0].lower()
+    else:
+        summary.winner = None
+    ab = get('AB', set())
+    aw = get('AW', set())
+    ae = get('AE', set())
+    summary.setup_stones = (ab, aw, ae)
+    if (ab or aw) and ('B' in root or 'W' in root):
+        raise ValueError("mixed setup and moves in root node")
+
+    move_table = sgf_properties._get_point_table(size)
+    moves = []
+    game_tree = coarse_game
+    sequence = game_tree.sequence
+    while True:
+        for properties in sequence:
+            if properties is not root and (
+                'AB' in properties or 'AW' in properties or
+                'AE' in properties):
+                raise ValueError("setup properties after the root node")
+            values = properties.get('B')
+            if values is not None:
+                colour = 'b'
+            else:
+                values = properties.get('W')
+                if values is None:
+                    continue
+                colour = 'w'
+            try:
+                moves.append((colour, move_table[values[0]]))
+            except KeyError:
+                raise ValueError("bad move: %s" % values[0])
+        if not game_tree.children:
+            break
+        game_tree = game_tree.children[0]
+        sequence = game_tree.sequence
+    summary.moves = moves
+    return summary
+
+def extract_game_summary(s):
+    """Read the basic information and main-line moves from SGF data.
+
+    s -- 8-bit string
+
+    Returns a Game_summary.
+
+    This is a faster alternative to using Sgf_game.from_string() followed by
+    get_setup_and_moves() and the Sgf_game accessors, for when only this
+    information is needed. It reads the first game in the string.
+
+    Raises ValueError if the string can't be parsed, if the SZ, CA, KM, PB,
+    PW, RE, AB, AW, or AE root properties are malformed, or if any move in the
+    main line is malformed. Raises ValueError if there are setup stones and a
+    move in the root node, or any AB/AW/AE properties after the root node.
+
+    Unlike get_setup_and_moves(), doesn't check that the setup position is
+    legal.
+
+    """
+    return summarise_coarse_game(sgf_grammar.parse_sgf_game(s))
+
 def set_initial_position(sgf_game, board):
     """Add setup stones to an Sgf_game reflecting a board position.
 
@@ -0,0 +1,507 @@
+"""Find the games in a set of SGF files which pass through a given position.
+
+Positions are identified by 64-bit Zobrist hashes of the stones on the board
+(the player to move and any ko restriction aren't included). Optionally, the
+hashes are canonicalised over the board's eight symmetries, so that a
+position matches its rotations and reflections.
+
+The index is a single file containing a sorted table of fixed-size entries
+(hash, game number, move number), followed by the location (pathname and byte
+offset) of each game. Lookups use a binary search on the file, so the entry
+table isn't read into memory.
+
+Building the index replays each game's main line using boards.Board, reading
+the files in parallel using multiprocessing.
+
+"""
+
+from __future__ import with_statement
+
+import hashlib
+import heapq
+import os
+import struct
+import tempfile
+
+from gomill import sgf
+from gomill import sgf_index
+from gomill import sgf_moves
+
+
+class PositionIndexError(StandardError):
+    """Error reported by the position index."""
+
+
+_magic = "GMPOSIX1"
+
+# magic, flags, entry count, game count, file count, games offset,
+# files offset
+_header_struct = struct.Struct("<8sIQIIQQ")
+
+# hash, game number, move number
+_entry_struct = struct.Struct("<QIH")
+
+# file number, byte offset
+_game_struct = struct.Struct("<IQ")
+
+_FLAG_CANONICAL = 1
+
+# Positions reached after this many moves are recorded with this move number
+_MAX_MOVE_NUMBER = 0xffff
+
+_symmetries = [
+    lambda r, c, n: (r, c),
+    lambda r, c, n: (c, n-1-r),
+    lambda r, c, n: (n-1-r, n-1-c),
+    lambda r, c, n: (n-1-c, r),
+    lambda r, c, n: (r, n-1-c),
+    lambda r, c, n: (n-1-r, c),
+    lambda r, c, n: (c, r),
+    lambda r, c, n: (n-1-c, n-1-r),
+    ]
+
+def _make_key(*args):
+    digest = hashlib.md5(" ".join(str(arg) for arg in args)).digest()
+    return struct.unpack("<Q", digest[:8])[0]
+
+# map board size -> (size key, list of dicts colour -> list of keys)
+_zobrist_tables = {}
+
+def _get_zobrist_table(size):
+    """Return the Zobrist keys for a board size.
+
+    Returns a pair (size_key, symmetric_keys)
+      size_key       -- int (the hash of the empty board)
+      symmetric_keys -- list of 8 dicts colour -> list of ints
+
+    symmetric_keys[i][colour][row*size + col] is the key for a stone at
+    (row, col) under the i'th symmetry (the first is the identity).
+
+    The keys are derived from md5, so they're the same on all platforms.
+
+    """
+    try:
+        return _zobrist_tables[size]
+    except KeyError:
+        pass
+    base = {}
+    for colour in ('b', 'w'):
+        base[colour] = [[_make_key("zobrist", size, colour, row, col)
+                         for col in xrange(size)]
+                        for row in xrange(size)]
+    symmetric_keys = []
+    for transform in _symmetries:
+        keys = {}
+        for colour in ('b', 'w'):
+            keys[colour] = [base[colour][r1][c1]
+                            for (r1, c1) in (transform(row, col, size)
+                                             for row in xrange(size)
+                                             for col in xrange(size))]
+        symmetric_keys.append(keys)
+    result = (_make_key("zobrist", size), symmetric_keys)
+    _zobrist_tables[size] = result
+    return result
+
+def hash_position(board, canonical=False):
+    """Return the Zobrist hash of a position.
+
+    board     -- boards.Board
+    canonical -- bool
+
+    Returns an int (less than 2**64).
+
+    If 'canonical' is true, returns the same value for all eight symmetries of
+    the position.
+
+    """
+    size = board.side
+    size_key, symmetric_keys = _get_zobrist_table(size)
+    if not canonical:
+        symmetric_keys = symmetric_keys[:1]
+    result = None
+    for keys in symmetric_keys:
+        h = size_key
+        for colour, (row, col) in board.list_occupied_points():
+            h ^= keys[colour][row*size + col]
+        if result is None or h < result:
+            result = h
+    return result
+
+
+def hash_game_positions(sgf_game, canonical=False):
+    """Return the hashes of the positions in a game's main line.
+
+    sgf_game  -- sgf.Sgf_game
+    canonical -- bool (see hash_position())
+
+    Returns a list of pairs (hash, move number), where move number is the
+    number of moves (including passes) played from the setup position.
+
+    Includes each position only once (the first time it occurs); doesn't
+    include the empty board.
+
+    Raises ValueError if the setup position isn't legal, or a move can't be
+    played.
+
+    """
+    board, moves = sgf_moves.get_setup_and_moves(sgf_game)
+    size = board.side
+    size_key, symmetric_keys = _get_zobrist_table(size)
+    if not canonical:
+        symmetric_keys = symmetric_keys[:1]
+    hashes = [size_key] * len(symmetric_keys)
+    # map point index -> colour, tracking board.board
+    stones = {}
+    for colour, (row, col) in board.list_occupied_points():
+        stones[row*size + col] = colour
+
+    def toggle(colour, index):
+        for i, keys in enumerate(symmetric_keys):
+            hashes[i] ^= keys[colour][index]
+
+    for index, colour in stones.iteritems():
+        toggle(colour, index)
+    result = []
+    seen = set()
+    def record(move_number):
+        if not stones:
+            return
+        h = min(hashes)
+        if h not in seen:
+            seen.add(h)
+            result.append((h, min(move_number, _MAX_MOVE_NUMBER)))
+
+    record(0)
+    board_rows = board.board
+    for move_number, (colour, move) in enumerate(moves):
+        if move is not None:
+            row, col = move
+            try:
+                board.play(row, col, colour)
+            except (IndexError, ValueError):
+                raise ValueError("move %d: illegal move" % (move_number + 1))
+            index = row*size + col
+            stones[index] = colour
+            toggle(colour, index)
+            # Captured stones are connected to a neighbour of the move (or to
+            # the move itself, for a self-capture).
+            candidates = [(row, col), (row-1, col), (row+1, col),
+                          (row, col-1), (row, col+1)]
+            while candidates:
+                r, c = candidates.pop()
+                if not (0 <= r < size and 0 <= c < size):
+                    continue
+                index = r*size + c
+                if board_rows[r][c] is not None or index not in stones:
+                    continue
+                toggle(stones.pop(index), index)
+                candidates += [(r-1, c), (r+1, c), (r, c-1), (r, c+1)]
+        record(move_number + 1)
+    return result
+
+def hash_file(args):
+    """Read the games from an SGF file and hash their positions.
+
+    args -- pair (pathname, canonical)
+
+    Returns a tuple (pathname, games, errors)
+      games  -- list of pairs (offset, list of (hash, move number))
+      errors -- list of strings
+
+    Games which can't be replayed are left out, and described in 'errors'. If
+    there is an error reading or parsing the file, 'games' contains the games
+    found before the error.
+
+    This is the function which is run in the worker processes.
+
+    """
+    pathname, canonical = args
+    games = []
+    errors = []
+    try:
+        with open(pathname, "rb") as f:
+            for game_number, (offset, sgf_game) in enumerate(
+                    sgf.Sgf_game.iter_collection(f)):
+                try:
+                    positions = hash_game_positions(sgf_game, canonical)
+                except ValueError, e:
+                    errors.append("game %d: %s" % (game_number, e))
+                    continue
+                games.append((offset, positions))
+    except (EnvironmentError, ValueError), e:
+        errors.append(str(e))
+    return pathname, games, errors
+
+
+def _write_run(entries):
+    """Write a sorted run of entries to a temporary file.
+
+    Returns the file, positioned at the start.
+
+    """
+    entries.sort()
+    f = tempfile.TemporaryFile()
+    pack = _entry_struct.pack
+    f.write("".join([pack(*entry) for entry in entries]))
+    f.seek(0)
+    return f
+
+def _read_run(f, block_size=65536):
+    """Read entries from a run file written by _write_run()."""
+    record_size = _entry_struct.size
+    unpack_from = _entry_struct.unpack_from
+    block_size -= block_size % record_size
+    while True:
+        data = f.read(block_size)
+        if not data:
+            break
+        for i in xrange(0, len(data), record_size):
+            yield unpack_from(data, i)
+
+
+class Build_statistics(object):
+    """Information about a build_position_index() run.
+
+    Public attributes:
+      files     -- int (files read)
+      games     -- int (games indexed)
+      positions -- int (entries in the index)
+      errors    -- list of pairs (pathname, message)
+
+    """
+    def __init__(self):
+        self.files = 0
+        self.games = 0
+        self.positions = 0
+        self.errors = []
+
+
+def build_position_index(index_pathname, pathnames, canonical=False,
+                         processes=None, run_size=500000,
+                         progress_callback=None):
+    """Build a position index for a set of SGF files.
+
+    index_pathname    -- pathname for the index file
+    pathnames         -- list of pathnames of files or directories
+    canonical         -- bool (index positions up to symmetry)
+    processes         -- int (number of worker processes to use)
+    run_size          -- int (number of entries to sort in memory at once)
+    progress_callback -- function taking a pathname (optional)
+
+    The files to read are found as for sgf_index.find_sgf_files().
+
+    'processes' defaults to the number of CPUs. Files are read in the current
+    process if processes is 1 or multiprocessing isn't available.
+
+    Entries are sorted in runs of 'run_size', which are merged at the end, so
+    memory use doesn't grow with the size of the index.
+
+    progress_callback is called with each file's pathname after it has been
+    read.
+
+    Replaces any existing file at index_pathname (the new file is written
+    under a temporary name and renamed when it's complete).
+
+    Returns a Build_statistics object.
+
+    Raises PositionIndexError if a pathname doesn't exist, or if there is an
+    error writing the index.
+
+    """
+    try:
+        sgf_pathnames = sgf_index.find_sgf_files(pathnames)
+    except sgf_index.SgfIndexError, e:
+        raise PositionIndexError(str(e))
+    stats = Build_statistics()
+    game_locations = []
+    runs = []
+    entries = []
+
+    pool = None
+    if processes is None or processes > 1:
+        try:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes)
+        except (ImportError, NotImplementedError):
+            pool = None
+    jobs = [(pathname, canonical) for pathname in sgf_pathnames]
+    try:
+        if pool is None:
+            results = (hash_file(job) for job in jobs)
+        else:
+            results = pool.imap(hash_file, jobs, chunksize=4)
+        for file_number, (pathname, games, errors) in enumerate(results):
+            stats.files += 1
+            for error in errors:
+                stats.errors.append((pathname, error))
+            for offset, positions in games:
+                game_number = len(game_locations)
+                game_locations.append((file_number, offset))
+                for h, move_number in positions:
+                    entries.append((h, game_number, move_number))
+                if len(entries) >= run_size:
+                    runs.append(_write_run(entries))
+                    entries = []
+            if progress_callback is not None:
+                progress_callback(pathname)
+        if pool is not None:
+            pool.close()
+            pool.join()
+            pool = None
+        if entries:
+            runs.append(_write_run(entries))
+            entries = []
+
+        stats.games = len(game_locations)
+        temp_pathname = index_pathname + ".new"
+        try:
+            with open(temp_pathname, "wb") as f:
+                f.write("\0" * _header_struct.size)
+                pack = _entry_struct.pack
+                buf = []
+                for entry in heapq.merge(*[_read_run(run) for run in runs]):
+                    buf.append(pack(*entry))
+                    if len(buf) >= 4096:
+                        f.write("".join(buf))
+                        buf = []
+                    stats.positions += 1
+                f.write("".join(buf))
+                games_offset = f.tell()
+                f.write("".join([_game_struct.pack(*location)
+                                 for location in game_locations]))
+                files_offset = f.tell()
+                f.write("\n".join(sgf_pathnames))
+                f.seek(0)
+                f.write(_header_struct.pack(
+                    _magic, (_FLAG_CANONICAL if canonical else 0),
+                    stats.positions, len(game_locations), len(sgf_pathnames),
+                    games_offset, files_offset))
+            os.rename(temp_pathname, index_pathname)
+        except EnvironmentError, e:
+            raise PositionIndexError("error writing index: %s" % e)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        for run in runs:
+            run.close()
+    return stats
+
+
+class Position_match(object):
+    """A game found in a position index.
+
+    Public attributes:
+      path        -- string (the file's pathname)
+      offset      -- int (byte offset of the game in the file)
+      move_number -- int (moves played before the position was reached)
+
+    """
+    def __init__(self, path, offset, move_number):
+        self.path = path
+        self.offset = offset
+        self.move_number = move_number
+
+    def __repr__(self):
+        return "<Position_match %s:%d move %d>" % (
+            self.path, self.offset, self.move_number)
+
+
+class Position_index(object):
+    """Read-only access to an index written by build_position_index().
+
+    Instantiate with the index's pathname.
+
+    Public attributes:
+      canonical   -- bool (whether positions are indexed up to symmetry)
+      entry_count -- int
+      game_count  -- int
+
+    Raises PositionIndexError if the file can't be read or isn't a position
+    index.
+
+    Call close() when finished with the index.
+
+    """
+    def __init__(self, pathname):
+        self.pathname = pathname
+        try:
+            self.file = open(pathname, "rb")
+            header = self.file.read(_header_struct.size)
+        except EnvironmentError, e:
+            raise PositionIndexError("can't read index: %s" % e)
+        try:
+            (magic, flags, self.entry_count, self.game_count, self.file_count,
+             self.games_offset, self.files_offset) = \
+                _header_struct.unpack(header)
+        except struct.error:
+            magic = None
+        if magic != _magic:
+            self.file.close()
+            raise PositionIndexError("not a position index: %s" % pathname)
+        self.canonical = bool(flags & _FLAG_CANONICAL)
+        self._paths = None
+
+    def close(self):
+        """Close the index file."""
+        self.file.close()
+
+    def _read_entry(self, i):
+        self.file.seek(_header_struct.size + i * _entry_struct.size)
+        return _entry_struct.unpack(self.file.read(_entry_struct.size))
+
+    def find_hash(self, h):
+        """Find the entries for a position hash.
+
+        Returns a list of pairs (game number, move number), sorted by game
+        number.
+
+        """
+        lo, hi = 0, self.entry_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_entry(mid)[0] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        for i in xrange(lo, self.entry_count):
+            entry_hash, game_number, move_number = self._read_entry(i)
+            if entry_hash != h:
+                break
+            result.append((game_number, move_number))
+        return result
+
+    def get_game_location(self, game_number):
+        """Return the location of a game.
+
+        Returns a pair (pathname, byte offset).
+
+        """
+        if not 0 <= game_number < self.game_count:
+            raise IndexError("game number out of range")
+        if self._paths is None:
+            self.file.seek(self.files_offset)
+            self._paths = self.file.read().split("\n")
+        self.file.seek(self.games_offset + game_number * _game_struct.size)
+        file_number, offset = _game_struct.unpack(
+            self.file.read(_game_struct.size))
+        return self._paths[file_number], offset
+
+    def find_position(self, board):
+        """Find the games which passed through a position.
+
+        board -- boards.Board
+
+        Returns a list of Position_matches, in the order the games were
+        indexed.
+
+        If the index is canonical, finds games which passed through any
+        symmetry of the position.
+
+        """
+        result = []
+        for game_number, move_number in self.find_hash(
+                hash_position(board, self.canonical)):
+            path, offset = self.get_game_location(game_number)
+            result.append(Position_match(path, offset, move_number))
+        return result
@@ -0,0 +1,131 @@
+"""Command-line interface to the SGF position index."""
+
+from __future__ import with_statement
+
+import sys
+from optparse import OptionParser
+
+from gomill import compact_tracebacks
+from gomill import sgf
+from gomill import sgf_moves
+from gomill.sgf_position_index import (
+    Position_index, PositionIndexError, build_position_index)
+
+
+def get_position(pathname, move_number):
+    """Read the position to search for from an SGF file.
+
+    Returns a boards.Board: the position after move_number moves of the main
+    line (or at the end of the main line, if move_number is None).
+
+    """
+    try:
+        with open(pathname, "rb") as f:
+            sgf_game = sgf.Sgf_game.from_string(f.read())
+        board, moves = sgf_moves.get_setup_and_moves(sgf_game)
+    except (EnvironmentError, ValueError), e:
+        raise PositionIndexError("error reading %s: %s" % (pathname, e))
+    if move_number is None:
+        move_number = len(moves)
+    elif not 0 <= move_number <= len(moves):
+        raise PositionIndexError("%s has %d moves" % (pathname, len(moves)))
+    for colour, move in moves[:move_number]:
+        if move is not None:
+            try:
+                board.play(move[0], move[1], colour)
+            except ValueError:
+                raise PositionIndexError(
+                    "error reading %s: illegal move" % pathname)
+    return board
+
+def do_build(index_pathname, options, args):
+    if not args:
+        raise PositionIndexError("build: no files or directories specified")
+    if options.parallel is not None and options.parallel < 1:
+        raise PositionIndexError("--parallel must be at least 1")
+    stats = build_position_index(index_pathname, args,
+                                 canonical=options.symmetries,
+                                 processes=options.parallel)
+    if not options.quiet:
+        for path, error in stats.errors:
+            print >>sys.stderr, "%s: %s" % (path, error)
+        print "indexed %d positions from %d games in %d files" % (
+            stats.positions, stats.games, stats.files)
+
+def do_search(index_pathname, options, args):
+    if len(args) == 1:
+        move_number = None
+    elif len(args) == 2:
+        try:
+            move_number = int(args[1])
+        except ValueError:
+            raise PositionIndexError("search: bad move number: %s" % args[1])
+    else:
+        raise PositionIndexError("search: expected <sgf file> [move number]")
+    board = get_position(args[0], move_number)
+    index = Position_index(index_pathname)
+    try:
+        for match in index.find_position(board):
+            print "%s\t%d\t%d" % (match.path, match.offset, match.move_number)
+    finally:
+        index.close()
+
+def do_info(index_pathname, options, args):
+    if args:
+        raise PositionIndexError("info: unexpected arguments")
+    index = Position_index(index_pathname)
+    try:
+        print "games: %d" % index.game_count
+        print "positions: %d" % index.entry_count
+        print "symmetries: %s" % ("yes" if index.canonical else "no")
+    finally:
+        index.close()
+
+_actions = {
+    "build" : do_build,
+    "search" : do_search,
+    "info" : do_info,
+    }
+
+
+def run(argv):
+    usage = ("%prog [options] <index file> build <file or directory> ...\n"
+             "       %prog [options] <index file> search <sgf file> "
+             "[move number]\n\n"
+             "commands: build, search, info")
+    parser = OptionParser(usage=usage, prog="gomill-sgf-positions")
+    parser.add_option("--parallel", "-j", type="int",
+                      help="number of worker processes for build "
+                      "(default: number of CPUs)")
+    parser.add_option("--symmetries", action="store_true",
+                      help="build: match rotated and reflected positions")
+    parser.add_option("--quiet", "-q", action="store_true",
+                      help="don't report unreadable games or totals")
+    (options, args) = parser.parse_args(argv)
+    if len(args) == 0:
+        parser.error("no index file specified")
+    if len(args) == 1:
+        parser.error("no command specified")
+    command = args[1]
+    try:
+        action = _actions[command]
+    except KeyError:
+        parser.error("no such command: %s" % command)
+    try:
+        exit_status = action(args[0], options, args[2:])
+    except PositionIndexError, e:
+        print >>sys.stderr, "gomill-sgf-positions:", e
+        exit_status = 1
+    except KeyboardInterrupt:
+        exit_status = 3
+    except:
+        print >>sys.stderr, "gomill-sgf-positions: internal error"
+        compact_tracebacks.log_traceback()
+        exit_status = 4
+    sys.exit(exit_status)
+
+def main():
+    run(sys.argv[1:])
+
+if __name__ == "__main__":
+    main()
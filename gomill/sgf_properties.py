@@ -13,6 +13,9 @@ import codecs
 from gomill import sgf_grammar
 from gomill.utils import isinf, isnan
 
+# map encoding name -> normalised form
+_normalised_charset_names = {}
+
 def normalise_charset_name(s):
     """Convert an encoding name to the form implied in the SGF spec.
 
@@ -21,9 +24,40 @@ def normalise_charset_name(s):
     Raises LookupError if the encoding name isn't known to Python.
 
     """
-    return (codecs.lookup(s).name.replace("_", "-").upper()
-            .replace("ISO8859", "ISO-8859"))
+    try:
+        return _normalised_charset_names[s]
+    except KeyError:
+        pass
+    result = (codecs.lookup(s).name.replace("_", "-").upper()
+              .replace("ISO8859", "ISO-8859"))
+    _normalised_charset_names[s] = result
+    return result
+
+
+# map board size -> dict raw Point/Move/Stone value -> move
+_point_tables = {}
+
+def _get_point_table(size):
+    """Return a dict mapping raw SGF point values to moves, for a board size.
+
+    size -- int from 1 to 26
 
+    The keys are raw Point, Move, and Stone values; the values are (row, col),
+    or None for a pass (see interpret_go_point()).
+
+    """
+    try:
+        return _point_tables[size]
+    except KeyError:
+        pass
+    table = {"" : None}
+    if size <= 19:
+        table["tt"] = None
+    for row in xrange(size):
+        for col in xrange(size):
+            table[chr(97 + col) + chr(97 + size - row - 1)] = (row, col)
+    _point_tables[size] = table
+    return table
 
 def interpret_go_point(s, size):
     """Convert a raw SGF Go Point, Move, or Stone value to coordinates.
@@ -42,6 +76,17 @@ def interpret_go_point(s, size):
     of gomill), where (0, 0) is the lower left.
 
     """
+    # The tables are only for int sizes (a float size would find the table
+    # for the equal int).
+    if type(size) is int:
+        try:
+            return _point_tables[size][s]
+        except (KeyError, TypeError):
+            pass
+        if 1 <= size <= 26 and size not in _point_tables:
+            _get_point_table(size)
+            return interpret_go_point(s, size)
+    # The value isn't valid (or the size isn't an int, or isn't supported)
     if s == "" or (s == "tt" and size <= 19):
         return None
     # May propagate ValueError
@@ -598,6 +643,10 @@ class Presenter(_Context):
 
     Initially, treats unknown (private) properties as if they had type Text.
 
+    Presenters share the initial property type table, copying it only when
+    register_property() or deregister_property() is first called, so they're
+    cheap to create.
+
     """
 
     def __init__(self, size, encoding):
@@ -606,9 +655,17 @@ class Presenter(_Context):
         except LookupError:
             raise ValueError("unknown encoding: %s" % encoding)
         _Context.__init__(self, size, encoding)
-        self.property_types_by_ident = _property_types_by_ident.copy()
+        # Map PropIdent -> Property_type (treat as read-only; this is the
+        # shared _property_types_by_ident until it's first modified)
+        self.property_types_by_ident = _property_types_by_ident
         self.default_property_type = _text_property_type
 
+    def _get_private_property_types(self):
+        """Return property_types_by_ident, copying it first if it's shared."""
+        if self.property_types_by_ident is _property_types_by_ident:
+            self.property_types_by_ident = _property_types_by_ident.copy()
+        return self.property_types_by_ident
+
     def get_property_type(self, identifier):
         """Return the Property_type for the specified PropIdent.
 
@@ -619,11 +676,11 @@ class Presenter(_Context):
 
     def register_property(self, identifier, property_type):
         """Specify the Property_type for a PropIdent."""
-        self.property_types_by_ident[identifier] = property_type
+        self._get_private_property_types()[identifier] = property_type
 
     def deregister_property(self, identifier):
         """Forget the type for the specified PropIdent."""
-        del self.property_types_by_ident[identifier]
+        del self._get_private_property_types()[identifier]
 
     def set_private_property_type(self, property_type):
         """Specify the Property_type to use for unknown properties.
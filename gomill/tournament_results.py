@@ -22,6 +22,8 @@ class Matchup_description(object):
       move_limit      -- int
       scorer          -- 'internal' or 'players'
       number_of_games -- int or None
+      max_duplicate_rate -- float or None
+      openings        -- string (pathname) or None
 
     If alternating is False, player_1 plays black and player_2 plays white;
     otherwise they alternate.
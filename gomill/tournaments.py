@@ -4,6 +4,7 @@ from collections import defaultdict
 
 from gomill import game_jobs
 from gomill import competition_schedulers
+from gomill import openings
 from gomill import tournament_results
 from gomill import competitions
 from gomill.competitions import (
@@ -15,8 +16,14 @@ from gomill.utils import format_percent
 matchup_settings = competitions.game_settings + [
     Setting('alternating', interpret_bool, default=False),
     Setting('number_of_games', allow_none(interpret_int), default=None),
+    Setting('max_duplicate_rate', allow_none(interpret_float), default=None),
+    Setting('openings', allow_none(interpret_8bit_string), default=None),
     ]
 
+# Number of games a matchup must have played before max_duplicate_rate is
+# applied.
+MIN_GAMES_FOR_DUPLICATE_CHECK = 10
+
 
 class Matchup(tournament_results.Matchup_description):
     """Internal description of a matchup from the configuration file.
@@ -25,6 +32,7 @@ class Matchup(tournament_results.Matchup_description):
 
     Additional attributes:
       event_description -- string to show as sgf event
+      opening_list      -- list of openings, or None (see openings.py)
 
     Instantiate with
       matchup_id -- identifier
@@ -41,7 +49,11 @@ class Matchup(tournament_results.Matchup_description):
     if available).
 
     Instantiation raises ControlFileError if the handicap settings aren't
-    permitted.
+    permitted, or ValueError if max_duplicate_rate is out of range or openings
+    is used with incompatible settings.
+
+    opening_list is initially None; the owning Tournament sets it if the
+    openings setting is used.
 
     """
     def __init__(self, matchup_id, player_1, player_2, parameters,
@@ -62,6 +74,15 @@ class Matchup(tournament_results.Matchup_description):
 
         competitions.validate_handicap(
             self.handicap, self.handicap_style, self.board_size)
+        if (self.max_duplicate_rate is not None and
+            not 0.0 <= self.max_duplicate_rate <= 1.0):
+            raise ValueError("max_duplicate_rate out of range")
+        if self.openings is not None:
+            if not self.alternating:
+                raise ValueError("openings requires alternating")
+            if self.handicap is not None:
+                raise ValueError("openings can't be used with handicap")
+        self.opening_list = None
 
         if name is None:
             name = "%s v %s" % (self.player_1, self.player_2)
@@ -91,11 +112,21 @@ class Ghost_matchup(object):
         self.player_2 = player_2
         self.name = "%s v %s" % (player_1, player_2)
         self.number_of_games = None
+        self.max_duplicate_rate = None
 
     def describe_details(self):
         return "?? (missing from control file)"
 
 
+def _game_number_from_result(result):
+    """Return a tournament game's number within its matchup.
+
+    result -- Game_result, with game_id as made by Matchup.make_game_id()
+
+    """
+    return int(result.game_id.rsplit("_", 1)[1])
+
+
 class Tournament(Competition):
     """A Competition based on a number of matchups.
 
@@ -104,6 +135,8 @@ class Tournament(Competition):
         Competition.__init__(self, competition_code, **kwargs)
         self.working_matchups = set()
         self.probationary_matchups = set()
+        self.shard = 0
+        self.shard_count = 1
 
     def make_matchup(self, matchup_id, player_1, player_2, parameters,
                      name=None):
@@ -115,10 +148,18 @@ class Tournament(Competition):
 
         """
         try:
-            return Matchup(matchup_id, player_1, player_2, parameters, name,
-                           event_code=self.competition_code)
+            matchup = Matchup(matchup_id, player_1, player_2, parameters, name,
+                              event_code=self.competition_code)
         except ValueError, e:
             raise ControlFileError(str(e))
+        if matchup.openings is not None:
+            try:
+                matchup.opening_list = openings.get_openings(
+                    self.resolve_pathname(matchup.openings),
+                    matchup.board_size)
+            except (EnvironmentError, ValueError), e:
+                raise ControlFileError("openings: %s" % e)
+        return matchup
 
 
     # State attributes (*: in persistent state):
@@ -126,12 +167,19 @@ class Tournament(Competition):
     #  *scheduler             -- Group_scheduler (group codes are matchup ids)
     #  *engine_names          -- map player code -> string
     #  *engine_descriptions   -- map player code -> string
+    #  *move_hashes           -- map matchup id -> set of move hashes
+    #  *duplicate_counts      -- map matchup id -> int
+    #  *halted_matchups       -- map matchup id -> int
+    #       (matchups stopped by max_duplicate_rate, with their game limit)
     #   working_matchups      -- set of matchup ids
     #       (matchups which have successfully completed a game in this run)
     #   probationary_matchups -- set of matchup ids
     #       (matchups which failed to complete their last game)
     #   ghost_matchups        -- map matchup id -> Ghost_matchup
     #       (matchups which have been removed from the control file)
+    #   shard, shard_count    -- ints
+    #       (this competition plays games whose numbers are equal to shard
+    #        modulo shard_count; other games are fixed without being played)
 
     def _check_results(self):
         """Check that the current results are consistent with the control file.
@@ -175,15 +223,27 @@ class Tournament(Competition):
             self.ghost_matchups[matchup_id] = Ghost_matchup(
                 matchup_id, result.player_b, result.player_w)
 
+    def _get_game_limit(self, matchup):
+        limit = matchup.number_of_games
+        halted_limit = self.halted_matchups.get(matchup.id)
+        if halted_limit is None:
+            return limit
+        if limit is None:
+            return halted_limit
+        return min(limit, halted_limit)
+
     def _set_scheduler_groups(self):
         self.scheduler.set_groups(
-            [(m.id, m.number_of_games) for m in self.matchup_list] +
+            [(m.id, self._get_game_limit(m)) for m in self.matchup_list] +
             [(id, 0) for id in self.ghost_matchups])
 
     def set_clean_status(self):
         self.results = defaultdict(list)
         self.engine_names = {}
         self.engine_descriptions = {}
+        self.move_hashes = defaultdict(set)
+        self.duplicate_counts = defaultdict(int)
+        self.halted_matchups = {}
         self.scheduler = competition_schedulers.Group_scheduler()
         self.ghost_matchups = {}
         self._set_scheduler_groups()
@@ -194,12 +254,20 @@ class Tournament(Competition):
             'scheduler' : self.scheduler,
             'engine_names' : self.engine_names,
             'engine_descriptions' : self.engine_descriptions,
+            'move_hashes' : self.move_hashes,
+            'duplicate_counts' : self.duplicate_counts,
+            'halted_matchups' : self.halted_matchups,
             }
 
     def set_status(self, status):
         self.results = status['results']
         self._check_results()
         self._set_ghost_matchups()
+        # These were added after status_format_version 1
+        self.move_hashes = status.get('move_hashes', defaultdict(set))
+        self.duplicate_counts = status.get(
+            'duplicate_counts', defaultdict(int))
+        self.halted_matchups = status.get('halted_matchups', {})
         self.scheduler = status['scheduler']
         self._set_scheduler_groups()
         self.scheduler.rollback()
@@ -207,10 +275,72 @@ class Tournament(Competition):
         self.engine_descriptions = status['engine_descriptions']
 
 
+    def set_shard(self, shard, shard_count):
+        self.shard = shard
+        self.shard_count = shard_count
+
+    def set_matchup_game_limit(self, matchup_id, limit):
+        matchup = self.matchups.get(matchup_id)
+        if matchup is None:
+            raise CompetitionError("unknown matchup: %s" % matchup_id)
+        matchup.number_of_games = limit
+        self._set_scheduler_groups()
+
+    def merge_shard_statuses(self, shard_statuses):
+        results = defaultdict(list)
+        engine_names = {}
+        engine_descriptions = {}
+        move_hashes = defaultdict(set)
+        hashed_counts = defaultdict(int)
+        halted_matchups = {}
+        played = defaultdict(set)
+        for shard, shard_count, status in shard_statuses:
+            for matchup_id, matchup_results in status['results'].iteritems():
+                results[matchup_id].extend(matchup_results)
+            engine_names.update(status['engine_names'])
+            engine_descriptions.update(status['engine_descriptions'])
+            duplicate_counts = status.get('duplicate_counts', {})
+            for matchup_id, hashes in status.get('move_hashes', {}).iteritems():
+                move_hashes[matchup_id].update(hashes)
+                hashed_counts[matchup_id] += (
+                    len(hashes) + duplicate_counts.get(matchup_id, 0))
+            for matchup_id, limit in status.get(
+                    'halted_matchups', {}).iteritems():
+                halted_matchups[matchup_id] = min(
+                    limit, halted_matchups.get(matchup_id, limit))
+            fixed_tokens = status['scheduler'].get_fixed_tokens()
+            for matchup_id, game_numbers in fixed_tokens.iteritems():
+                # Games belonging to other shards were fixed without being
+                # played.
+                played[matchup_id].update(
+                    n for n in game_numbers if n % shard_count == shard)
+        for matchup_results in results.itervalues():
+            matchup_results.sort(key=_game_number_from_result)
+        duplicate_counts = defaultdict(int)
+        for matchup_id, hashes in move_hashes.iteritems():
+            duplicate_counts[matchup_id] = \
+                hashed_counts[matchup_id] - len(hashes)
+        scheduler = competition_schedulers.Group_scheduler()
+        scheduler.set_fixed_tokens(played)
+        return {
+            'results' : results,
+            'scheduler' : scheduler,
+            'engine_names' : engine_names,
+            'engine_descriptions' : engine_descriptions,
+            'move_hashes' : move_hashes,
+            'duplicate_counts' : duplicate_counts,
+            'halted_matchups' : halted_matchups,
+            }
+
     def get_game(self):
-        matchup_id, game_number = self.scheduler.issue()
-        if matchup_id is None:
-            return NoGameAvailable
+        while True:
+            matchup_id, game_number = self.scheduler.issue()
+            if matchup_id is None:
+                return NoGameAvailable
+            if game_number % self.shard_count == self.shard:
+                break
+            # This game belongs to another shard
+            self.scheduler.fix(matchup_id, game_number)
         matchup = self.matchups[matchup_id]
         if matchup.alternating and (game_number % 2):
             player_b, player_w = matchup.player_2, matchup.player_1
@@ -232,6 +362,11 @@ class Tournament(Competition):
         job.internal_scorer_handicap_compensation = \
             matchup.internal_scorer_handicap_compensation
         job.sgf_event = matchup.event_description
+        if matchup.opening_list is not None:
+            # Each opening is used for a pair of games, with colours swapped
+            opening_number = (game_number // 2) % len(matchup.opening_list)
+            job.opening = matchup.opening_list[opening_number]
+            job.sgf_note = "Opening %d" % opening_number
         return job
 
     def process_game_result(self, response):
@@ -247,6 +382,36 @@ class Tournament(Competition):
         self.scheduler.fix(matchup_id, game_number)
         self.results[matchup_id].append(response.game_result)
         self.log_history("%7s %s" % (game_id, response.game_result.describe()))
+        self._check_duplicate(matchup_id, response.move_hash)
+
+    def _check_duplicate(self, matchup_id, move_hash):
+        """Record a game's move hash, and apply max_duplicate_rate.
+
+        move_hash -- string or None
+
+        """
+        if move_hash is None:
+            return
+        hashes = self.move_hashes[matchup_id]
+        if move_hash in hashes:
+            self.duplicate_counts[matchup_id] += 1
+        else:
+            hashes.add(move_hash)
+        matchup = self.matchups.get(matchup_id)
+        if (matchup is None or matchup.max_duplicate_rate is None or
+            matchup_id in self.halted_matchups):
+            return
+        duplicates = self.duplicate_counts[matchup_id]
+        hashed = len(hashes) + duplicates
+        if hashed < MIN_GAMES_FOR_DUPLICATE_CHECK:
+            return
+        if duplicates <= matchup.max_duplicate_rate * hashed:
+            return
+        self.halted_matchups[matchup_id] = \
+            self.scheduler.get_issued_count(matchup_id)
+        self._set_scheduler_groups()
+        self.log_event("halting matchup %s: %d/%d games are duplicates" %
+                       (matchup_id, duplicates, hashed))
 
     def process_game_error(self, job, previous_error_count):
         # ignoring previous_error_count, as we can consider all jobs for the
@@ -280,6 +445,10 @@ class Tournament(Competition):
         ms.calculate_colour_breakdown()
         ms.calculate_time_stats()
         tournament_results.write_matchup_summary(out, matchup, ms)
+        if matchup.id in self.halted_matchups:
+            print >>out, ("matchup halted after %d games: "
+                          "too many duplicate games" %
+                          self.halted_matchups[matchup.id])
 
     def write_matchup_reports(self, out):
         """Write summary blocks for all live matchups to 'out'.
@@ -309,6 +478,26 @@ class Tournament(Competition):
             results = self.results[matchup_id]
             self.write_matchup_report(out, matchup, results)
 
+    def write_duplicate_reports(self, out):
+        """Write duplicate game counts for all matchups to 'out'.
+
+        Only matchups which have had duplicate games are included.
+
+        (This may produce no output. Starts with a blank line otherwise.)
+
+        """
+        for matchup_id, duplicates in sorted(self.duplicate_counts.items()):
+            if not duplicates:
+                continue
+            matchup = self.matchups.get(matchup_id)
+            if matchup is None:
+                matchup = self.ghost_matchups[matchup_id]
+            hashed = len(self.move_hashes[matchup_id]) + duplicates
+            print >>out
+            print >>out, "%s: %d/%d duplicate games %s" % (
+                matchup.name, duplicates, hashed,
+                format_percent(duplicates, hashed))
+
     def write_player_descriptions(self, out):
         """Write descriptions of all players to 'out'."""
         for code, description in sorted(self.engine_descriptions.items()):
@@ -0,0 +1,78 @@
+"""Command-line interface to network workers."""
+
+import os
+import sys
+from optparse import OptionParser
+
+from gomill import compact_tracebacks
+from gomill import job_manager
+
+
+def run_worker(address_s, address, authkey):
+    """Run a single network worker, then exit the process."""
+    multiprocessing = job_manager.multiprocessing
+    try:
+        job_manager.run_network_worker(address, authkey)
+    except EnvironmentError, e:
+        print >>sys.stderr, "gomill-worker: can't connect to %s: %s" % (
+            address_s, e)
+        exit_status = 1
+    except multiprocessing.AuthenticationError:
+        print >>sys.stderr, "gomill-worker: authentication failed"
+        exit_status = 1
+    except KeyboardInterrupt:
+        exit_status = 3
+    except:
+        print >>sys.stderr, "gomill-worker: internal error"
+        compact_tracebacks.log_traceback()
+        exit_status = 4
+    else:
+        exit_status = 0
+    sys.exit(exit_status)
+
+def run(argv):
+    usage = ("%prog [options] HOST:PORT\n\n"
+             "The authentication key is read from the GOMILL_AUTHKEY "
+             "environment variable.")
+    parser = OptionParser(usage=usage, prog="gomill-worker")
+    parser.add_option("--parallel", "-j", type="int", default=1,
+                      help="number of worker processes")
+    (options, args) = parser.parse_args(argv)
+    if len(args) == 0:
+        parser.error("no address specified")
+    if len(args) > 1:
+        parser.error("too many arguments")
+    try:
+        address = job_manager.parse_network_address(args[0])
+    except ValueError, e:
+        parser.error(str(e))
+    if options.parallel < 1:
+        parser.error("--parallel must be at least 1")
+    authkey = os.environ.get("GOMILL_AUTHKEY")
+    if not authkey:
+        print >>sys.stderr, "gomill-worker: GOMILL_AUTHKEY is not set"
+        sys.exit(1)
+    job_manager._initialise_multiprocessing()
+    multiprocessing = job_manager.multiprocessing
+    if multiprocessing is None:
+        print >>sys.stderr, "gomill-worker: multiprocessing not available"
+        sys.exit(1)
+    if options.parallel == 1:
+        run_worker(args[0], address, authkey)
+    processes = [multiprocessing.Process(target=run_worker,
+                                         args=(args[0], address, authkey))
+                 for i in range(options.parallel)]
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        sys.exit(3)
+    sys.exit(max(process.exitcode for process in processes))
+
+def main():
+    run(sys.argv[1:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark conversion of points between coordinates and strings.
+
+Times the SGF point codec (sgf_properties.interpret_go_point() and
+serialise_go_point()) and the GTP vertex codec (common.format_vertex(),
+common.move_from_vertex(), and gtp_engine.interpret_vertex()), converting
+every point on the board (and a pass) each time.
+
+Reports the time per conversion.
+
+"""
+
+import sys
+import time
+from optparse import OptionParser
+
+from gomill import common
+from gomill import gtp_engine
+from gomill import sgf_properties
+
+
+def get_cases(size):
+    """Return the inputs for each function, as lists of argument tuples."""
+    moves = [(row, col) for row in xrange(size) for col in xrange(size)]
+    moves.append(None)
+    sgf_points = [sgf_properties.serialise_go_point(move, size)
+                  for move in moves]
+    vertices = [common.format_vertex(move) for move in moves]
+    return [
+        ('interpret_go_point', sgf_properties.interpret_go_point,
+         [(s, size) for s in sgf_points]),
+        ('serialise_go_point', sgf_properties.serialise_go_point,
+         [(move, size) for move in moves]),
+        ('format_vertex', common.format_vertex,
+         [(move,) for move in moves]),
+        ('move_from_vertex', common.move_from_vertex,
+         [(vertex, size) for vertex in vertices]),
+        ('interpret_vertex', gtp_engine.interpret_vertex,
+         [(vertex, size) for vertex in vertices]),
+        ]
+
+def time_function(fn, arglists, repeat, rounds):
+    """Return the best time per call, in seconds."""
+    best = None
+    for i in xrange(repeat):
+        started = time.time()
+        for j in xrange(rounds):
+            for args in arglists:
+                fn(*args)
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / (rounds * len(arglists))
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options]",
+                          description="Time conversion of point coordinates.")
+    parser.add_option("--size", type="int", default=19,
+                      help="board size (default 19)")
+    parser.add_option("--rounds", type="int", default=200,
+                      help="number of times to convert each point per run")
+    parser.add_option("--repeat", "-r", type="int", default=3,
+                      help="number of timing runs (best is reported)")
+    opts, args = parser.parse_args(argv)
+    if args:
+        parser.error("too many arguments")
+    if not 1 <= opts.size <= 25:
+        parser.error("--size must be from 1 to 25")
+    for name, fn, arglists in get_cases(opts.size):
+        per_call = time_function(fn, arglists, opts.repeat, opts.rounds)
+        print "%-20s %6.3f us" % (name, per_call * 1e6)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
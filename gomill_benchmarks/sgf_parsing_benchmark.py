@@ -0,0 +1,140 @@
+"""Benchmark SGF parsing.
+
+Run with a list of SGF files (or directories, which are searched recursively
+for files with the .sgf extension). Each file may contain a collection.
+
+The files are read into memory before timing starts, so this measures only
+parsing, not disk access.
+
+"""
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+from gomill import sgf
+from gomill import sgf_grammar
+from gomill import sgf_moves
+
+
+def find_sgf_files(pathnames):
+    """Return a list of the SGF files named by 'pathnames'.
+
+    Directories are searched recursively for files ending in .sgf.
+
+    """
+    result = []
+    for pathname in pathnames:
+        if os.path.isdir(pathname):
+            for dirpath, dirnames, filenames in os.walk(pathname):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(".sgf"):
+                        result.append(os.path.join(dirpath, filename))
+        else:
+            result.append(pathname)
+    return result
+
+def parse_coarse(sources):
+    """Parse to Coarse_game_trees; return the number of games."""
+    n = 0
+    for s in sources:
+        n += len(sgf_grammar.parse_sgf_collection(s))
+    return n
+
+def parse_moves(sources):
+    """Parse to Sgf_games and read every main-sequence move."""
+    n = 0
+    for s in sources:
+        for coarse_game in sgf_grammar.parse_sgf_collection(s):
+            game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
+            for node in game.get_main_sequence():
+                node.get_move()
+            n += 1
+    return n
+
+def parse_setup_and_moves(sources):
+    """Parse to Sgf_games and use get_setup_and_moves() and the accessors."""
+    n = 0
+    for s in sources:
+        for coarse_game in sgf_grammar.parse_sgf_collection(s):
+            game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
+            game.get_komi()
+            game.get_player_name('b')
+            game.get_player_name('w')
+            game.get_winner()
+            sgf_moves.get_setup_and_moves(game)
+            n += 1
+    return n
+
+def parse_summary(sources):
+    """Parse to Coarse_game_trees and use summarise_coarse_game()."""
+    n = 0
+    for s in sources:
+        for coarse_game in sgf_grammar.parse_sgf_collection(s):
+            sgf_moves.summarise_coarse_game(coarse_game)
+            n += 1
+    return n
+
+_modes = {
+    'coarse'  : parse_coarse,
+    'moves'   : parse_moves,
+    'setup'   : parse_setup_and_moves,
+    'summary' : parse_summary,
+    }
+
+def time_mode(fn, sources, repeat):
+    """Run fn(sources) 'repeat' times.
+
+    Returns a pair (number of games, best time in seconds).
+
+    """
+    best = None
+    for i in xrange(repeat):
+        started = time.time()
+        game_count = fn(sources)
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return game_count, best
+
+
+_description = """\
+Time parsing of SGF files.
+Modes: coarse (parse to Coarse_game_trees only); moves (also build Sgf_games
+and read the main sequence moves); setup (build Sgf_games and use
+get_setup_and_moves() and the root property accessors); summary (use
+sgf_moves.summarise_coarse_game()).
+"""
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] <file or directory> ...",
+                          description=_description)
+    parser.add_option("--mode", action="append", choices=sorted(_modes),
+                      help="mode to time (may be repeated; default all)")
+    parser.add_option("--repeat", "-r", type="int", default=3,
+                      help="number of timing runs (best is reported)")
+    opts, args = parser.parse_args(argv)
+    if not args:
+        parser.error("no files specified")
+    if opts.repeat < 1:
+        parser.error("--repeat must be positive")
+    sources = []
+    for pathname in find_sgf_files(args):
+        with open(pathname, "rb") as f:
+            sources.append(f.read())
+    total_bytes = sum(len(s) for s in sources)
+    print "%d files, %.1f MB" % (len(sources), total_bytes / 1e6)
+    for mode in (opts.mode or sorted(_modes)):
+        try:
+            game_count, elapsed = time_mode(_modes[mode], sources, opts.repeat)
+        except ValueError, e:
+            print >>sys.stderr, "error parsing: %s" % e
+            sys.exit(1)
+        print "%-8s %d games in %.3fs: %.0f games/s, %.2f MB/s" % (
+            mode, game_count, elapsed, game_count / elapsed,
+            total_bytes / elapsed / 1e6)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
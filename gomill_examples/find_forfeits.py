@@ -10,9 +10,17 @@ from optparse import OptionParser
 from gomill.common import opponent_of
 from gomill.ringmasters import Ringmaster, RingmasterError
 
-def show_result(matchup, result, filename):
-    print "%s: %s forfeited game %s" % (
-        matchup.name, result.losing_player, filename)
+def show_result(matchup, result, location):
+    if location is None:
+        description = "no game record"
+    else:
+        pathname, offset = location
+        if offset == 0:
+            description = pathname
+        else:
+            description = "%s, offset %d" % (pathname, offset)
+    print "%s: %s forfeited game %s (%s)" % (
+        matchup.name, result.losing_player, result.game_id, description)
 
 def find_forfeits(ringmaster):
     ringmaster.load_status()
@@ -23,8 +31,8 @@ def find_forfeits(ringmaster):
         results = tournament_results.get_matchup_results(matchup_id)
         for result in results:
             if result.is_forfeit:
-                filename = ringmaster.get_sgf_filename(result.game_id)
-                show_result(matchup, result, filename)
+                location = ringmaster.get_sgf_location(result.game_id)
+                show_result(matchup, result, location)
 
 
 _description = """\
@@ -1,6 +1,7 @@
 """Split an SGF collection into separate files.
 
-This demonstrates the parsing functions from the sgf_grammar module.
+This demonstrates reading a collection one game at a time, so that large
+collections don't need to fit in memory.
 
 """
 
@@ -8,26 +9,22 @@ import os
 import sys
 from optparse import OptionParser
 
-from gomill import sgf_grammar
 from gomill import sgf
 
 def split_sgf_collection(pathname):
-    f = open(pathname)
-    sgf_src = f.read()
-    f.close()
     dirname, basename = os.path.split(pathname)
     root, ext = os.path.splitext(basename)
-    try:
-        coarse_games = sgf_grammar.parse_sgf_collection(sgf_src)
-    except ValueError, e:
-        raise StandardError("error parsing file: %s" % e)
-    for i, coarse_game in enumerate(coarse_games):
-        sgf_game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
-        sgf_game.get_root().add_comment_text(
-            "Split from %s (game %d)" % (basename, i+1))
-        split_pathname = os.path.join(dirname, "%s_%d%s" % (root, i+1, ext))
-        with open(split_pathname, "wb") as f:
-            f.write(sgf_game.serialise())
+    with open(pathname, "rb") as f:
+        try:
+            for i, (_, sgf_game) in enumerate(sgf.Sgf_game.iter_collection(f)):
+                sgf_game.get_root().add_comment_text(
+                    "Split from %s (game %d)" % (basename, i+1))
+                split_pathname = os.path.join(
+                    dirname, "%s_%d%s" % (root, i+1, ext))
+                with open(split_pathname, "wb") as f2:
+                    sgf_game.write(f2)
+        except ValueError, e:
+            raise StandardError("error parsing file: %s" % e)
 
 
 _description = """\
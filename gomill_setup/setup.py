@@ -138,7 +138,8 @@ setup(name='gomill',
       author="Matthew Woodcraft",
       author_email="matthew@woodcraft.me.uk",
       packages=['gomill'],
-      scripts=['ringmaster'],
+      scripts=['ringmaster', 'gomill-worker', 'gomill-sgf-index',
+               'gomill-sgf-positions'],
       cmdclass=cmdclass,
       classifiers=[
           "Development Status :: 5 - Production/Stable",
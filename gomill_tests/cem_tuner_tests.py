@@ -257,3 +257,71 @@ def test_random_candidate_colour(tc):
 
     tc.assertEqual(comp.wins, [1, 0, 0, 0])
 
+
+def test_confidence_radii(tc):
+    tc.assertEqual(cem_tuners.hoeffding_radius(0, 0.95), 1.0)
+    tc.assertAlmostEqual(cem_tuners.hoeffding_radius(10, 0.95), 0.4295, 4)
+    tc.assertAlmostEqual(cem_tuners.hoeffding_radius(40, 0.95), 0.2147, 4)
+    tc.assertEqual(cem_tuners.bernstein_radius(0, 0.5, 0.95), 1.0)
+    tc.assertAlmostEqual(cem_tuners.bernstein_radius(100, 0.0, 0.95),
+                         0.1228, 4)
+    tc.assertLess(cem_tuners.bernstein_radius(400, 0.02, 0.95),
+                  cem_tuners.hoeffding_radius(400, 0.95))
+
+def test_race_candidates(tc):
+    scores = [(0.6, 0.9), (0.0, 0.2), (0.1, 0.7), (0.3, 0.5)]
+    tc.assertEqual(
+        cem_tuners.race_candidates(scores, 1, [None, None, None, None]),
+        [None, 'eliminated', None, 'eliminated'])
+    tc.assertEqual(
+        cem_tuners.race_candidates(scores, 2, [None, None, None, None]),
+        ['elite', 'eliminated', None, None])
+    tc.assertEqual(
+        cem_tuners.race_candidates(scores, 1, [None, None, 'elite', None]),
+        [None, 'eliminated', 'elite', 'eliminated'])
+
+def test_racing(tc):
+    comp = cem_tuners.Cem_tuner('cemtest')
+    config = default_config()
+    config['racing'] = 'hoeffding'
+    config['racing_confidence'] = 0.5
+    config['batch_size'] = 6
+    config['elite_proportion'] = 0.25
+    comp.initialise_from_control_file(config)
+    comp.set_clean_status()
+
+    def play():
+        job = comp.get_game()
+        candidate_number, candidate_code, round_id = job.game_data
+        if candidate_number == 0:
+            winner = 'w'
+        else:
+            winner = 'b'
+        result = Game_result.from_score(winner, 1.5)
+        result.set_players({'b' : 'opp', 'w' : candidate_code})
+        response = Game_job_result()
+        response.game_id = job.game_id
+        response.game_result = result
+        response.engine_descriptions = {}
+        response.game_data = job.game_data
+        comp.process_game_result(response)
+        return candidate_number
+
+    played = [play() for _ in xrange(11)]
+    tc.assertEqual(played, [0, 1, 2, 3, 0, 1, 2, 3, 0, 1, 2])
+    tc.assertEqual(comp.wins, [3, 0, 0, 0])
+    tc.assertEqual(comp.race_decisions,
+                   [None, 'eliminated', 'eliminated', None])
+    tc.assertEqual(comp.game_limits, [9, 3, 3, 9])
+
+    comp2 = cem_tuners.Cem_tuner('cemtest')
+    comp2.initialise_from_control_file(config)
+    status = pickle.loads(pickle.dumps(comp.get_status()))
+    comp2.set_status(status)
+    tc.assertEqual(comp2.race_decisions, comp.race_decisions)
+    tc.assertEqual(comp2.game_limits, [9, 3, 3, 9])
+
+    tc.assertEqual(play(), 3)
+    tc.assertEqual(comp.generation, 1)
+    tc.assertEqual(comp.race_decisions, [None, None, None, None])
+    tc.assertEqual(comp.game_limits, [6, 6, 6, 6])
@@ -41,6 +41,10 @@ def test_format_vertex(tc):
     tc.assertRaises(ValueError, fv, (2, -1))
     tc.assertRaises(ValueError, fv, (25, 1))
     tc.assertRaises(ValueError, fv, (1, 25))
+    tc.assertEqual(fv([1, 5]), "F2")
+    tc.assertRaises(ValueError, fv, (1,))
+    tc.assertRaises(TypeError, fv, 3)
+    tc.assertRaises(TypeError, fv, (1.0, 2.0))
 
 def test_format_vertex_list(tc):
     fvl = common.format_vertex_list
@@ -69,4 +73,9 @@ def test_move_from_vertex(tc):
     tc.assertRaises(ValueError, cv, None, 9)
     tc.assertRaises(ValueError, cv, "A1", 0)
     tc.assertRaises(ValueError, cv, "A1", 30)
+    tc.assertEqual(cv(u"j9", 9), (8, 8))
+    tc.assertEqual(cv("Z25", 25), (24, 24))
+    tc.assertRaises(ValueError, cv, "Z25", 24)
+    tc.assertEqual(cv("A1", 9.0), (0, 0))
+    tc.assertEqual(cv("B2", 2.0), (1, 1))
 
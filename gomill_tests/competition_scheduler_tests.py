@@ -96,3 +96,45 @@ def test_grouped(tc):
     for token in issued:
         sc.fix(*token)
     tc.assertTrue(sc.all_fixed())
+
+def test_grouped_counts(tc):
+    sc = competition_schedulers.Group_scheduler()
+    sc.set_groups([('m1', 4), ('m2', 4)])
+    tokens = [sc.issue() for _ in xrange(5)]
+    sc.fix('m1', 0)
+    sc.fix('m2', 1)
+    sc.fix('m1', 2)
+    tc.assertEqual(sc.get_issued_count('m1'), 3)
+    tc.assertEqual(sc.get_issued_count('m2'), 2)
+    tc.assertEqual(sc.get_fixed_count('m1'), 2)
+    tc.assertEqual(sc.get_fixed_count('m2'), 1)
+    sc.rollback()
+    tc.assertEqual(sc.get_issued_count('m1'), 2)
+    tc.assertEqual(sc.get_fixed_count('m1'), 2)
+    sc.set_groups([('m1', 2), ('m2', 6)])
+    tc.assertEqual(sc.issue(), ('m2', 0))
+    tc.assertEqual(sc.issue(), ('m2', 2))
+    tc.assertEqual(sc.issue(), ('m2', 3))
+
+def test_fixed_tokens(tc):
+    sc = competition_schedulers.Group_scheduler()
+    sc.set_groups([('m1', None), ('m2', None)])
+    for _ in xrange(6):
+        sc.issue()
+    sc.fix('m1', 0)
+    sc.fix('m1', 2)
+    sc.fix('m2', 1)
+    tc.assertEqual(sc.get_fixed_tokens(), {'m1' : set([0, 2]),
+                                           'm2' : set([1])})
+
+    sc2 = competition_schedulers.Group_scheduler()
+    sc2.set_fixed_tokens({'m1' : set([1, 4]), 'm3' : set()})
+    tc.assertEqual(sc2.get_fixed_tokens(), {'m1' : set([1, 4]),
+                                            'm3' : set()})
+    tc.assertEqual(sc2.get_issued_count('m1'), 2)
+    tc.assertEqual(sc2.get_fixed_count('m1'), 2)
+    for allocator in sc2.allocators.itervalues():
+        allocator._check_consistent()
+    sc2.set_groups([('m1', 5)])
+    tc.assertListEqual([sc2.issue() for _ in xrange(4)],
+                       [('m1', 0), ('m1', 2), ('m1', 3), (None, None)])
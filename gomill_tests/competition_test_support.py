@@ -7,11 +7,12 @@ from gomill import game_jobs
 from gomill import gtp_games
 from gomill.gtp_controller import Engine_description
 
-def fake_response(job, winner):
+def fake_response(job, winner, move_hash=None):
     """Produce a response for the specified job.
 
-    job      -- Game_job
-    winner   -- winning colour (None for a jigo, 'unknown' for unknown result)
+    job       -- Game_job
+    winner    -- winning colour (None for a jigo, 'unknown' for unknown result)
+    move_hash -- string (default None)
 
     The winning margin (if not a jigo) is 1.5.
 
@@ -37,9 +38,11 @@ def fake_response(job, winner):
             "%s engine" % job.player_w.code, None,
             '%s engine\ntestdescription' % job.player_w.code),
         }
+    response.move_hash = move_hash
     response.game_data = job.game_data
     response.warnings = []
     response.log_entries = []
+    response.sgf_data = None
     return response
 
 def get_screen_report(comp):
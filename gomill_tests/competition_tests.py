@@ -163,3 +163,17 @@ def test_player_gtp_aliases(tc):
     tc.assertDictEqual(comp.players['t1'].gtp_aliases,
                        {'foo' : 'bar', 'baz' : 'quux'})
 
+
+def test_player_reuse_engine(tc):
+    comp = competitions.Competition('test')
+    config = {
+        'players' : {
+            't1' : Player_config("test"),
+            't2' : Player_config("test", reuse_engine=True),
+            }
+        }
+    comp.initialise_from_control_file(config)
+    tc.assertIs(comp.players['t1'].reuse_engine, False)
+    tc.assertIs(comp.players['t2'].reuse_engine, True)
+    tc.assertEqual(comp.players['t1'].get_engine_key(),
+                   comp.players['t2'].get_engine_key())
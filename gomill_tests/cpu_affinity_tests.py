@@ -0,0 +1,39 @@
+"""Tests for cpu_affinity.py"""
+
+import os
+import subprocess
+import sys
+
+from gomill import cpu_affinity
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def test_allocate_cpus(tc):
+    allocate = cpu_affinity.allocate_cpus
+    tc.assertEqual(allocate([0, 1, 2, 3], 2), [[0, 1], [2, 3]])
+    tc.assertEqual(allocate([0, 1, 2, 3, 4], 2), [[0, 1], [2, 3]])
+    tc.assertEqual(allocate([2, 5, 7], 3), [[2], [5], [7]])
+    tc.assertEqual(allocate([0, 1], 5), [[0], [1], [0], [1], [0]])
+
+def test_get_available_cpus(tc):
+    cpus = cpu_affinity.get_available_cpus()
+    tc.assertTrue(cpus)
+    tc.assertEqual(cpus, sorted(cpus))
+
+def test_set_cpu_affinity(tc):
+    if not cpu_affinity.is_supported():
+        tc.skipTest("cpu affinity not supported")
+    if not os.path.exists("/proc/self/status"):
+        tc.skipTest("/proc not available")
+    cpu = cpu_affinity.get_available_cpus()[-1]
+    p = subprocess.Popen(
+        ["grep", "Cpus_allowed_list", "/proc/self/status"],
+        stdout=subprocess.PIPE,
+        preexec_fn=lambda: cpu_affinity.set_cpu_affinity([cpu]))
+    output = p.communicate()[0]
+    tc.assertEqual(output.split(), ["Cpus_allowed_list:", str(cpu)])
+    tc.assertRaises(ValueError, cpu_affinity.set_cpu_affinity, [-1])
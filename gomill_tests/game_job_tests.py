@@ -7,6 +7,7 @@ from textwrap import dedent
 
 from gomill import gtp_controller
 from gomill import game_jobs
+from gomill import job_manager
 from gomill.job_manager import JobFailed
 
 from gomill_tests import test_framework
@@ -130,6 +131,37 @@ def test_player_copy(tc):
     tc.assertEqual(p2.cmd_args, ['testb', 'id=one'])
     tc.assertIsNot(p1.cmd_args, p2.cmd_args)
 
+def test_player_shared_key(tc):
+    fx = Game_job_fixture(tc)
+    p1 = fx.job.player_b
+    p1.startup_gtp_commands = [("param", ["a", "1"])]
+    hash(p1.get_shared_key())
+    tc.assertEqual(p1.copy("one").get_shared_key(), p1.get_shared_key())
+    tc.assertNotEqual(p1.copy("clone").get_shared_key(), p1.get_shared_key())
+    p2 = p1.copy("one")
+    p2.startup_gtp_commands[0] = ("param", ["a", "2"])
+    tc.assertNotEqual(p2.get_shared_key(), p1.get_shared_key())
+    p3 = p1.copy("one")
+    p3.environ = {'X' : "y"}
+    tc.assertNotEqual(p3.get_shared_key(), p1.get_shared_key())
+
+def test_game_job_shared_objects(tc):
+    fx = Game_job_fixture(tc)
+    packer = job_manager.Shared_object_packer()
+    unpacker = job_manager.Shared_object_unpacker()
+    unpacker.unpack(packer.pack(fx.job))
+    reset, new_objects, s = packer.pack(fx.job)
+    tc.assertEqual(new_objects, [])
+    job = unpacker.unpack((reset, new_objects, s))
+    tc.assertEqual(job.player_b.cmd_args, ['testb', 'id=one'])
+    result = job.run()
+    reset, new_objects, s = packer.pack(result)
+    tc.assertEqual(len(new_objects), 1)
+    result2 = unpacker.unpack((reset, new_objects, s))
+    tc.assertIs(result2.engine_descriptions['one'],
+                result2.engine_descriptions['two'])
+    tc.assertEqual(result2.game_result.sgf_result, "B+10.5")
+
 def test_game_job(tc):
     fx = Game_job_fixture(tc)
     fx.job.game_data = 'gamedata'
@@ -172,6 +204,25 @@ def test_game_job(tc):
     C[one beat two B+10.5]W[tt])
     """))
 
+def test_game_job_opening(tc):
+    def permit_pipelining(channel):
+        channel.permit_pipelining = True
+    fx = Game_job_fixture(tc)
+    fx.init_player('b', permit_pipelining)
+    fx.init_player('w', permit_pipelining)
+    fx.job.opening = [('b', (0, 0)), ('w', (8, 8))]
+    fx.job.run()
+    tc.assertIn("SZ[9];\nB[ai];W[ia];B[ei];W[gi];", fx.job._get_sgf_written())
+
+def test_game_job_invalid_opening(tc):
+    fx = Game_job_fixture(tc)
+    fx.job.opening = [('b', (0, 0)), ('w', (0, 0))]
+    tc.assertRaisesRegexp(
+        JobFailed,
+        "aborting game due to error:\n"
+        "invalid opening: move 2: attempted move to occupied point A1",
+        fx.job.run)
+
 def test_game_job_duplicate_player_codes(tc):
     fx = Game_job_fixture(tc)
     fx.job.player_w.code = "one"
@@ -185,6 +236,15 @@ def test_game_job_no_sgf(tc):
     result = fx.job.run()
     tc.assertEqual(result.game_result.sgf_result, "B+10.5")
     tc.assertIsNone(fx.job._sgf_pathname_written)
+    tc.assertIsNone(result.sgf_data)
+
+def test_game_job_return_sgf(tc):
+    fx = Game_job_fixture(tc)
+    fx.job.return_sgf = True
+    result = fx.job.run()
+    tc.assertIsNone(fx.job._sgf_pathname_written)
+    tc.assertIn("RE[B+10.5]", result.sgf_data)
+    tc.assertTrue(result.sgf_data.endswith("W[tt])\n"))
 
 def test_game_job_forfeit(tc):
     fx = Game_job_fixture(tc)
@@ -342,6 +402,18 @@ def test_game_job_worker_id(tc):
     tc.assertEqual(channel.requested_env['GOMILL_GAME_ID'], 'gameid')
     tc.assertEqual(channel.requested_env['GOMILL_SLOT'], '0')
 
+def test_game_job_cpu_affinity(tc):
+    fx = gtp_engine_fixtures.Mock_subprocess_fixture(tc)
+    gj = Game_job_fixture(tc)
+    gj.job.cpu_affinity_map = [[0, 1], [2, 3]]
+    gj.job.run(1)
+    tc.assertEqual(fx.get_channel('one').requested_cpu_affinity, [2, 3])
+    tc.assertEqual(fx.get_channel('two').requested_cpu_affinity, [2, 3])
+    gj.job.run(2)
+    tc.assertIsNone(fx.get_channel('one').requested_cpu_affinity)
+    gj.job.run(None)
+    tc.assertIsNone(fx.get_channel('one').requested_cpu_affinity)
+
 def test_game_job_stderr_discarded(tc):
     fx = Game_job_fixture(tc)
     fx.job.player_b.discard_stderr = True
@@ -623,6 +695,91 @@ def test_game_job_explain_final_move_zero_move_game(tc):
           "two beat one W+R",
         ])
 
+def test_game_job_reuse_engine(tc):
+    clog = []
+    def handle_param(args):
+        clog.append(args)
+    def handle_cpu_time(args):
+        return str(10.0 * (len(clog) + 1))
+    fx = Game_job_fixture(tc)
+    tc.addCleanup(game_jobs.close_cached_engines)
+    fx.add_handler('w', 'param', handle_param)
+    fx.add_handler('w', 'gomill-cpu_time', handle_cpu_time)
+    fx.job.player_w.reuse_engine = True
+    fx.job.player_w.startup_gtp_commands = [('param', ['1'])]
+    result = fx.job.run()
+    tc.assertEqual(result.game_result.sgf_result, "B+10.5")
+    tc.assertEqual(result.game_result.cpu_times, {'one': 546.2, 'two': 20.0})
+    channel = fx.get_channel('two')
+    tc.assertFalse(channel.is_closed)
+    tc.assertTrue(fx.get_channel('one').is_closed)
+
+    job2 = Test_game_job()
+    job2.game_id = 'gameid2'
+    job2.player_b = fx.job.player_b
+    job2.player_w = fx.job.player_w.copy('three')
+    job2.player_w.startup_gtp_commands = [('param', ['2'])]
+    job2.board_size = 9
+    job2.komi = 7.5
+    job2.move_limit = 1000
+    result2 = job2.run()
+    # The test player doesn't reset on clear_board, so white just passes
+    tc.assertEqual(result2.game_result.sgf_result, "B+73.5")
+    tc.assertEqual(result2.game_result.player_w, 'three')
+    tc.assertIs(fx.get_channel('two'), channel)
+    tc.assertFalse(channel.is_closed)
+    tc.assertEqual(clog, [['1'], ['2']])
+    tc.assertEqual(result2.game_result.cpu_times, {'one': 546.2, 'three': 10.0})
+
+    game_jobs.close_cached_engines()
+    tc.assertTrue(channel.is_closed)
+
+def test_game_job_reuse_engine_per_worker(tc):
+    fx = Game_job_fixture(tc)
+    tc.addCleanup(game_jobs.close_cached_engines)
+    fx.job.player_w.reuse_engine = True
+    fx.job.run(0)
+    channel = fx.get_channel('two')
+    tc.assertFalse(channel.is_closed)
+
+    def make_job():
+        job = Test_game_job()
+        job.game_id = 'gameid2'
+        job.player_b = fx.job.player_b
+        job.player_w = fx.job.player_w
+        job.board_size = 9
+        job.komi = 7.5
+        job.move_limit = 1000
+        return job
+    # Another worker doesn't take the engine
+    make_job().run(1)
+    channel1 = fx.get_channel('two')
+    tc.assertIsNot(channel1, channel)
+    tc.assertFalse(channel.is_closed)
+    tc.assertEqual(sorted(game_jobs._engine_cache),
+                   [(0, fx.job.player_w.get_engine_key()),
+                    (1, fx.job.player_w.get_engine_key())])
+    # The original worker does
+    make_job().run(0)
+    tc.assertEqual(len(game_jobs._engine_cache[
+        (0, fx.job.player_w.get_engine_key())]), 1)
+    # Closing one worker's engines leaves the other's running
+    game_jobs.close_cached_engines(1)
+    tc.assertTrue(channel1.is_closed)
+    tc.assertFalse(channel.is_closed)
+    tc.assertEqual(sorted(game_jobs._engine_cache),
+                   [(0, fx.job.player_w.get_engine_key())])
+
+def test_game_job_reuse_engine_after_error(tc):
+    fx = Game_job_fixture(tc)
+    tc.addCleanup(game_jobs.close_cached_engines)
+    fx.force_fatal_error('w', 'genmove')
+    fx.job.player_w.reuse_engine = True
+    result = fx.job.run()
+    tc.assertEqual(result.game_result.sgf_result, "B+F")
+    tc.assertTrue(fx.get_channel('two').is_closed)
+    tc.assertEqual(game_jobs._engine_cache, {})
+
 
 ### check_player
 
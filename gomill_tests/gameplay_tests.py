@@ -479,6 +479,10 @@ class Testing_backend(gameplay.Backend):
         self.log.append("notify_fixed_handicap: %r %r %r" %
                         (colour, handicap, points))
 
+    def notify_opening(self, moves):
+        self.log.append("notify_opening: %s" % " ".join(
+            "%s/%s" % (colour, format_vertex(move)) for colour, move in moves))
+
     def _action_for_vertex(self, vertex):
         if vertex in ('resign', 'claim'):
             return vertex, None
@@ -1176,6 +1180,41 @@ def test_game_runner_free_handicap(tc):
 (;FF[4]AB[cd][eb][ed]AP[gomill:VER]CA[UTF-8]DT[***]GM[1]HA[3]KM[11]RE[W+99]SZ[5];W[ce];B[de];W[tt];B[tt])
 """)
 
+def test_game_runner_opening(tc):
+    def opening(*vertices):
+        return [(colour, move_from_vertex(vertex, 9))
+                for colour, vertex in zip("bwbwbw", vertices)]
+    fx = Game_runner_fixture(tc, size=9, moves=[('b', 'C1'), ('w', 'D1')])
+    tc.assertRaises(gameplay.GameRunnerStateError,
+                    fx.game_runner.set_opening, opening("E5"))
+    fx.game_runner.prepare()
+    tc.assertRaisesRegexp(ValueError,
+                          "^move 2: attempted move to occupied point E5$",
+                          fx.game_runner.set_opening, opening("E5", "E5"))
+    tc.assertRaisesRegexp(ValueError, "move 1: b is next to play",
+                          fx.game_runner.set_opening, [('w', None)])
+    tc.assertRaisesRegexp(ValueError, "opening ends the game",
+                          fx.game_runner.set_opening, opening("pass", "pass"))
+    fx.game_runner.set_opening(opening("E5", "pass"))
+    tc.assertRaises(gameplay.GameRunnerStateError,
+                    fx.game_runner.set_opening, opening("E5"))
+    tc.assertRaises(gameplay.GameRunnerStateError,
+                    fx.game_runner.set_handicap, 3, is_free=False)
+    fx.game_runner.run()
+    tc.assertEqual(fx.backend.log[:3], [
+        "start_new_game: size=9, komi=11.0",
+        "notify_opening: b/E5 w/pass",
+        "get_move <- b: move/C1",
+        ])
+    tc.assertEqual([(colour, format_vertex(move), comment)
+                    for colour, move, comment in fx.game_runner.get_moves()],
+                   [('b', 'E5', None), ('w', 'pass', None),
+                    ('b', 'C1', None), ('w', 'D1', None),
+                    ('b', 'pass', None), ('w', 'pass', None)])
+    tc.assertEqual(fx.sgf_string(), """\
+(;FF[4]AP[gomill:VER]CA[UTF-8]DT[***]GM[1]KM[11]RE[W+99]SZ[9];B[ee];W[tt];B[ci];W[di];B[tt];W[tt])
+""")
+
 def test_game_runner_free_handicap_bounds(tc):
     class _Backend(Testing_backend):
         def get_free_handicap(self, handicap):
@@ -63,8 +63,10 @@ class Testing_gtp_channel(gtp_controller.Linebased_gtp_channel):
 
     This raises an error if sent two commands without requesting a response in
     between, or if asked for a response when no command was sent since the last
-    response. (GTP permits stacking up commands, but Gtp_controller should never
-    do it, so we want to report it). Similarly we reject empty command lines.
+    response. (GTP permits stacking up commands, but Gtp_controller should only
+    do it in do_pipelined_commands(), so we want to report it otherwise). Set
+    the attribute permit_pipelining to True to allow stacked commands.
+    Similarly we reject empty command lines.
 
     Unlike Internal_gtp_channel, this runs the command at the point when it is
     sent.
@@ -90,6 +92,7 @@ class Testing_gtp_channel(gtp_controller.Linebased_gtp_channel):
         self.session_is_ended = False
         self.is_closed = False
         self.engine_exit_breaks_commands = True
+        self.permit_pipelining = False
         self.fail_next_command = False
         self.fail_next_response = False
         self.force_next_response = None
@@ -99,7 +102,7 @@ class Testing_gtp_channel(gtp_controller.Linebased_gtp_channel):
     def send_command_line(self, command):
         if self.is_closed:
             raise SupporterError("channel is closed")
-        if self.stored_response != "":
+        if self.stored_response != "" and not self.permit_pipelining:
             raise SupporterError("two commands in a row")
         if self.session_is_ended:
             if self.engine_exit_breaks_commands:
@@ -111,10 +114,10 @@ class Testing_gtp_channel(gtp_controller.Linebased_gtp_channel):
         if self.fail_command and command.startswith(self.fail_command):
             self.fail_command = None
             raise GtpTransportError("forced failure for send_command_line")
-        self.stored_response, self.session_is_ended = \
-            self.engine.handle_line(command)
-        if self.stored_response is None:
+        response, self.session_is_ended = self.engine.handle_line(command)
+        if response is None:
             raise SupporterError("empty command line")
+        self.stored_response += response
 
     def get_response_line(self):
         if self.is_closed:
@@ -244,6 +244,20 @@ def test_testing_gtp_channel_sequencing(tc):
         SupporterError, "two commands in a row",
         channel.send_command, "test", [])
 
+def test_testing_gtp_channel_pipelining(tc):
+    engine = gtp_engine_fixtures.get_test_engine()
+    channel = gtp_controller_test_support.Testing_gtp_channel(engine)
+    channel.permit_pipelining = True
+    channel.send_command("test", ["a"])
+    channel.send_command("error", [])
+    channel.send_command("test", ["b"])
+    tc.assertEqual(channel.get_response(), (False, "args: a"))
+    tc.assertEqual(channel.get_response(), (True, "normal error"))
+    tc.assertEqual(channel.get_response(), (False, "args: b"))
+    tc.assertRaisesRegexp(
+        SupporterError, "response request without command",
+        channel.get_response)
+
 def test_testing_gtp_force_error(tc):
     engine = gtp_engine_fixtures.get_test_engine()
     channel = gtp_controller_test_support.Testing_gtp_channel(engine)
@@ -324,6 +338,40 @@ def test_controller_first_command_error(tc):
         "normal error")
     tc.assertListEqual(controller.retrieve_error_messages(), [])
 
+def test_controller_pipelined_commands(tc):
+    channel = gtp_engine_fixtures.get_test_channel()
+    channel.permit_pipelining = True
+    controller = Gtp_controller(channel, 'player test')
+    tc.assertListEqual(
+        controller.do_pipelined_commands(
+            [("test", ["ab"]), ("test", []), ("test", ["cd", "ef"])]),
+        ["args: ab", "test response", "args: cd ef"])
+    with tc.assertRaises(BadGtpResponse) as ar:
+        controller.do_pipelined_commands(
+            [("test", []), ("error", []), ("multiline", [])])
+    tc.assertEqual(ar.exception.gtp_error_message, "normal error")
+    tc.assertEqual(ar.exception.gtp_command, "error")
+    tc.assertEqual(str(ar.exception),
+                   "failure response from 'error' to player test:\n"
+                   "normal error")
+    # All responses were read, so the channel is still in step
+    tc.assertEqual(controller.do_command("test"), "test response")
+    tc.assertFalse(controller.channel_is_bad)
+    tc.assertListEqual(controller.do_pipelined_commands([]), [])
+
+def test_controller_pipelined_commands_transport_error(tc):
+    channel = gtp_engine_fixtures.get_test_channel()
+    channel.permit_pipelining = True
+    controller = Gtp_controller(channel, 'player test')
+    channel.fail_command = "test b"
+    with tc.assertRaises(GtpTransportError) as ar:
+        controller.do_pipelined_commands([("test", ["a"]), ("test", ["b"])])
+    tc.assertEqual(
+        str(ar.exception),
+        "transport error sending 'test b' to player test:\n"
+        "forced failure for send_command_line")
+    tc.assertTrue(controller.channel_is_bad)
+
 def test_controller_command_transport_error(tc):
     channel = gtp_engine_fixtures.get_test_channel()
     controller = Gtp_controller(channel, 'player test')
@@ -311,6 +311,7 @@ class Mock_subprocess_gtp_channel(
         requested_stderr
         requested_cwd
         requested_env
+        requested_cpu_affinity
 
     After close(), provides mocked-up exit_status and resource_usage, like a
     Subprocess_gtp_channel. The cpu time used is a function of command[0]
@@ -321,11 +322,13 @@ class Mock_subprocess_gtp_channel(
     callback_registry = {}
     channels = {}
 
-    def __init__(self, command, stderr=None, cwd=None, env=None):
+    def __init__(self, command, stderr=None, cwd=None, env=None,
+                 cpu_affinity=None):
         self.requested_command = command
         self.requested_stderr = stderr
         self.requested_cwd = cwd
         self.requested_env = env
+        self.requested_cpu_affinity = cpu_affinity
         self.id = None
         engine = None
         callbacks = []
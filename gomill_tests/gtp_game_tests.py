@@ -869,6 +869,34 @@ def test_fixed_handicap_bad_engine(tc):
         "^bad response from fixed_handicap command to two: C3 G3 C7$",
         fx.game.set_handicap, 3, is_free=False)
 
+def test_opening(tc):
+    moves = [('b', 'C3'), ('w', 'D4')]
+    fx = Gtp_game_fixture(tc, Programmed_player(moves), Programmed_player(moves))
+    fx.channel_b.permit_pipelining = True
+    fx.channel_w.permit_pipelining = True
+    fx.game.prepare()
+    fx.game.set_opening([('b', (0, 0)), ('w', (1, 1))])
+    tc.assertListEqual(fx.player_b.seen_played, ['A1', 'B2'])
+    tc.assertListEqual(fx.player_w.seen_played, ['A1', 'B2'])
+    fx.game.run()
+    fx.check_moves([
+        ('b', 'A1'), ('w', 'B2'),
+        ('b', 'C3'), ('w', 'D4'),
+        ('b', 'pass'), ('w', 'pass'),
+        ])
+    tc.assertListEqual(fx.player_w.seen_played, ['A1', 'B2', 'C3', 'PASS'])
+
+def test_opening_rejected(tc):
+    fx = Gtp_game_fixture(tc, player_w=Programmed_player(
+        [], reject=('B2', "illegal move")))
+    fx.channel_b.permit_pipelining = True
+    fx.channel_w.permit_pipelining = True
+    fx.game.prepare()
+    tc.assertRaisesRegexp(
+        gtp_controller.BadGtpResponse,
+        "^failure response from 'play w B2' to player two:\nillegal move$",
+        fx.game.set_opening, [('b', (0, 0)), ('w', (1, 1)), ('b', (2, 2))])
+
 def test_free_handicap(tc):
     fh_calls = []
     def handle_place_free_handicap(args):
@@ -0,0 +1,544 @@
+"""Tests for job_manager.py"""
+
+from __future__ import with_statement
+
+import os
+import time
+import select
+import subprocess
+import threading
+import cPickle as pickle
+
+from gomill import job_manager
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+class Shared_thing(object):
+    def __init__(self, code, payload):
+        self.code = code
+        self.payload = payload
+
+    def get_shared_key(self):
+        return (self.code, self.payload)
+
+class Holder(object):
+    def __init__(self, *things):
+        self.things = things
+
+def test_shared_object_packing(tc):
+    packer = job_manager.Shared_object_packer()
+    unpacker = job_manager.Shared_object_unpacker()
+    def transfer(obj):
+        message = pickle.loads(pickle.dumps(packer.pack(obj), 2))
+        return message, unpacker.unpack(message)
+    a = Shared_thing('a', "x" * 1000)
+    b = Shared_thing('b', "y")
+    message, result = transfer(Holder(a, b, a))
+    reset, new_objects, s = message
+    tc.assertIs(reset, False)
+    tc.assertEqual(len(new_objects), 2)
+    tc.assertEqual([thing.code for thing in result.things], ['a', 'b', 'a'])
+    tc.assertIs(result.things[0], result.things[2])
+    a2 = result.things[0]
+
+    # An equal object isn't sent again
+    message, result = transfer(Holder(Shared_thing('a', "x" * 1000)))
+    reset, new_objects, s = message
+    tc.assertEqual(new_objects, [])
+    tc.assertLess(len(s), 100)
+    tc.assertIs(result.things[0], a2)
+
+    # A changed object is
+    message, result = transfer(Holder(Shared_thing('a', "z")))
+    reset, new_objects, s = message
+    tc.assertEqual(len(new_objects), 1)
+    tc.assertEqual(result.things[0].payload, "z")
+
+    tc.assertEqual(transfer([1, "two", None])[1], [1, "two", None])
+
+def test_shared_object_packing_limit(tc):
+    tc.addCleanup(setattr, job_manager, 'MAX_SHARED_OBJECTS',
+                  job_manager.MAX_SHARED_OBJECTS)
+    job_manager.MAX_SHARED_OBJECTS = 2
+    packer = job_manager.Shared_object_packer()
+    unpacker = job_manager.Shared_object_unpacker()
+    resets = []
+    for code in "abcab":
+        message = packer.pack(Shared_thing(code, ""))
+        resets.append(message[0])
+        tc.assertEqual(unpacker.unpack(message).code, code)
+        tc.assertLessEqual(len(unpacker.shared_objects), 2)
+    tc.assertListEqual(resets, [False, False, True, False, True])
+
+
+class Test_job(object):
+    def __init__(self, thing, fail=False, action=None, fd=None):
+        self.thing = thing
+        self.fail = fail
+        self.action = action
+        self.fd = fd
+
+    def run(self, worker_id):
+        if self.action == 'exit':
+            os._exit(1)
+        if self.action == 'spawn':
+            # Start a subprocess holding self.fd open, and report its pid
+            p = subprocess.Popen(["sleep", "1234"], stdout=self.fd)
+            os.write(self.fd, "%d\n" % p.pid)
+        if self.action in ('hang', 'spawn'):
+            time.sleep(60)
+        if self.action == 'nap':
+            time.sleep(0.05)
+        if self.fail:
+            raise job_manager.JobFailed("failed %s" % self.thing.code)
+        return (self.thing.code, self.thing.payload, worker_id)
+
+class Test_job_source(object):
+    def __init__(self, jobs):
+        self.jobs = list(jobs)
+        self.responses = []
+        self.errors = []
+
+    def get_job(self):
+        if not self.jobs:
+            return job_manager.NoJobAvailable
+        return self.jobs.pop(0)
+
+    def process_response(self, response):
+        self.responses.append(response)
+
+    def process_error_response(self, job, message):
+        self.errors.append((job.thing.code, message))
+
+def test_run_jobs_multiprocessing(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    thing = Shared_thing('t', "payload")
+    job_source = Test_job_source(
+        [Test_job(thing) for _ in range(5)] +
+        [Test_job(Shared_thing('u', ""), fail=True)])
+    job_manager.run_jobs(job_source, max_workers=2)
+    tc.assertEqual(len(job_source.responses), 5)
+    for code, payload, worker_id in job_source.responses:
+        tc.assertEqual((code, payload), ('t', "payload"))
+        tc.assertIn(worker_id, (0, 1))
+    tc.assertListEqual(job_source.errors, [('u', "failed u")])
+
+def test_multiprocessing_worker_recovery(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(2, job_timeout=0.5)
+    jm.check_interval = 0.1
+    job_source = Test_job_source(
+        [Test_job(Shared_thing('x', ""), action='exit'),
+         Test_job(Shared_thing('h', ""), action='hang')] +
+        [Test_job(Shared_thing('t', "payload")) for _ in range(4)])
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 4)
+    for code, payload, worker_id in job_source.responses:
+        tc.assertIn(worker_id, (0, 1))
+    tc.assertListEqual(sorted(job_source.errors), [
+        ('h', "worker process killed: job took longer than 0.5 seconds"),
+        ('x', "worker process died (exit code 1)"),
+        ])
+    tc.assertEqual(jm.generations, [1, 1])
+
+def test_multiprocessing_worker_timeout_kills_subprocesses(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(1, job_timeout=0.5)
+    jm.check_interval = 0.1
+    r, w = os.pipe()
+    tc.addCleanup(os.close, r)
+    job_source = Test_job_source(
+        [Test_job(Shared_thing('s', ""), action='spawn', fd=w)])
+    try:
+        job_manager._run_job_manager(jm, job_source)
+    finally:
+        os.close(w)
+    tc.assertListEqual(job_source.errors, [
+        ('s', "worker process killed: job took longer than 0.5 seconds"),
+        ])
+    # The pipe reaches EOF once every process holding it open has exited.
+    output = ""
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        if not select.select([r], [], [], 0.1)[0]:
+            continue
+        s = os.read(r, 100)
+        if not s:
+            break
+        output += s
+    else:
+        os.kill(int(output), 9)
+        tc.fail("subprocess outlived its worker")
+    tc.assertTrue(output.strip().isdigit())
+
+class Resizing_job_source(Test_job_source):
+    """Job source which asks for different numbers of workers.
+
+    worker_counts -- map number of responses received -> worker count
+
+    """
+    def __init__(self, jobs, worker_counts):
+        Test_job_source.__init__(self, jobs)
+        self.worker_counts = worker_counts
+
+    def get_worker_count(self):
+        received = len(self.responses)
+        return self.worker_counts[
+            max(n for n in self.worker_counts if n <= received)]
+
+def test_multiprocessing_worker_count_changes(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(1)
+    job_source = Resizing_job_source(
+        [Test_job(Shared_thing('t', ""), action='nap') for _ in range(12)],
+        {0 : 1, 2 : 3, 8 : 1})
+    jm.start_workers()
+    try:
+        jm.run_jobs(job_source)
+        tc.assertEqual(jm.number_of_workers, 1)
+        tc.assertEqual(jm.workers[1:], [None, None])
+        dismissed = jm.dismissed_workers
+    finally:
+        jm.finish()
+    tc.assertEqual(len(job_source.responses), 12)
+    tc.assertEqual(job_source.errors, [])
+    tc.assertEqual(set(worker_id for (_, _, worker_id)
+                       in job_source.responses), set([0, 1, 2]))
+    for worker in dismissed:
+        tc.assertEqual(worker.exitcode, 0)
+
+def test_multiprocessing_worker_recycling(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(2, max_jobs_per_worker=2)
+    thing = Shared_thing('t', "payload")
+    job_source = Test_job_source([Test_job(thing) for _ in range(7)])
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 7)
+    tc.assertEqual(set(worker_id for (_, _, worker_id)
+                       in job_source.responses), set([0, 1]))
+    tc.assertEqual(job_source.errors, [])
+    # Seven jobs between two workers, retiring after every two jobs
+    tc.assertEqual(sum(jm.generations), 3)
+
+def test_multiprocessing_worker_rss_limit(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    if job_manager.get_process_rss() is None:
+        tc.skipTest("resident set size not available")
+    jm = job_manager.Multiprocessing_job_manager(1, max_worker_rss=1)
+    job_source = Test_job_source(
+        [Test_job(Shared_thing('t', "payload")) for _ in range(3)])
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 3)
+    tc.assertEqual(jm.generations, [3])
+
+class Stopping_job_source(Test_job_source):
+    """Job source which stops after issuing a fixed number of jobs.
+
+    It cancels prefetched jobs once it has stopped.
+
+    """
+    def __init__(self, jobs, stop_after):
+        Test_job_source.__init__(self, jobs)
+        self.stop_after = stop_after
+        self.issued = 0
+        self.cancelled = []
+
+    def get_job(self):
+        if self.issued == self.stop_after:
+            return job_manager.NoJobAvailable
+        self.issued += 1
+        return Test_job_source.get_job(self)
+
+    def cancel_job(self, job):
+        self.cancelled.append(job.thing.code)
+        return True
+
+def test_multiprocessing_prefetch(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(2, prefetch=2)
+    job_source = Test_job_source(
+        [Test_job(Shared_thing('t', "payload")) for _ in range(7)])
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 7)
+    tc.assertEqual(job_source.errors, [])
+
+def test_multiprocessing_prefetch_cancel(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(1, prefetch=2)
+    job_source = Stopping_job_source(
+        [Test_job(Shared_thing(code, "")) for code in "abcde"], stop_after=3)
+    job_manager._run_job_manager(jm, job_source)
+    # a is sent, b and c are prefetched, b is sent when a finishes, and then
+    # the job source stops.
+    tc.assertEqual([code for (code, _, _) in job_source.responses],
+                   ['a', 'b'])
+    tc.assertEqual(job_source.cancelled, ['c'])
+
+class Waiting_job_source(Test_job_source):
+    """Job source which has no jobs available until it has been polled.
+
+    It says it has no job available yet for the first 'wait_polls' calls to
+    poll().
+
+    """
+    def __init__(self, jobs, wait_polls):
+        Test_job_source.__init__(self, jobs)
+        self.wait_polls = wait_polls
+        self.polls = 0
+
+    def get_job(self):
+        if self.polls < self.wait_polls:
+            return job_manager.NoJobAvailableYet
+        return Test_job_source.get_job(self)
+
+    def poll(self):
+        self.polls += 1
+
+def test_multiprocessing_no_job_available_yet(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(2)
+    jm.poll_interval = 0.01
+    job_source = Waiting_job_source(
+        [Test_job(Shared_thing('t', "payload")) for _ in range(3)],
+        wait_polls=3)
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 3)
+    tc.assertTrue(job_source.polls >= 3)
+
+def test_threaded_no_job_available_yet(tc):
+    jm = job_manager.Threaded_job_manager(2)
+    jm.poll_interval = 0.01
+    job_source = Waiting_job_source(
+        [Test_job(Shared_thing('t', "payload")) for _ in range(3)],
+        wait_polls=3)
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 3)
+    tc.assertTrue(job_source.polls >= 3)
+
+def test_in_process_no_job_available_yet(tc):
+    jm = job_manager.In_process_job_manager()
+    jm.poll_interval = 0.01
+    job_source = Waiting_job_source(
+        [Test_job(Shared_thing('t', "payload")) for _ in range(2)],
+        wait_polls=3)
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 2)
+    # polled while waiting and after each job
+    tc.assertEqual(job_source.polls, 5)
+
+def test_poll_error(tc):
+    class Failing_job_source(Test_job_source):
+        def poll(self):
+            raise ZeroDivisionError
+    job_source = Failing_job_source([Test_job(Shared_thing('t', ""))])
+    with tc.assertRaises(job_manager.JobSourceError) as ar:
+        job_manager.run_jobs(job_source, allow_mp=False)
+    tc.assertIn("error from poll()", str(ar.exception))
+
+def test_run_jobs_threaded(tc):
+    thing = Shared_thing('t', "payload")
+    job_source = Test_job_source(
+        [Test_job(thing) for _ in range(5)] +
+        [Test_job(Shared_thing('u', ""), fail=True)])
+    job_manager.run_jobs(job_source, max_workers=2, use_threads=True)
+    tc.assertEqual(len(job_source.responses), 5)
+    for code, payload, worker_id in job_source.responses:
+        tc.assertEqual((code, payload), ('t', "payload"))
+        tc.assertIn(worker_id, (0, 1))
+    tc.assertListEqual(job_source.errors, [('u', "failed u")])
+
+def test_threaded_worker_count_changes(tc):
+    cleanups = []
+    job_manager.register_worker_cleanup(cleanups.append)
+    tc.addCleanup(job_manager._worker_cleanup_functions.remove,
+                  cleanups.append)
+    jm = job_manager.Threaded_job_manager(1)
+    job_source = Resizing_job_source(
+        [Test_job(Shared_thing('t', ""), action='nap') for _ in range(12)],
+        {0 : 1, 2 : 3, 8 : 1})
+    job_manager._run_job_manager(jm, job_source)
+    tc.assertEqual(len(job_source.responses), 12)
+    tc.assertEqual(set(worker_id for (_, _, worker_id)
+                       in job_source.responses), set([0, 1, 2]))
+    tc.assertEqual(jm.number_of_workers, 1)
+    # Each thread releases its own resources as it finishes
+    tc.assertEqual(sorted(cleanups), [0, 1, 2])
+
+def test_run_jobs_in_process(tc):
+    job_source = Test_job_source(
+        [Test_job(Shared_thing('t', "payload")),
+         Test_job(Shared_thing('u', ""), fail=True)])
+    job_manager.run_jobs(job_source, allow_mp=False)
+    tc.assertListEqual(job_source.responses, [('t', "payload", None)])
+    tc.assertListEqual(job_source.errors, [('u', "failed u")])
+
+def test_job_manager_stats(tc):
+    stats = job_manager.Job_manager_stats()
+    stats.start([0, 1])
+    stats.add_time('get_job', 0.002)
+    stats.add_time('get_job', 0.004)
+    stats.job_finished(0, 0.0)
+    stats.note_backlog(3)
+    stats.note_backlog(2)
+    tc.assertEqual(stats.timings['get_job'][0], 2)
+    tc.assertAlmostEqual(stats.timings['get_job'][1], 0.006)
+    tc.assertEqual(stats.jobs_completed, 1)
+    tc.assertEqual(stats.max_backlog, 3)
+    lines = stats.describe().split("\n")
+    tc.assertEqual(lines[1][:17], "jobs completed: 1")
+    tc.assertEqual(lines[2], "max response backlog: 3")
+    tc.assertEqual(lines[3][:30], "get_job: 2 calls, 0.006s total")
+    tc.assertEqual(lines[4][:18], "worker 0: busy 0.0")
+    tc.assertEqual(lines[5][:18], "worker 1: busy 0.0")
+
+def test_run_jobs_stats(tc):
+    for kwargs in [dict(allow_mp=False),
+                   dict(max_workers=2, use_threads=True)]:
+        stats = job_manager.Job_manager_stats()
+        job_source = Test_job_source(
+            [Test_job(Shared_thing('t', "payload")) for _ in range(3)] +
+            [Test_job(Shared_thing('u', ""), fail=True)])
+        job_manager.run_jobs(job_source, stats=stats, **kwargs)
+        tc.assertEqual(stats.jobs_completed, 4)
+        tc.assertGreaterEqual(stats.timings['get_job'][0], 5)
+        tc.assertEqual(stats.timings['process_response'][0], 4)
+    tc.assertEqual(sorted(stats.worker_busy_time), [0, 1])
+    tc.assertGreaterEqual(stats.max_backlog, 1)
+
+def test_multiprocessing_stats_count_timed_out_waits(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Multiprocessing_job_manager(1)
+    jm.poll_interval = 0.01
+    stats = jm.stats
+    job_source = Test_job_source(
+        [Test_job(Shared_thing('t', ""), action='nap') for _ in range(2)])
+    jm.start_workers()
+    try:
+        jm.run_jobs(job_source)
+    finally:
+        jm.finish()
+    tc.assertEqual(stats.jobs_completed, 2)
+    tc.assertGreater(stats.timings['wait'][0], 2)
+    tc.assertGreaterEqual(stats.timings['wait'][1], 0.08)
+
+def test_network_job_manager(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    connection_module = job_manager.multiprocessing.connection
+    jm = job_manager.Network_job_manager(('127.0.0.1', 0), "testkey")
+    jm.start_workers()
+    tc.addCleanup(jm.finish)
+    address = jm.address
+    log = []
+    def run_workers():
+        # A client with the wrong key is refused
+        try:
+            connection_module.Client(address, authkey="wrongkey")
+        except job_manager.multiprocessing.AuthenticationError:
+            log.append("refused")
+        # A worker which disconnects after taking a job
+        connection = connection_module.Client(address, authkey="testkey")
+        log.append(connection.recv())
+        job = job_manager.Shared_object_unpacker().unpack(connection.recv())
+        log.append(job.thing.code)
+        connection.close()
+        # A worker which does the rest of the work
+        job_manager.run_network_worker(address, "testkey")
+        log.append("finished")
+    thread = threading.Thread(target=run_workers)
+    thread.setDaemon(True)
+    thread.start()
+    job_source = Test_job_source(
+        [Test_job(Shared_thing(code, "payload")) for code in "abcd"] +
+        [Test_job(Shared_thing('u', ""), fail=True)])
+    jm.run_jobs(job_source)
+    jm.finish()
+    thread.join(5)
+    tc.assertListEqual(log, ["refused", 0, 'a', "finished"])
+    # The job whose worker disconnected is reported as an error
+    tc.assertListEqual(sorted(job_source.responses),
+                       [(code, "payload", 1) for code in "bcd"])
+    tc.assertListEqual(sorted(job_source.errors), [
+        ('a', "network worker disconnected"),
+        ('u', "failed u"),
+        ])
+
+class Stoppable_job_source(Test_job_source):
+    """Job source which receives a stop request on its third poll."""
+    def __init__(self, jobs):
+        Test_job_source.__init__(self, jobs)
+        self.polls = 0
+        self.stopping = False
+        self.cancelled = []
+
+    def get_job(self):
+        if self.stopping:
+            return job_manager.NoJobAvailable
+        return Test_job_source.get_job(self)
+
+    def cancel_job(self, job):
+        if self.stopping:
+            self.cancelled.append(job.thing.code)
+        return self.stopping
+
+    def poll(self):
+        self.polls += 1
+        if self.polls == 3:
+            self.stopping = True
+
+def test_network_job_manager_stop_without_workers(tc):
+    job_manager._initialise_multiprocessing()
+    if job_manager.multiprocessing is None:
+        tc.skipTest("multiprocessing not available")
+    jm = job_manager.Network_job_manager(('127.0.0.1', 0), "testkey")
+    jm.idle_poll_interval = 0.05
+    jm.poll_interval = 0.05
+    jm.start_workers()
+    tc.addCleanup(jm.finish)
+    job_source = Stoppable_job_source(
+        [Test_job(Shared_thing(code, "payload")) for code in "ab"])
+    thread = threading.Thread(target=jm.run_jobs, args=(job_source,))
+    thread.setDaemon(True)
+    thread.start()
+    thread.join(5)
+    tc.assertFalse(thread.isAlive(), "run_jobs didn't return")
+    # Only one job was taken while there were no workers, and it was
+    # abandoned when the job source stopped.
+    tc.assertListEqual(job_source.cancelled, ['a'])
+    tc.assertEqual(len(job_source.jobs), 1)
+    tc.assertListEqual(job_source.responses, [])
+    tc.assertListEqual(job_source.errors, [])
+
+def test_parse_network_address(tc):
+    parse = job_manager.parse_network_address
+    tc.assertEqual(parse("localhost:9000"), ("localhost", 9000))
+    tc.assertEqual(parse(":9000"), ("", 9000))
+    tc.assertRaisesRegexp(ValueError, "no port specified", parse, "localhost")
+    tc.assertRaisesRegexp(ValueError, "bad port number: x", parse, "host:x")
+    tc.assertRaisesRegexp(ValueError, "bad port number: 70000",
+                          parse, "host:70000")
@@ -0,0 +1,106 @@
+"""Tests for openings.py"""
+
+from __future__ import with_statement
+
+import os
+from textwrap import dedent
+
+from gomill import openings
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def test_check_opening(tc):
+    openings.check_opening([], 9)
+    openings.check_opening([('b', (2, 2)), ('w', None), ('b', (3, 3))], 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^move 2: w is next to play$",
+        openings.check_opening, [('b', (2, 2)), ('b', (3, 3))], 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^move 2: attempted move to occupied point C3$",
+        openings.check_opening, [('b', (2, 2)), ('w', (2, 2))], 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^opening ends the game$",
+        openings.check_opening, [('b', None), ('w', None)], 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^move 3: game is over$",
+        openings.check_opening, [('b', None), ('w', None), ('b', None)], 9)
+
+def test_parse_move_sequences(tc):
+    s = dedent("""\
+    # comment
+    D4 F6 pass   # trailing comment
+
+    c3
+    """)
+    tc.assertListEqual(openings.parse_move_sequences(s, 9), [
+        [('b', (3, 3)), ('w', (5, 5)), ('b', None)],
+        [('b', (2, 2))],
+        ])
+    tc.assertListEqual(openings.parse_move_sequences("", 9), [])
+    tc.assertRaisesRegexp(
+        ValueError, "^line 2: invalid vertex: 'i9'$",
+        openings.parse_move_sequences, "D4\nD5 I9\n", 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^line 1: vertex is off board: 'k10'$",
+        openings.parse_move_sequences, "K10\n", 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^line 1: move 2: attempted move to occupied point D4$",
+        openings.parse_move_sequences, "D4 D4\n", 9)
+
+def test_parse_sgf_openings(tc):
+    s = dedent("""\
+    (;SZ[9];B[cg];W[gc])
+    (;SZ[9]C[empty])
+    (;SZ[9];B[ee](;W[dd])(;W[ff]))
+    """)
+    tc.assertListEqual(openings.parse_sgf_openings(s, 9), [
+        [('b', (2, 2)), ('w', (6, 6))],
+        [],
+        [('b', (4, 4)), ('w', (5, 3))],
+        ])
+    tc.assertRaisesRegexp(
+        ValueError, "^game 1: board size is 19$",
+        openings.parse_sgf_openings, "(;SZ[9])(;B[aa])", 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^game 0: setup stones aren't supported$",
+        openings.parse_sgf_openings, "(;SZ[9]AB[aa];W[bb])", 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^game 0: move 2: w is next to play$",
+        openings.parse_sgf_openings, "(;SZ[9];B[aa];B[bb])", 9)
+    tc.assertRaisesRegexp(
+        ValueError, "^no SGF data found$",
+        openings.parse_sgf_openings, "", 9)
+
+def test_read_openings(tc):
+    sgf_pathname = os.path.join(tc.sandbox(), "openings.sgf")
+    with open(sgf_pathname, "w") as f:
+        f.write("\n (;SZ[9];B[cg])(;SZ[9];B[gc])\n")
+    seq_pathname = os.path.join(tc.sandbox(), "openings.txt")
+    with open(seq_pathname, "w") as f:
+        f.write("C3 G7\n")
+    empty_pathname = os.path.join(tc.sandbox(), "empty.txt")
+    with open(empty_pathname, "w") as f:
+        f.write("# nothing here\n")
+    tc.assertListEqual(openings.read_openings(sgf_pathname, 9),
+                       [[('b', (2, 2))], [('b', (6, 6))]])
+    tc.assertListEqual(openings.read_openings(seq_pathname, 9),
+                       [[('b', (2, 2)), ('w', (6, 6))]])
+    tc.assertRaisesRegexp(ValueError, "^no openings found$",
+                          openings.read_openings, empty_pathname, 9)
+    tc.assertRaises(EnvironmentError, openings.read_openings,
+                    os.path.join(tc.sandbox(), "nonexistent"), 9)
+
+def test_get_openings(tc):
+    pathname = os.path.join(tc.sandbox(), "openings.txt")
+    with open(pathname, "w") as f:
+        f.write("C3 G7\n")
+    tc.addCleanup(openings._openings_cache.clear)
+    result = openings.get_openings(pathname, 9)
+    tc.assertListEqual(result, [[('b', (2, 2)), ('w', (6, 6))]])
+    os.remove(pathname)
+    tc.assertIs(openings.get_openings(pathname, 9), result)
+    tc.assertRaises(EnvironmentError, openings.get_openings, pathname, 13)
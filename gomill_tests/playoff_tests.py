@@ -4,8 +4,10 @@ from __future__ import with_statement
 
 from textwrap import dedent
 import cPickle as pickle
+import os
 
 from gomill import competitions
+from gomill import openings
 from gomill import playoffs
 from gomill.gtp_controller import Engine_description
 from gomill.gtp_games import Game_result
@@ -283,6 +285,7 @@ def test_play(tc):
         't2' : Engine_description("t1 engine", None,
                                   't2 engine\ntest \xc2\xa3description'),
         }
+    response1.move_hash = None
     response1.game_data = job1.game_data
     fx.comp.process_game_result(response1)
 
@@ -347,6 +350,92 @@ def test_play_many(tc):
     tc.assertEqual(ms.wins_1, 2)
     tc.assertEqual(ms.wins_b, 2)
 
+def test_duplicate_games(tc):
+    config = default_config()
+    config['matchups'][0] = Matchup_config(
+        't1', 't2', alternating=True, max_duplicate_rate=0.3)
+    fx = Playoff_fixture(tc, config)
+    jobs = [fx.comp.get_game() for _ in range(12)]
+    for i in range(9):
+        fx.comp.process_game_result(
+            fake_response(jobs[i], 'b', move_hash="h%d" % (i % 6)))
+    tc.assertEqual(fx.comp.duplicate_counts['0'], 3)
+    tc.assertEqual(fx.comp.halted_matchups, {})
+    fx.comp.process_game_result(fake_response(jobs[9], 'b', move_hash="h0"))
+    # 4/10 duplicates: halted with games in progress allowed to finish
+    tc.assertEqual(fx.comp.halted_matchups, {'0' : 12})
+    tc.assertIs(fx.comp.get_game(), NoGameAvailable)
+    fx.check_screen_report(dedent("""\
+    t1 v t2 (10 games)
+    board size: 13   komi: 7.5
+         wins              black          white
+    t1      5 50.00%       5  100.00%     0 0.00%
+    t2      5 50.00%       5  100.00%     0 0.00%
+                           10 100.00%     0 0.00%
+    matchup halted after 12 games: too many duplicate games
+    """))
+    tc.assertIn("\n\nt1 v t2: 4/10 duplicate games 40.00%\n\n",
+                competition_test_support.get_short_report(fx.comp))
+    comp2 = competition_test_support.check_round_trip(tc, fx.comp, config)
+    tc.assertEqual(comp2.duplicate_counts['0'], 4)
+    tc.assertEqual(comp2.halted_matchups, {'0' : 12})
+    tc.assertListEqual([comp2.get_game().game_id for _ in range(2)],
+                       ['0_10', '0_11'])
+    tc.assertIs(comp2.get_game(), NoGameAvailable)
+
+def test_bad_max_duplicate_rate(tc):
+    comp = playoffs.Playoff('test')
+    config = default_config()
+    config['matchups'].append(
+        Matchup_config('t1', 't2', max_duplicate_rate=1.5))
+    with tc.assertRaises(ControlFileError) as ar:
+        comp.initialise_from_control_file(config)
+    tc.assertMultiLineEqual(str(ar.exception), dedent("""\
+    matchup 1: max_duplicate_rate out of range"""))
+
+def test_openings(tc):
+    with open(os.path.join(tc.sandbox(), "openings.txt"), "w") as f:
+        f.write("C3\nD4 E5\n")
+    tc.addCleanup(openings._openings_cache.clear)
+    config = default_config()
+    config['matchups'][0] = Matchup_config(
+        't1', 't2', alternating=True, openings="openings.txt")
+    comp = playoffs.Playoff('testcomp')
+    comp.set_base_directory(tc.sandbox())
+    comp.initialise_from_control_file(config)
+    comp.set_clean_status()
+    jobs = [comp.get_game() for _ in range(5)]
+    tc.assertListEqual(
+        [(job.player_b.code, job.opening, job.sgf_note) for job in jobs],
+        [('t1', [('b', (2, 2))], "Opening 0"),
+         ('t2', [('b', (2, 2))], "Opening 0"),
+         ('t1', [('b', (3, 3)), ('w', (4, 4))], "Opening 1"),
+         ('t2', [('b', (3, 3)), ('w', (4, 4))], "Opening 1"),
+         ('t1', [('b', (2, 2))], "Opening 0")])
+
+def test_bad_openings_config(tc):
+    def check(expected_message, **kwargs):
+        comp = playoffs.Playoff('testcomp')
+        comp.set_base_directory(tc.sandbox())
+        config = default_config()
+        config['matchups'][0] = Matchup_config('t1', 't2', **kwargs)
+        with tc.assertRaises(ControlFileError) as ar:
+            comp.initialise_from_control_file(config)
+        tc.assertTrue(str(ar.exception).startswith(expected_message),
+                      str(ar.exception))
+    with open(os.path.join(tc.sandbox(), "bad.txt"), "w") as f:
+        f.write("C3 C3\n")
+    tc.addCleanup(openings._openings_cache.clear)
+    check("matchup 0: openings requires alternating",
+          openings="bad.txt")
+    check("matchup 0: openings can't be used with handicap",
+          alternating=True, handicap=2, openings="bad.txt")
+    check("matchup 0: openings: line 1: "
+          "move 2: attempted move to occupied point C3",
+          alternating=True, openings="bad.txt")
+    check("matchup 0: openings: [Errno 2] No such file or directory",
+          alternating=True, openings="missing.txt")
+
 def test_jigo_reporting(tc):
     fx = Playoff_fixture(tc)
 
@@ -0,0 +1,61 @@
+"""Tests for ringmaster_control.py"""
+
+import os
+import threading
+import time
+
+from gomill import ringmaster_control
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def send_commands(tc, server, commands):
+    """Send commands to a Control_server from another thread.
+
+    Returns a list of replies.
+
+    """
+    replies = []
+    def client():
+        for command in commands:
+            replies.append(ringmaster_control.send_command(
+                server.pathname, command, timeout=5.0))
+    thread = threading.Thread(target=client)
+    thread.start()
+    deadline = time.time() + 5.0
+    while thread.isAlive() and time.time() < deadline:
+        server.check()
+        time.sleep(0.001)
+    thread.join()
+    tc.assertEqual(len(replies), len(commands))
+    return replies
+
+def test_control_server(tc):
+    if not ringmaster_control.is_supported():
+        tc.skipTest("unix-domain sockets not available")
+    received = []
+    def handler(args):
+        received.append(args)
+        if args[0] == "bad":
+            raise ValueError("bad command")
+        return "reply to %s\n" % args[0]
+    pathname = os.path.join(tc.sandbox(), "test.sock")
+    # A stale socket file is replaced
+    open(pathname, "w").close()
+    server = ringmaster_control.Control_server(pathname, handler)
+    server.open()
+    try:
+        tc.assertEqual(server.check(), 0)
+        replies = send_commands(
+            tc, server, [["status"], ["limit", "xx", "3"], ["bad"]])
+    finally:
+        server.close()
+    tc.assertEqual(received, [["status"], ["limit", "xx", "3"], ["bad"]])
+    tc.assertEqual(replies,
+                   ["reply to status", "reply to limit", "error: bad command"])
+    tc.assertFalse(os.path.exists(pathname))
+    with tc.assertRaises(EnvironmentError):
+        ringmaster_control.send_command(pathname, ["status"])
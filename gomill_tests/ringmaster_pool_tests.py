@@ -0,0 +1,88 @@
+"""Tests for ringmaster_pools.py"""
+
+from gomill.ringmaster_pools import Ringmaster_pool
+
+from gomill_tests import gomill_test_support
+from gomill_tests.ringmaster_tests import Ringmaster_fixture, playoff_ctl
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def make_pool(tc, *extra_lines_list):
+    """Make a pool of playoff ringmasters with clean status.
+
+    Returns a pair (pool, list of Ringmaster_fixtures).
+
+    """
+    fixtures = [Ringmaster_fixture(tc, playoff_ctl, extra_lines)
+                for extra_lines in extra_lines_list]
+    for fx in fixtures:
+        fx.ringmaster.set_clean_status()
+    pool = Ringmaster_pool([fx.ringmaster for fx in fixtures])
+    return pool, fixtures
+
+def test_weighted_scheduling(tc):
+    pool, fixtures = make_pool(tc, ["pool_weight = 2"], [])
+    for fx in fixtures:
+        fx.ringmaster._start_run(None)
+    pool._initialise_terminal_reader()
+    jobs = [pool.get_job() for _ in range(6)]
+    tc.assertEqual([job.index for job in jobs], [0, 1, 0, 0, 1, 0])
+    tc.assertEqual([job.job.game_id for job in jobs],
+                   ['0_000', '0_000', '0_001', '0_002', '0_001', '0_003'])
+    tc.assertEqual(sorted(fixtures[1].ringmaster.games_in_progress),
+                   ['0_000', '0_001'])
+
+def test_weighted_scheduling_unavailable(tc):
+    pool, fixtures = make_pool(tc, ["number_of_games = 1"], [])
+    for fx in fixtures:
+        fx.ringmaster._start_run(None)
+    pool._initialise_terminal_reader()
+    jobs = [pool.get_job() for _ in range(3)]
+    tc.assertEqual([job.index for job in jobs], [0, 1, 1])
+
+def test_pool_worker_count(tc):
+    pool, fixtures = make_pool(tc, [], [])
+    pool.set_parallel_worker_count(2)
+    for fx in fixtures:
+        fx.ringmaster._start_run(None)
+    tc.assertEqual(pool.get_worker_count(), 2)
+    # Only the first competition controls the workers
+    tc.assertRaises(ValueError, fixtures[1].ringmaster._handle_control_command,
+                    ["workers", "3"])
+    fixtures[0].ringmaster._handle_control_command(["workers", "3"])
+    tc.assertEqual(pool.get_worker_count(), 3)
+
+def test_run_pool(tc):
+    pool, fixtures = make_pool(tc, ["number_of_games = 3"],
+                               ["number_of_games = 2"])
+    pool.run()
+    tc.assertMultiLineEqual(
+        fixtures[0].get_history(),
+        "    0_0 p1 beat p2 B+10.5\n"
+        "    0_1 p1 beat p2 B+10.5\n"
+        "    0_2 p1 beat p2 B+10.5\n")
+    tc.assertMultiLineEqual(
+        fixtures[1].get_history(),
+        "    0_0 p1 beat p2 B+10.5\n"
+        "    0_1 p1 beat p2 B+10.5\n")
+    tc.assertIs(fixtures[0].ringmaster.job_stats,
+                fixtures[1].ringmaster.job_stats)
+    tc.assertEqual(fixtures[0].ringmaster.job_stats.jobs_completed, 5)
+    tc.assertMultiLineEqual(
+        fixtures[1].get_log(),
+        "run started at *** with max_games None\n"
+        "starting game 0_0: p1 (b) vs p2 (w)\n"
+        "response from game 0_0\n"
+        "starting game 0_1: p1 (b) vs p2 (w)\n"
+        "response from game 0_1\n"
+        "job manager statistics: ***\n"
+        "run finished at ***\n")
+
+def test_pool_presenters(tc):
+    pool, fixtures = make_pool(tc, [], [])
+    for fx in fixtures:
+        fx.ringmaster._start_run(None)
+        tc.assertEqual(fx.ringmaster.presenter.label, 'test')
+        tc.assertIs(fx.ringmaster.terminal_reader.is_enabled(), False)
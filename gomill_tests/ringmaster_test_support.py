@@ -1,5 +1,6 @@
 """Test support code for testing Ringmasters."""
 
+import errno
 from collections import defaultdict
 from cStringIO import StringIO
 
@@ -54,7 +55,9 @@ class Testing_ringmaster(ringmasters.Ringmaster):
     def __init__(self, control_file_contents):
         self._control_file_contents = control_file_contents
         self._test_status = None
+        self._test_shard_status_files = []
         self._written_status = None
+        self._written_stats = None
         ringmasters.Ringmaster.__init__(self, '/nonexistent/ctl/test.ctl')
         self.set_stdout(StringIO())
 
@@ -83,15 +86,37 @@ class Testing_ringmaster(ringmasters.Ringmaster):
         """
         self._test_status = test_status
 
+    def set_test_shard_status_files(self, shard_status_files):
+        """Specify the values that will be loaded from shard state files.
+
+        shard_status_files -- list of pairs (shard, fake state file contents)
+
+        """
+        self._test_shard_status_files = shard_status_files
+
     def _load_status(self):
         return self._test_status
 
+    def _read_shard_status_files(self):
+        return self._test_shard_status_files
+
     def status_file_exists(self):
         return (self._test_status is not None)
 
     def _write_status(self, value):
         self._written_status = value
 
+    def _write_stats_file(self, s):
+        self._written_stats = s
+
+    def _read_stats_file(self):
+        if self._written_stats is None:
+            raise IOError(errno.ENOENT, "No such file or directory")
+        return self._written_stats
+
+    def _open_control_socket(self):
+        pass
+
     def retrieve_printed_output(self):
         return self.stdout.getvalue()
 
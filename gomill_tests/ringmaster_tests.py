@@ -10,6 +10,8 @@ from gomill_tests import ringmaster_test_support
 from gomill_tests import gtp_engine_fixtures
 from gomill_tests.playoff_tests import fake_response
 
+from gomill import cpu_affinity
+from gomill import job_manager
 from gomill.ringmasters import RingmasterError
 
 def make_tests(suite):
@@ -71,10 +73,16 @@ class Ringmaster_fixture(object):
         return self.ringmaster.get_job()
 
     def get_log(self):
-        """Retrieve the log file contents with timestamps scrubbed out."""
+        """Retrieve the log file contents with timestamps scrubbed out.
+
+        Job manager statistics are also scrubbed out.
+
+        """
         s = self.ringmaster.logfile.getvalue()
         s = re.sub(r"(?<= at )([0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2})",
                    "***", s)
+        s = re.sub(r"(?m)^job manager statistics:\n(  .*\n)*",
+                   "job manager statistics: ***\n", s)
         return s
 
     def get_history(self):
@@ -212,8 +220,14 @@ def test_settings(tc):
         "handicap_style = 'free'",
         "record_games = True",
         "scorer = 'players'",
+        "game_timeout = 600",
+        "max_jobs_per_worker = 100",
+        "max_worker_rss = 500",
         ])
     fx.ringmaster.enable_gtp_logging()
+    tc.assertEqual(fx.ringmaster.game_timeout, 600.0)
+    tc.assertEqual(fx.ringmaster.max_jobs_per_worker, 100)
+    tc.assertEqual(fx.ringmaster._get_max_worker_rss_bytes(), 500 * 1024**2)
     job = fx.get_job()
     tc.assertEqual(job.game_id, "0_000")
     tc.assertEqual(job.handicap, 9)
@@ -229,6 +243,49 @@ def test_settings(tc):
     tc.assertEqual(fx.ringmaster.get_sgf_pathname("0_000"),
                    "/nonexistent/ctl/test.games/0_000.sgf")
 
+def test_cpu_affinity(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl, [
+        "cpu_affinity = [[0, 1], [2, 3]]",
+        ])
+    fx.ringmaster.set_parallel_worker_count(2)
+    fx.initialise_clean()
+    if not cpu_affinity.is_supported():
+        tc.assertRaisesRegexp(RingmasterError, "isn't supported",
+                              fx.ringmaster._set_cpu_affinity_map)
+        return
+    fx.ringmaster._set_cpu_affinity_map()
+    tc.assertEqual(fx.get_log(),
+                   "slot 0 uses cpus 0,1\n"
+                   "slot 1 uses cpus 2,3\n")
+    tc.assertEqual(fx.ringmaster.get_job().cpu_affinity_map,
+                   [[0, 1], [2, 3]])
+
+    fx = Ringmaster_fixture(tc, playoff_ctl, ["cpu_affinity = 'auto'"])
+    fx.ringmaster.set_parallel_worker_count(2)
+    fx.initialise_clean()
+    fx.ringmaster._set_cpu_affinity_map()
+    tc.assertEqual(len(fx.ringmaster.cpu_affinity_map), 2)
+
+    fx = Ringmaster_fixture(tc, playoff_ctl, ["cpu_affinity = 'auto'"])
+    fx.ringmaster.set_parallel_worker_count(2)
+    fx.ringmaster.set_workers_mode('threads')
+    fx.initialise_clean()
+    tc.assertRaisesRegexp(
+        RingmasterError,
+        "cpu_affinity can't be used with --workers-mode=threads",
+        fx.ringmaster._set_cpu_affinity_map)
+
+    # Not used without parallel workers
+    fx = Ringmaster_fixture(tc, playoff_ctl, ["cpu_affinity = 'auto'"])
+    fx.initialise_clean()
+    fx.ringmaster._set_cpu_affinity_map()
+    tc.assertIsNone(fx.ringmaster.get_job().cpu_affinity_map)
+
+def test_bad_cpu_affinity(tc):
+    tc.assertRaisesRegexp(
+        RingmasterError, "'cpu_affinity': slot 1: no cpus listed",
+        Ringmaster_fixture, tc, playoff_ctl, ["cpu_affinity = [[0], []]"])
+
 def test_stderr_settings(tc):
     fx = Ringmaster_fixture(tc, playoff_ctl, [
         "players['p2'] = Player('testb', discard_stderr=True)",
@@ -319,6 +376,7 @@ def test_run(tc):
         "starting game 0_002: p1 (b) vs p2 (w)\n"
         "response from game 0_002\n"
         "halting competition: max-games reached for this run\n"
+        "job manager statistics: ***\n"
         "run finished at ***\n"
         )
     tc.assertMultiLineEqual(
@@ -327,6 +385,248 @@ def test_run(tc):
         "  0_001 p1 beat p2 B+10.5\n"
         "  0_002 p1 beat p2 B+10.5\n")
 
+def test_run_sgf_collection(tc):
+    extra_lines = [
+        "record_games = True",
+        "sgf_collection_size = 2",
+        ]
+    job = Ringmaster_fixture(tc, playoff_ctl, extra_lines).get_job()
+    tc.assertIsNone(job.sgf_dirname)
+    tc.assertIs(job.return_sgf, True)
+    tc.assertEqual(job.sgf_filename, '0_000.sgf')
+
+    fx = Ringmaster_fixture(tc, playoff_ctl, extra_lines)
+    stem = os.path.join(tc.sandbox(), "test")
+    fx.ringmaster._set_pathnames(stem)
+    sgf_dir = stem + ".games"
+    os.mkdir(sgf_dir)
+    fx.initialise_clean()
+    fx.ringmaster.run(max_games=3)
+    tc.assertListEqual(sorted(os.listdir(sgf_dir)),
+                       ['collection_0_000.sgf', 'collection_0_002.sgf',
+                        'index'])
+    tc.assertIsNone(fx.ringmaster.get_sgf_location('0_003'))
+    tc.assertRaisesRegexp(RingmasterError, "no game record for game 0_003",
+                          fx.ringmaster.load_sgf_game, '0_003')
+    pathname, offset = fx.ringmaster.get_sgf_location('0_001')
+    tc.assertEqual(pathname, os.path.join(sgf_dir, 'collection_0_000.sgf'))
+    tc.assertNotEqual(offset, 0)
+    tc.assertEqual(fx.ringmaster.load_sgf_game('0_001').get_root().get('GN'),
+                   'test 0_001')
+
+    # A fresh Ringmaster finds the games using the index
+    fx2 = Ringmaster_fixture(tc, playoff_ctl)
+    fx2.ringmaster._set_pathnames(stem)
+    tc.assertEqual(fx2.ringmaster.get_sgf_location('0_001'),
+                   (pathname, offset))
+    tc.assertEqual(fx2.ringmaster.load_sgf_game('0_002').get_root().get('GN'),
+                   'test 0_002')
+    with open(os.path.join(sgf_dir, '0_005.sgf'), "w") as f:
+        f.write("(;GN[test 0_005])")
+    tc.assertEqual(fx2.ringmaster.get_sgf_location('0_005'),
+                   (os.path.join(sgf_dir, '0_005.sgf'), 0))
+
+def test_cancel_prefetched_job(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    job1 = rm.get_job()
+    job2 = rm.get_job()
+    tc.assertIs(rm.cancel_job(job2), False)
+    rm._halt_competition("stop command received")
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailable)
+    tc.assertIs(rm.cancel_job(job2), True)
+    tc.assertEqual(sorted(rm.games_in_progress), ['0_000'])
+    tc.assertMultiLineEqual(
+        fx.get_log(),
+        "starting game 0_000: p1 (b) vs p2 (w)\n"
+        "starting game 0_001: p1 (b) vs p2 (w)\n"
+        "halting competition: stop command received\n"
+        "abandoning game 0_001 before it started\n")
+
+def test_cancel_prefetched_job_max_games(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    rm.max_games_this_run = 2
+    job1 = rm.get_job()
+    job2 = rm.get_job()
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailable)
+    tc.assertTrue(rm.stopping)
+    # Prefetched games count towards max-games, so they aren't abandoned
+    tc.assertIs(rm.cancel_job(job2), False)
+    tc.assertEqual(sorted(rm.games_in_progress), ['0_000', '0_001'])
+
+def test_poll_stop_command_file(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    rm.command_pathname = os.path.join(tc.sandbox(), "test.cmd")
+    job1 = rm.get_job()
+    rm.poll()
+    tc.assertIs(rm.stopping, False)
+    f = open(rm.command_pathname, "w")
+    f.write("stop")
+    f.close()
+    # poll() notices the .cmd file even if get_job() isn't being called
+    rm.poll()
+    tc.assertIs(rm.stopping, True)
+    tc.assertFalse(os.path.exists(rm.command_pathname))
+    tc.assertIs(rm.cancel_job(job1), True)
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailable)
+    tc.assertEqual(rm.games_in_progress, {})
+
+def test_control_pause(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    tc.assertEqual(rm._handle_control_command(["pause"]), "ok")
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailableYet)
+    tc.assertEqual(rm._describe_state().split("\n")[:2],
+                   ["paused", "games in progress: none"])
+    tc.assertEqual(rm._handle_control_command(["resume"]), "ok")
+    job = rm.get_job()
+    tc.assertEqual(job.game_id, '0_000')
+    tc.assertEqual(rm._describe_state().split("\n")[:2],
+                   ["running", "games in progress: 0_000"])
+    tc.assertMultiLineEqual(
+        fx.get_log(),
+        "pausing: no new games will be started\n"
+        "resuming\n"
+        "starting game 0_000: p1 (b) vs p2 (w)\n")
+
+def test_control_workers(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    tc.assertRaisesRegexp(
+        ValueError, "^workers: not running parallel games$",
+        rm._handle_control_command, ["workers", "2"])
+    rm.set_parallel_worker_count(3)
+    tc.assertEqual(rm.get_worker_count(), 3)
+    tc.assertRaisesRegexp(
+        ValueError, "^workers: invalid count: 0$",
+        rm._handle_control_command, ["workers", "0"])
+    tc.assertRaisesRegexp(
+        ValueError, "^workers: expected 1 arguments$",
+        rm._handle_control_command, ["workers"])
+    tc.assertRaisesRegexp(
+        ValueError, "^workers: at most 1023 workers allowed$",
+        rm._handle_control_command, ["workers", "1024"])
+    # The job manager starts or dismisses workers to match
+    tc.assertEqual(rm._handle_control_command(["workers", "8"]), "ok")
+    tc.assertEqual(rm.get_worker_count(), 8)
+    tc.assertEqual(rm._handle_control_command(["workers", "1"]), "ok")
+    tc.assertEqual(rm.get_worker_count(), 1)
+    tc.assertIn("workers: 1\n", rm._describe_state())
+    tc.assertIsNone(rm.simultaneous_game_limit)
+    tc.assertIn("setting number of workers to 8\n", fx.get_log())
+
+    # With cpu_affinity, the ceiling is the number of slots
+    rm.cpu_affinity_map = [[0], [1], [2], [3]]
+    tc.assertRaisesRegexp(
+        ValueError, "^workers: at most 4 workers allowed$",
+        rm._handle_control_command, ["workers", "5"])
+    tc.assertEqual(rm._handle_control_command(["workers", "4"]), "ok")
+
+    # A competition other than the first in a pool can't change the workers
+    rm.disable_worker_control()
+    tc.assertRaisesRegexp(
+        ValueError, "^workers: the pool's first competition controls",
+        rm._handle_control_command, ["workers", "2"])
+
+def test_control_workers_network(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    rm.set_listen_address(('127.0.0.1', 0), "key")
+    tc.assertIsNone(rm.get_worker_count())
+    # Network workers aren't under the ringmaster's control, so this limits
+    # the number of games instead.
+    tc.assertEqual(rm._handle_control_command(["workers", "2"]), "ok")
+    job1 = rm.get_job()
+    job2 = rm.get_job()
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailableYet)
+    tc.assertIn("simultaneous game limit: 2\n", rm._describe_state())
+
+def test_control_limit(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    tc.assertRaisesRegexp(
+        ValueError, "^limit: unknown matchup: xx$",
+        rm._handle_control_command, ["limit", "xx", "2"])
+    tc.assertEqual(rm._handle_control_command(["limit", "0", "2"]), "ok")
+    rm.get_job()
+    rm.get_job()
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailable)
+    tc.assertIn("game limit for matchup 0 set to 2 for this run\n",
+                fx.get_log())
+
+    # A limit of 0 stops a matchup
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    tc.assertRaisesRegexp(
+        ValueError, "^limit: invalid count: -1$",
+        rm._handle_control_command, ["limit", "0", "-1"])
+    tc.assertEqual(rm._handle_control_command(["limit", "0", "0"]), "ok")
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailable)
+
+    fx = Ringmaster_fixture(tc, allplayall_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    tc.assertRaisesRegexp(
+        ValueError, "^limit: not supported for all-play-all tournaments",
+        rm._handle_control_command, ["limit", "AvB", "2"])
+    tc.assertEqual(rm.competition.matchups['AvB'].number_of_games, 8)
+    tc.assertEqual(rm.competition.count_games_expected(), 8)
+
+def test_control_stop(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    rm = fx.ringmaster
+    tc.assertEqual(rm._handle_control_command(["stop"]), "ok")
+    tc.assertIs(rm.get_job(), job_manager.NoJobAvailable)
+    tc.assertEqual(rm._describe_state().split("\n")[0],
+                   "stopping: stop command received")
+    tc.assertRaisesRegexp(
+        ValueError, "^unknown command: xyzzy$",
+        rm._handle_control_command, ["xyzzy"])
+
+def test_run_stats(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    tc.assertRaisesRegexp(RingmasterError, "^no stats file$",
+                          fx.ringmaster.print_stats)
+    fx.ringmaster.stats_interval = 0
+    fx.ringmaster.run(max_games=2)
+    tc.assertEqual(fx.get_log().count("job manager statistics: ***\n"), 3)
+    fx.ringmaster.print_stats()
+    lines = fx.ringmaster.retrieve_printed_output().split("\n")
+    tc.assertEqual(lines[1][:17], "jobs completed: 2")
+    tc.assertEqual([line.split(":")[0] for line in lines[3:-1]], [
+        'get_job', 'process_response', 'update_display', 'write_status',
+        'in-process worker'])
+
+def test_run_threaded(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    fx.initialise_clean()
+    fx.ringmaster.set_parallel_worker_count(2)
+    fx.ringmaster.set_workers_mode('threads')
+    fx.ringmaster.run(max_games=3)
+    tc.assertListEqual(
+        fx.messages('warnings'),
+        [])
+    tc.assertListEqual(
+        fx.messages('screen_report'),
+        ["p1 v p2 (3/400 games)\n"
+         "board size: 9   komi: 7.5\n"
+         "     wins                   avg cpu\n"
+         "p1      3 100.00%   (black)  546.20\n"
+         "p2      0   0.00%   (white)  567.20"])
+    tc.assertIn("using 2 worker threads\n", fx.get_log())
+
 def test_run_allplayall(tc):
     fx = Ringmaster_fixture(tc, allplayall_ctl)
     fx.initialise_clean()
@@ -352,6 +652,7 @@ def test_run_allplayall(tc):
         "starting game AvB_2: p1 (b) vs p2 (w)\n"
         "response from game AvB_2\n"
         "halting competition: max-games reached for this run\n"
+        "job manager statistics: ***\n"
         "run finished at ***\n"
         )
     tc.assertMultiLineEqual(
@@ -394,6 +695,7 @@ def test_run_fail(tc):
         "error starting subprocess for player p2:\n"
         "exec forced to fail\n"
         "halting competition: too many void games\n"
+        "job manager statistics: ***\n"
         "run finished at ***\n")
     tc.assertMultiLineEqual(fx.get_history(), "")
 
@@ -420,6 +722,7 @@ def test_run_with_late_errors(tc):
         "error closing player p2:\n"
         "forced failure for close\n"
         "halting competition: max-games reached for this run\n"
+        "job manager statistics: ***\n"
         "run finished at ***\n")
     tc.assertMultiLineEqual(
         fx.get_history(),
@@ -537,3 +840,154 @@ def test_no_cpu_time(tc):
          "     wins\n"
          "p1      3 100.00%   (black)\n"
          "p2      0   0.00%   (white)"])
+
+def test_sharded_run_and_merge(tc):
+    shard_files = []
+    for shard, max_games in [(0, None), (1, 1)]:
+        fx = Ringmaster_fixture(tc, playoff_ctl, ["number_of_games = 5"])
+        fx.ringmaster.set_shard(shard, 2)
+        tc.assertTrue(fx.ringmaster.status_pathname.endswith(
+            "test.shard%d.status" % shard))
+        fx.initialise_clean()
+        fx.ringmaster.run(max_games=max_games)
+        shard_files.append((shard, fx.get_written_state()))
+        if shard == 0:
+            tc.assertMultiLineEqual(
+                fx.get_history(),
+                "    0_0 p1 beat p2 B+10.5\n"
+                "    0_2 p1 beat p2 B+10.5\n"
+                "    0_4 p1 beat p2 B+10.5\n")
+        else:
+            tc.assertMultiLineEqual(
+                fx.get_history(),
+                "    0_1 p1 beat p2 B+10.5\n")
+
+    # A shard refuses an unsharded state file
+    fx = Ringmaster_fixture(tc, playoff_ctl, ["number_of_games = 5"])
+    fx.ringmaster.set_shard(1, 2)
+    fx.ringmaster.set_test_status(shard_files[0][1])
+    tc.assertRaisesRegexp(RingmasterError, "status file is for shard 0 of 2",
+                          fx.ringmaster.load_status)
+
+    fx = Ringmaster_fixture(tc, playoff_ctl, ["number_of_games = 5"])
+    fx.ringmaster.set_test_shard_status_files(shard_files)
+    tc.assertEqual(fx.ringmaster.merge_shards(), 2)
+    status = fx.get_written_state()[1]
+    tc.assertIs(status['shard'], None)
+    results = fx.ringmaster.get_tournament_results()
+    tc.assertListEqual([r.game_id for r in results.get_matchup_results('0')],
+                       ['0_0', '0_1', '0_2', '0_4'])
+
+    # The merged competition plays the game the second shard didn't reach
+    fx2 = Ringmaster_fixture(tc, playoff_ctl, ["number_of_games = 5"])
+    fx2.initialise_with_state(fx.get_written_state())
+    fx2.ringmaster.run()
+    tc.assertMultiLineEqual(
+        fx2.get_history(),
+        "    0_3 p1 beat p2 B+10.5\n")
+
+def run_shards(tc, control_file_contents, extra_lines, max_games=None,
+               shard_count=2):
+    """Run each shard of a competition; return the shard status files."""
+    shard_files = []
+    for shard in range(shard_count):
+        fx = Ringmaster_fixture(tc, control_file_contents, extra_lines)
+        fx.ringmaster.set_shard(shard, shard_count)
+        fx.initialise_clean()
+        fx.ringmaster.run(max_games=max_games)
+        shard_files.append((shard, fx.get_written_state()))
+    return shard_files
+
+def test_merge_shards_game_order(tc):
+    # Without number_of_games, game ids aren't zero-padded
+    extra_lines = ["number_of_games = None"]
+    shard_files = run_shards(tc, playoff_ctl, extra_lines, max_games=6)
+    fx = Ringmaster_fixture(tc, playoff_ctl, extra_lines)
+    fx.ringmaster.set_test_shard_status_files(shard_files)
+    tc.assertEqual(fx.ringmaster.merge_shards(), 2)
+    results = fx.ringmaster.get_tournament_results()
+    tc.assertListEqual([r.game_id for r in results.get_matchup_results('0')],
+                       ["0_%d" % i for i in range(12)])
+
+def test_merge_shards_missing_shard(tc):
+    shard_files = run_shards(tc, playoff_ctl, ["number_of_games = 6"],
+                             shard_count=3)
+    fx = Ringmaster_fixture(tc, playoff_ctl, ["number_of_games = 6"])
+    fx.ringmaster.set_test_shard_status_files(
+        [shard_files[0], shard_files[2]])
+    tc.assertRaisesRegexp(RingmasterError,
+                          "missing status files for shards: 1",
+                          fx.ringmaster.merge_shards)
+
+def test_sharded_allplayall_merge(tc):
+    shard_files = run_shards(tc, allplayall_ctl, [])
+    fx = Ringmaster_fixture(tc, allplayall_ctl)
+    fx.ringmaster.set_test_shard_status_files(shard_files)
+    tc.assertEqual(fx.ringmaster.merge_shards(), 2)
+    status = fx.get_written_state()[1]
+    tc.assertEqual(status['comp']['competitors'], ['p1', 'p2'])
+    results = fx.ringmaster.get_tournament_results()
+    tc.assertListEqual(
+        [r.game_id for r in results.get_matchup_results('AvB')],
+        ["AvB_%d" % i for i in range(8)])
+
+    # Shards run with different competitors can't be merged
+    fx2 = Ringmaster_fixture(tc, allplayall_ctl, [
+        "players['p3'] = Player('testw')",
+        "competitors = ['p1', 'p2', 'p3']",
+        ])
+    fx2.ringmaster.set_shard(1, 2)
+    fx2.initialise_clean()
+    fx2.ringmaster.run(max_games=1)
+    fx3 = Ringmaster_fixture(tc, allplayall_ctl)
+    fx3.ringmaster.set_test_shard_status_files(
+        [shard_files[0], (1, fx2.get_written_state())])
+    tc.assertRaisesRegexp(RingmasterError,
+                          "shards disagree about the competitors",
+                          fx3.ringmaster.merge_shards)
+
+def test_merge_sgf_collections(tc):
+    sandbox = tc.sandbox()
+    extra_lines = [
+        "number_of_games = 4",
+        "record_games = True",
+        "sgf_collection_size = 10",
+        ]
+    def make_fixture():
+        fx = Ringmaster_fixture(tc, playoff_ctl, extra_lines)
+        fx.ringmaster.base_directory = sandbox
+        fx.ringmaster._set_pathnames(os.path.join(sandbox, "test"))
+        return fx
+    shard_files = []
+    for shard in (0, 1):
+        fx = make_fixture()
+        fx.ringmaster.set_shard(shard, 2)
+        os.mkdir(fx.ringmaster.sgf_dir_pathname)
+        fx.initialise_clean()
+        fx.ringmaster.run()
+        shard_files.append((shard, fx.get_written_state()))
+    fx = make_fixture()
+    fx.ringmaster.set_test_shard_status_files(shard_files)
+    tc.assertEqual(fx.ringmaster.merge_shards(), 2)
+    sgf_dir = os.path.join(sandbox, "test.games")
+    tc.assertListEqual(sorted(os.listdir(sgf_dir)),
+                       ['collection_0_0.sgf', 'collection_0_1.sgf', 'index'])
+    with open(os.path.join(sgf_dir, "index")) as f:
+        tc.assertEqual([line.split("\t")[:2] for line in f],
+                       [['0_0', 'collection_0_0.sgf'],
+                        ['0_2', 'collection_0_0.sgf'],
+                        ['0_1', 'collection_0_1.sgf'],
+                        ['0_3', 'collection_0_1.sgf']])
+    tc.assertEqual(fx.ringmaster.load_sgf_game('0_3').get_root().get('GN'),
+                   'test 0_3')
+
+def test_shard_unsupported(tc):
+    fx = Ringmaster_fixture(tc, mcts_ctl)
+    tc.assertRaisesRegexp(RingmasterError,
+                          "competition type doesn't support sharding",
+                          fx.ringmaster.set_shard, 0, 2)
+    fx = Ringmaster_fixture(tc, playoff_ctl)
+    tc.assertRaisesRegexp(RingmasterError, "shard number out of range",
+                          fx.ringmaster.set_shard, 2, 2)
+    tc.assertRaisesRegexp(RingmasterError, "no shard status files found",
+                          fx.ringmaster.merge_shards)
@@ -12,12 +12,17 @@ test_modules = [
     'sgf_properties_tests',
     'sgf_tests',
     'sgf_moves_tests',
+    'sgf_index_tests',
+    'sgf_position_index_tests',
+    'openings_tests',
     'gameplay_tests',
     'gtp_engine_tests',
     'gtp_state_tests',
     'gtp_controller_tests',
     'gtp_proxy_tests',
     'gtp_game_tests',
+    'job_manager_tests',
+    'cpu_affinity_tests',
     'game_job_tests',
     'setting_tests',
     'competition_scheduler_tests',
@@ -27,6 +32,8 @@ test_modules = [
     'mcts_tuner_tests',
     'cem_tuner_tests',
     'ringmaster_tests',
+    'ringmaster_pool_tests',
+    'ringmaster_control_tests',
     ]
 
 def get_test_module(name):
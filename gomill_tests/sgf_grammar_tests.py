@@ -2,6 +2,8 @@
 
 from __future__ import with_statement
 
+from cStringIO import StringIO
+
 from gomill_tests import gomill_test_support
 
 from gomill import sgf_grammar
@@ -247,6 +249,15 @@ def test_parser_properties(tc):
     tc.assertEqual(props("(;XX[1]YY[2]XX[3]YY[4])"),
                    [{'XX': ['1', '3'], 'YY' : ['2', '4']}])
 
+    # Variants of the common move-node shape
+    tc.assertEqual(props("(;B[pd];W [qq] ;B[];W[dp]C[x]B[aa];B[ab] [cd])"),
+                   [{'B': ['pd']}, {'W': ['qq']}, {'B': ['']},
+                    {'W': ['dp'], 'C': ['x'], 'B': ['aa']},
+                    {'B': ['ab', 'cd']}])
+    tc.assertEqual(props("(;Black[pd];BL[10];B[pd\\]];B[TT])"),
+                   [{'B': ['pd']}, {'BL': ['10']}, {'B': ['pd\\]']},
+                    {'B': ['TT']}])
+
 def test_parse_sgf_collection(tc):
     parse_sgf_collection = sgf_grammar.parse_sgf_collection
 
@@ -283,6 +294,35 @@ def test_parse_sgf_collection(tc):
                    "error parsing game 1: unexpected end of SGF data")
 
 
+def test_iter_sgf_collection(tc):
+    def iterate(s, chunk_size):
+        return [(offset, [sorted(node) for node in game.sequence])
+                for (offset, game) in sgf_grammar.iter_sgf_collection(
+                    StringIO(s), chunk_size)]
+
+    tc.assertEqual(iterate("", 3), [])
+    tc.assertEqual(iterate("()", 3), [])
+
+    s = "dummy (;X[1];X[2];X[3](;B[bc])) junk (\n;Y[1]\nZZ[a\\]b];Y[2]) (Non"
+    expected = [(6, [['X'], ['X'], ['X']]), (37, [['Y', 'ZZ'], ['Y']])]
+    for chunk_size in (1, 2, 3, 5, 8, 13, 1000):
+        tc.assertEqual(iterate(s, chunk_size), expected)
+
+    s = "(( (;X[1];X[2];X[3](;B[bc])) ();) (;Y[1];Y[2]"
+    for chunk_size in (1, 4, 1000):
+        it = sgf_grammar.iter_sgf_collection(StringIO(s), chunk_size)
+        tc.assertEqual(it.next()[0], 3)
+        with tc.assertRaises(ValueError) as ar:
+            it.next()
+        tc.assertEqual(str(ar.exception),
+                       "error parsing game 1: unexpected end of SGF data")
+
+    # Junk inside a game is reported without reading the rest of the file
+    f = StringIO("(;B[aa]:" + "x" * 1000 + "(;B[aa])")
+    it = sgf_grammar.iter_sgf_collection(f, 4)
+    tc.assertRaisesRegexp(ValueError, "^error parsing game 0: ", it.next)
+    tc.assertTrue(f.tell() < 20)
+
 def test_parse_compose(tc):
     pc = sgf_grammar.parse_compose
     tc.assertEqual(pc("word"), ("word", None))
@@ -377,3 +417,22 @@ def test_serialise_game_tree(tc):
     tc.assertEqual(sgf_grammar.serialise_game_tree(coarse_game, wrap=None),
                    serialised.replace("\n", "")+"\n")
 
+def test_block_format(tc):
+    bf = sgf_grammar.block_format
+    tc.assertEqual(bf([]), "")
+    tc.assertEqual(bf(["ab", "cd", "ef"], 4), "abcd\nef")
+    tc.assertEqual(bf(["ab", "cdefg", "h"], 4), "ab\ncdefg\nh")
+    tc.assertEqual(bf(["a\nb", "c"], 4), "a\nbc")
+
+def test_write_game_tree(tc):
+    serialised = ("(;AB[aa][ab][ac]C[comment \xa3];W[ab];C[];C[]"
+                  "(;B[bc])(;B[bd];W[ca](;B[da])(;B[db];\n"
+                  "W[ea])))\n")
+    coarse_game = sgf_grammar.parse_sgf_game(serialised)
+    for wrap in (79, None, 10, 1):
+        f = StringIO()
+        written = sgf_grammar.write_game_tree(f, coarse_game, wrap)
+        tc.assertEqual(
+            f.getvalue(), sgf_grammar.serialise_game_tree(coarse_game, wrap))
+        tc.assertEqual(written, len(f.getvalue()))
+
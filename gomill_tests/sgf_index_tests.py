@@ -0,0 +1,104 @@
+"""Tests for sgf_index.py"""
+
+from __future__ import with_statement
+
+import os
+
+from gomill import sgf_index
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def write_file(pathname, s):
+    with open(pathname, "wb") as f:
+        f.write(s)
+
+def test_describe_game(tc):
+    pathname = os.path.join(tc.sandbox(), "game.sgf")
+    write_file(pathname,
+               "(;SZ[9]KM[5.5]PB[gnugo]PW[fuego]BR[5k]RE[B+R]EV[test]"
+               ";B[ee];W[ge](;B[dd];W[])(;B[cc]))\n"
+               "(;SZ[13]HA[2]KM[0.5]RE[?]AB[dd][jj];W[cc])")
+    tc.assertEqual(
+        sgf_index.index_file(pathname),
+        (pathname, [
+            (0, 0, 9, 5.5, None, "gnugo", "fuego", "5k", None, "B+R", None,
+             "test", 'b', 4),
+            (87, 1, 13, 0.5, 2, None, None, None, None, "?", None, None,
+             None, 1),
+        ], None))
+
+def test_index_file_errors(tc):
+    pathname = os.path.join(tc.sandbox(), "bad.sgf")
+    write_file(pathname, "(;SZ[9]KM[x];B[ee]) (;SZ[99]) (;SZ[9])")
+    path, records, error = sgf_index.index_file(pathname)
+    tc.assertEqual(len(records), 1)
+    tc.assertIsNone(records[0][3])
+    tc.assertEqual(error, "error parsing game 1: size out of range: 99")
+    missing = os.path.join(tc.sandbox(), "missing.sgf")
+    path, records, error = sgf_index.index_file(missing)
+    tc.assertEqual(records, [])
+    tc.assertTrue(error.startswith("[Errno 2]"))
+
+def test_find_sgf_files(tc):
+    sandbox = tc.sandbox()
+    os.mkdir(os.path.join(sandbox, "sub"))
+    for filename in ("a.sgf", "b.txt", os.path.join("sub", "c.SGF")):
+        write_file(os.path.join(sandbox, filename), "")
+    tc.assertEqual(sgf_index.find_sgf_files([sandbox]),
+                   [os.path.join(sandbox, "a.sgf"),
+                    os.path.join(sandbox, "sub", "c.SGF")])
+    tc.assertEqual(sgf_index.find_sgf_files([os.path.join(sandbox, "b.txt")]),
+                   [os.path.join(sandbox, "b.txt")])
+    with tc.assertRaises(sgf_index.SgfIndexError) as ar:
+        sgf_index.find_sgf_files([os.path.join(sandbox, "nonesuch")])
+    tc.assertTrue(str(ar.exception).startswith("not found: "))
+
+def test_sgf_index(tc):
+    if sgf_index.sqlite3 is None:
+        tc.skipTest("sqlite3 not available")
+    sandbox = tc.sandbox()
+    games_dir = os.path.join(sandbox, "games")
+    os.mkdir(games_dir)
+    path1 = os.path.join(games_dir, "g1.sgf")
+    path2 = os.path.join(games_dir, "g2.sgf")
+    write_file(path1, "(;SZ[9]PB[gnugo]PW[fuego]RE[B+R];B[ee])\n"
+                      "(;SZ[9]PB[fuego]PW[gnugo]RE[B+R];B[ee])")
+    write_file(path2, "(;SZ[19]PB[fuego]PW[gnugo]RE[B+R])")
+    index_pathname = os.path.join(sandbox, "index.db")
+    index = sgf_index.Sgf_index(index_pathname)
+    stats = index.update([games_dir], processes=1)
+    tc.assertEqual((stats.files_indexed, stats.files_unchanged,
+                    stats.files_removed, stats.games_indexed),
+                   (2, 0, 0, 3))
+    tc.assertEqual(index.count_games(), 3)
+    records = index.find_games(size=9, player_w='gnugo', winner='b')
+    tc.assertEqual([(r.path, r.offset, r.game_number, r.player_b)
+                    for r in records],
+                   [(path1, 40, 1, 'fuego')])
+    tc.assertEqual(records[0].read_game().get_player_name('b'), 'fuego')
+    tc.assertEqual(len(index.find_games(player='gnugo')), 3)
+    tc.assertEqual(len(index.find_games(player='gnugo', size=19)), 1)
+    with tc.assertRaises(ValueError):
+        index.find_games(move_count=1)
+    index.close()
+
+    # Reopen; change one file and remove the other
+    index = sgf_index.Sgf_index(index_pathname)
+    stats = index.update([games_dir], processes=1)
+    tc.assertEqual((stats.files_indexed, stats.files_unchanged),
+                   (0, 2))
+    write_file(path1, "(;SZ[9]PB[gnugo]PW[fuego]RE[W+R];B[ee]) (;")
+    os.remove(path2)
+    stats = index.update([games_dir], processes=1)
+    tc.assertEqual((stats.files_indexed, stats.files_unchanged,
+                    stats.files_removed, stats.games_indexed),
+                   (1, 0, 1, 1))
+    tc.assertEqual(len(stats.errors), 1)
+    tc.assertEqual([(r.path, r.winner) for r in index.find_games()],
+                   [(path1, 'w')])
+    tc.assertEqual(index.get_errors(), stats.errors)
+    index.close()
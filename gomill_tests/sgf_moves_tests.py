@@ -139,3 +139,56 @@ def test_indicate_first_player(tc):
     tc.assertEqual(g4.serialise(),
                    "(;FF[4]GM[1]SZ[9];C[no game])\n")
 
+
+def test_extract_game_summary(tc):
+    summary = sgf_moves.extract_game_summary(SAMPLE_SGF)
+    tc.assertEqual(summary.size, 9)
+    tc.assertEqual(summary.komi, 7.5)
+    tc.assertEqual(summary.player_b, "Black engine")
+    tc.assertEqual(summary.player_w, "White engine")
+    tc.assertEqual(summary.result, "W+R")
+    tc.assertEqual(summary.winner, 'w')
+    tc.assertEqual(summary.setup_stones,
+                   (set([(0, 0), (1, 1), (4, 4)]), set([(6, 5), (6, 6)]),
+                    set()))
+    tc.assertEqual(summary.moves,
+                   [('b', (2, 3)), ('w', (3, 4)), ('b', None), ('w', None)])
+
+    summary = sgf_moves.extract_game_summary("(;B[ab](;W[bc];B[cd])(;W[ef]))")
+    tc.assertEqual(summary.size, 19)
+    tc.assertEqual(summary.komi, 0.0)
+    tc.assertIsNone(summary.player_b)
+    tc.assertIsNone(summary.result)
+    tc.assertIsNone(summary.winner)
+    tc.assertEqual(summary.moves,
+                   [('b', (17, 0)), ('w', (16, 1)), ('b', (15, 2))])
+
+    summary = sgf_moves.extract_game_summary(
+        "(;SZ[26]CA[iso-8859-1]PB[\xa3];B[ab];W[tt])")
+    tc.assertEqual(summary.player_b, "\xc2\xa3")
+    tc.assertEqual(summary.moves, [('b', (24, 0)), ('w', (6, 19))])
+
+def test_extract_game_summary_errors(tc):
+    extract = sgf_moves.extract_game_summary
+    tc.assertRaisesRegexp(ValueError, "setup properties after the root node",
+                          extract, "(;SZ[9];B[ab];AW[bc])")
+    tc.assertRaisesRegexp(ValueError, "mixed setup and moves in root node",
+                          extract, "(;SZ[9]AB[aa]B[ab])")
+    tc.assertRaisesRegexp(ValueError, "^bad move: zz$",
+                          extract, "(;SZ[9];B[ab];W[zz])")
+    tc.assertRaisesRegexp(ValueError, "^bad SZ property: 9:9$",
+                          extract, "(;SZ[9:9])")
+    tc.assertRaisesRegexp(ValueError, "^size out of range: 30$",
+                          extract, "(;SZ[30])")
+    tc.assertRaises(ValueError, extract, "(;KM[xyz])")
+
+def test_extract_game_summary_matches_sgf_game(tc):
+    for s in [SAMPLE_SGF, "(;SZ[13]KM[0.5]RE[B+5];B[aa];W[];B[mm])",
+              "(;B[ab];W[bb](;B[cc])(;B[dd]))"]:
+        sgf_game = sgf.Sgf_game.from_string(s)
+        board, moves = sgf_moves.get_setup_and_moves(sgf_game)
+        summary = sgf_moves.extract_game_summary(s)
+        tc.assertEqual(summary.moves, moves)
+        tc.assertEqual(summary.size, sgf_game.get_size())
+        tc.assertEqual(summary.komi, sgf_game.get_komi())
+        tc.assertEqual(summary.winner, sgf_game.get_winner())
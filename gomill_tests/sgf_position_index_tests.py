@@ -0,0 +1,122 @@
+"""Tests for sgf_position_index.py"""
+
+from __future__ import with_statement
+
+import os
+
+from gomill import boards
+from gomill import sgf
+from gomill import sgf_position_index
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def write_file(pathname, s):
+    with open(pathname, "wb") as f:
+        f.write(s)
+
+def make_board(size, black_points, white_points):
+    board = boards.Board(size)
+    board.apply_setup(black_points, white_points, [])
+    return board
+
+def test_hash_position(tc):
+    b1 = make_board(9, [(2, 3), (4, 4)], [(6, 2)])
+    # b1 rotated
+    b2 = make_board(9, [(3, 6), (4, 4)], [(2, 2)])
+    # b1 with colours swapped
+    b3 = make_board(9, [(6, 2)], [(2, 3), (4, 4)])
+    h = sgf_position_index.hash_position
+    tc.assertEqual(h(b1), h(b1.copy()))
+    tc.assertNotEqual(h(b1), h(b2))
+    tc.assertEqual(h(b1, canonical=True), h(b2, canonical=True))
+    tc.assertNotEqual(h(b1, canonical=True), h(b3, canonical=True))
+    tc.assertNotEqual(h(boards.Board(9)), h(boards.Board(13)))
+    tc.assertTrue(0 <= h(b1) < 2**64)
+
+def test_hash_game_positions(tc):
+    # Black captures at move 5; White passes at move 6
+    sgf_game = sgf.Sgf_game.from_string(
+        "(;SZ[5];B[ba];W[aa];B[ee];W[de];B[ab];W[];B[ed];W[dd];B[ae])")
+    positions = sgf_position_index.hash_game_positions(sgf_game)
+    board = boards.Board(5)
+    expected = []
+    for move_number, (colour, row, col) in enumerate([
+            ('b', 4, 1), ('w', 4, 0), ('b', 0, 4), ('w', 0, 3), ('b', 3, 0),
+            ('w', None, None), ('b', 1, 4), ('w', 1, 3), ('b', 0, 0)]):
+        if row is not None:
+            board.play(row, col, colour)
+        if colour == 'w' and row is None:
+            continue
+        expected.append((sgf_position_index.hash_position(board),
+                         move_number + 1))
+    tc.assertEqual(positions, expected)
+    tc.assertEqual(len(positions), 8)
+
+    setup_game = sgf.Sgf_game.from_string(
+        "(;SZ[9]AB[cc][gg];W[ee])")
+    positions = sgf_position_index.hash_game_positions(
+        setup_game, canonical=True)
+    tc.assertEqual([move_number for (_, move_number) in positions], [0, 1])
+    tc.assertEqual(positions[0][0], sgf_position_index.hash_position(
+        make_board(9, [(2, 6), (6, 2)], []), canonical=True))
+
+    bad_game = sgf.Sgf_game.from_string("(;SZ[9];B[ee];W[ee])")
+    with tc.assertRaises(ValueError) as ar:
+        sgf_position_index.hash_game_positions(bad_game)
+    tc.assertEqual(str(ar.exception), "move 2: illegal move")
+
+def test_position_index(tc):
+    sandbox = tc.sandbox()
+    games_dir = os.path.join(sandbox, "games")
+    os.mkdir(games_dir)
+    path1 = os.path.join(games_dir, "g1.sgf")
+    path2 = os.path.join(games_dir, "g2.sgf")
+    write_file(path1, "(;SZ[9];B[cc];W[gg];B[cg])\n"
+                      "(;SZ[9];B[ee];W[ee])\n"
+                      "(;SZ[9];B[gc];W[cg];B[gg])")
+    write_file(path2, "(;SZ[9];B[gg];W[cc];B[ee])")
+    index_pathname = os.path.join(sandbox, "positions.idx")
+    stats = sgf_position_index.build_position_index(
+        index_pathname, [games_dir], processes=1, run_size=2)
+    tc.assertEqual((stats.files, stats.games, stats.positions),
+                   (2, 3, 9))
+    tc.assertEqual(stats.errors, [(path1, "game 1: move 2: illegal move")])
+
+    index = sgf_position_index.Position_index(index_pathname)
+    tc.assertIs(index.canonical, False)
+    tc.assertEqual((index.game_count, index.entry_count), (3, 9))
+    board = make_board(9, [(6, 2)], [])
+    tc.assertEqual(
+        [(m.path, m.offset, m.move_number)
+         for m in index.find_position(board)],
+        [(path1, 0, 1)])
+    tc.assertEqual(index.get_game_location(1), (path1, 48))
+    tc.assertEqual(index.find_position(make_board(9, [(4, 4)], [])), [])
+    index.close()
+
+    sgf_position_index.build_position_index(
+        index_pathname, [games_dir], canonical=True, processes=1)
+    index = sgf_position_index.Position_index(index_pathname)
+    tc.assertIs(index.canonical, True)
+    tc.assertEqual(
+        [(m.path, m.offset, m.move_number)
+         for m in index.find_position(make_board(9, [(6, 2)], [(2, 6)]))],
+        [(path1, 0, 2), (path1, 48, 2), (path2, 0, 2)])
+    index.close()
+
+def test_position_index_errors(tc):
+    sandbox = tc.sandbox()
+    with tc.assertRaises(sgf_position_index.PositionIndexError) as ar:
+        sgf_position_index.build_position_index(
+            os.path.join(sandbox, "positions.idx"),
+            [os.path.join(sandbox, "nonesuch")])
+    tc.assertTrue(str(ar.exception).startswith("not found: "))
+    pathname = os.path.join(sandbox, "bad.idx")
+    write_file(pathname, "(;)")
+    with tc.assertRaises(sgf_position_index.PositionIndexError) as ar:
+        sgf_position_index.Position_index(pathname)
+    tc.assertEqual(str(ar.exception), "not a position index: %s" % pathname)
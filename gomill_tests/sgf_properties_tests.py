@@ -203,6 +203,25 @@ def test_serialise_point(tc):
     tc.assertRaises(ValueError, serialise_point, (0, -1), 9)
     tc.assertRaises(TypeError, serialise_point, (1, 1.5), 9)
 
+    tc.assertEqual(serialise_point([8, 1], 9), "ba")
+
+def test_point_tables(tc):
+    # The precomputed table must agree with serialise_go_point() at every size
+    for size in range(1, 26):
+        for row in range(size):
+            for col in range(size):
+                s = sgf_properties.serialise_go_point((row, col), size)
+                tc.assertEqual(
+                    sgf_properties.interpret_go_point(s, size), (row, col))
+    tc.assertEqual(sgf_properties.interpret_go_point("zz", 26), (0, 25))
+    tc.assertIsNone(sgf_properties.interpret_go_point("tt", 19))
+    tc.assertIsNone(sgf_properties.interpret_go_point("", 26))
+    # A float size doesn't use the table for the equal int size
+    result = sgf_properties.interpret_go_point("ba", 9.0)
+    tc.assertEqual(result, (8, 1))
+    tc.assertIs(type(result[0]), float)
+    tc.assertRaises(TypeError, sgf_properties.serialise_go_point,
+                    (1.0, 2.0), 9)
 
 def test_interpret_point_list(tc):
     def ipl(l, size):
@@ -384,3 +403,28 @@ def test_presenter_private_properties(tc):
     tc.assertRaisesRegexp(ValueError, "unknown property",
                           p9.interpret, 'XX', ["asd"])
 
+
+def test_presenter_register_property(tc):
+    p1 = sgf_properties.Presenter(9, "UTF-8")
+    p2 = sgf_properties.Presenter(9, "UTF-8")
+    number_type = p1.get_property_type("SZ")
+    p1.register_property('XX', number_type)
+    p1.deregister_property('C')
+    tc.assertEqual(p1.interpret('XX', ["9"]), 9)
+    tc.assertRaises(KeyError, p1.get_property_type, 'C')
+    # Other presenters (existing and new) are unaffected
+    for p in p2, sgf_properties.Presenter(9, "UTF-8"):
+        tc.assertEqual(p.interpret('XX', ["9"]), "9")
+        tc.assertIs(p.get_property_type('C'),
+                    p2.get_property_type('GC'))
+
+def test_presenter_encoding(tc):
+    tc.assertEqual(sgf_properties.Presenter(9, "utf8").encoding, "UTF-8")
+    tc.assertEqual(sgf_properties.Presenter(9, "latin-1").encoding,
+                   "ISO-8859-1")
+    tc.assertRaisesRegexp(ValueError, "unknown encoding: nonesuch",
+                          sgf_properties.Presenter, 9, "nonesuch")
+    # Failed lookups aren't memoised, so a repeat still raises
+    tc.assertNotIn("nonesuch", sgf_properties._normalised_charset_names)
+    tc.assertRaisesRegexp(ValueError, "unknown encoding: nonesuch",
+                          sgf_properties.Presenter, 9, "nonesuch")
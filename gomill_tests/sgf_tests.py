@@ -3,6 +3,10 @@
 
 from __future__ import with_statement
 
+import mmap
+import os
+import weakref
+from cStringIO import StringIO
 from textwrap import dedent
 
 from gomill_tests import gomill_test_support
@@ -64,6 +68,25 @@ def test_sgf_game_from_string(tc):
     tc.assertRaisesRegexp(ValueError, "unknown encoding: $",
                           sgf.Sgf_game.from_string, "(;CA[])")
 
+def test_sgf_game_iter_collection(tc):
+    s = "(;SZ[9];B[ee];W[ge]) \n(;SZ[13];B[aa])"
+    pathname = os.path.join(tc.sandbox(), "collection.sgf")
+    with open(pathname, "wb") as f:
+        f.write(s)
+    with open(pathname, "rb") as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        games = list(sgf.Sgf_game.iter_collection(m))
+        m.close()
+    tc.assertEqual([offset for offset, _ in games], [0, 22])
+    tc.assertEqual([g.get_size() for _, g in games], [9, 13])
+    tc.assertEqual(games[0][1].get_main_sequence()[2].get_move(),
+                   ('w', (4, 6)))
+    f = StringIO("(;SZ[9]) (;SZ[99])")
+    with tc.assertRaises(ValueError) as ar:
+        list(sgf.Sgf_game.iter_collection(f))
+    tc.assertEqual(str(ar.exception),
+                   "error parsing game 1: size out of range: 99")
+
 def test_node(tc):
     sgf_game = sgf.Sgf_game.from_string(
         r"(;KM[6.5]C[sample\: comment]AB[ai][bh][ee]AE[];B[dg])")
@@ -296,6 +319,44 @@ def test_serialise_wrap(tc):
     tc.assertEqual(map(str, sgf_game.get_main_sequence()),
                    map(str, sgf_game2.get_main_sequence()))
 
+def test_write(tc):
+    sgf_game = sgf.Sgf_game.from_string(SAMPLE_SGF_VAR)
+    for wrap in (79, None):
+        f = StringIO()
+        tc.assertEqual(sgf_game.write(f, wrap), len(f.getvalue()))
+        tc.assertEqual(f.getvalue(), sgf_game.serialise(wrap))
+
+    g2 = sgf.Sgf_game.from_string("(;FF[4]C[\xc2\xa3]CA[utf-8]SZ[19])")
+    g2.get_root().set("CA", "latin-1")
+    f = StringIO()
+    tc.assertEqual(g2.write(f), 30)
+    tc.assertEqual(f.getvalue(), "(;FF[4]C[\xa3]CA[latin-1]SZ[19])\n")
+    g2.get_root().set("CA", "unknown")
+    f = StringIO()
+    tc.assertRaisesRegexp(ValueError, "unsupported charset: \['unknown']",
+                          g2.write, f)
+    tc.assertEqual(f.getvalue(), "")
+
+def test_collection_writer(tc):
+    pathname = os.path.join(tc.sandbox(), "collection.sgf")
+    games = [sgf.Sgf_game.from_string(s) for s in
+             ("(;SZ[9];B[ee];W[ge])", "(;SZ[13];B[aa])", "(;SZ[19])")]
+    with open(pathname, "wb") as f:
+        writer = sgf.Sgf_collection_writer(f)
+        tc.assertEqual([writer.write_game(game) for game in games[:2]],
+                       [0, 21])
+    size = os.path.getsize(pathname)
+    tc.assertEqual(writer.offset, size)
+    with open(pathname, "ab") as f:
+        writer = sgf.Sgf_collection_writer(f, offset=size, wrap=None)
+        tc.assertEqual(writer.write_game(games[2]), size)
+        tc.assertEqual(writer.game_count, 1)
+    with open(pathname, "rb") as f:
+        loaded = list(sgf.Sgf_game.iter_collection(f))
+    tc.assertEqual([offset for offset, _ in loaded], [0, 21, 37])
+    tc.assertEqual([g.serialise() for _, g in loaded],
+                   [g.serialise() for g in games])
+
 def test_encoding(tc):
     g1 = sgf.Sgf_game(19)
     tc.assertEqual(g1.get_charset(), "UTF-8")
@@ -492,6 +553,22 @@ def test_tree_new_child_with_unexpanded_root_and_index(tc):
     tc.assertEqual(sgf_game.serialise(),
                    "(;SZ[9](;N[n1];N[n3])(;N[n2])(;N[n4]))\n")
 
+def test_tree_lazy_expansion(tc):
+    sgf_game = sgf.Sgf_game.from_string(
+        "(;SZ[9](;N[n1];N[n3](;N[n5])(;N[n6]))(;N[n2];N[n4]))")
+    root = sgf_game.get_root()
+    n1, n2 = root
+    n4 = n2[0]
+    # reparent into a node whose children haven't been created yet
+    n1.reparent(n4)
+    tc.assertIs(n1.parent, n4)
+    tc.assertEqual([node.get("N") for node in n1[0]], ["n5", "n6"])
+    tc.assertEqual(sgf_game.serialise(),
+                   "(;SZ[9];N[n2];N[n4];N[n1];N[n3](;N[n5])(;N[n6]))\n")
+    tc.assertIs(weakref.ref(n4)(), n4)
+    with tc.assertRaises(AttributeError):
+        n4.spurious_attribute = 3
+
 def test_reparent(tc):
     g1 = sgf.Sgf_game.from_string("(;SZ[9](;N[n1];N[n3])(;N[n2]))")
     root = g1.get_root()